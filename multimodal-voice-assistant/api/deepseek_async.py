@@ -0,0 +1,151 @@
+"""
+DeepSeek API 的异步客户端 (httpx)，供 asyncio 核心使用。
+与同步客户端相同: 连接池复用、429/5xx 带抖动的指数退避重试、SSE 流式输出。
+取消 (asyncio.CancelledError) 会关闭正在进行的流式响应。
+"""
+import asyncio
+import json
+import random
+import time
+import weakref
+from typing import AsyncIterator
+from logger import log
+import config
+from api.deepseek_client import RETRY_STATUSES
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+class AsyncDeepSeekClient:
+    """异步 DeepSeek (OpenAI 兼容) 客户端；需要在同一个事件循环中使用"""
+    def __init__(self, base_url: str | None = None, api_key: str | None = None,
+                 pool_size: int | None = None, max_retries: int | None = None,
+                 timeout: tuple[float, float] | None = None):
+        # 未指定的参数在创建时读取配置 (而不是导入时)
+        base_url = base_url if base_url is not None else config.DEEPSEEK_BASE_URL
+        api_key = api_key if api_key is not None else config.DEEPSEEK_API_KEY
+        pool_size = pool_size if pool_size is not None else config.DEEPSEEK_POOL_SIZE
+        max_retries = max_retries if max_retries is not None else config.DEEPSEEK_MAX_RETRIES
+        timeout = timeout if timeout is not None else config.DEEPSEEK_TIMEOUT
+        connect_timeout, read_timeout = timeout
+        self.max_retries = max_retries
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            # 与同步客户端 (urllib3 pool_block=False) 一致: 只限制保留的 keep-alive 连接数，并发上限由调用方控制
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    def _backoff(self, attempt: int, response: "httpx.Response | None") -> float:
+        """计算重试等待时间: 优先使用 Retry-After，否则为带完全抖动的指数退避"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.replace(".", "", 1).isdigit():
+                return min(float(retry_after), config.DEEPSEEK_BACKOFF_MAX_S)
+        return random.uniform(0, min(config.DEEPSEEK_BACKOFF_MAX_S, config.DEEPSEEK_BACKOFF_BASE_S * (2 ** attempt)))
+
+    async def _open(self, payload: dict) -> "httpx.Response":
+        """发送请求并返回已检查状态码的流式响应 (调用方负责 aclose)"""
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                request = self.client.build_request("POST", "/chat/completions", json=payload)
+                response = await self.client.send(request, stream=True)
+                retryable = response.status_code in RETRY_STATUSES
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # 只重试连接阶段的失败 (请求未送达)，请求发出后的读取错误直接抛出
+                if attempt >= self.max_retries:
+                    raise
+                log(f"连接 DeepSeek 失败，准备重试: {e}", title="API_RETRY", style="yellow")
+                retryable = True
+
+            if retryable and attempt < self.max_retries:
+                wait = self._backoff(attempt, response)
+                if response is not None:
+                    log(f"DeepSeek 返回 {response.status_code}，{wait:.2f}s 后重试 ({attempt + 1}/{self.max_retries})", title="API_RETRY", style="yellow")
+                    await response.aread() # 读完响应体，连接才能放回连接池复用
+                    await response.aclose()
+                await asyncio.sleep(wait)
+                continue
+
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+            response.raise_for_status()
+            return response
+        raise RuntimeError("unreachable")
+
+    async def chat_stream(self, messages: list, model_name: str, **extra) -> AsyncIterator[str]:
+        """以 SSE 流式调用 /chat/completions，逐段产出回答文本"""
+        payload = {
+            "model": model_name,
+            "messages": messages,
+            "max_tokens": 1536,
+            "temperature": 0.7,
+            "stream": True,
+            **extra,
+        }
+        start = time.perf_counter()
+        response = await self._open(payload)
+        first_token_s = None
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue # 跳过空行和 SSE 注释 (keep-alive)
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    continue # 继续读到流结束，连接才能放回连接池
+                choices = json.loads(data).get("choices") or []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    if first_token_s is None:
+                        first_token_s = time.perf_counter() - start
+                    yield content
+        finally:
+            await response.aclose()
+        first_token = f"首 token {first_token_s * 1000:.0f}ms，" if first_token_s is not None else ""
+        log(f"{first_token}总计 {(time.perf_counter() - start) * 1000:.0f}ms", title="API_TIMING", style="dim")
+
+    async def chat(self, messages: list, model_name: str, **extra) -> str:
+        """非流式调用的等价形式: 返回完整回答文本"""
+        return "".join([chunk async for chunk in self.chat_stream(messages, model_name, **extra)])
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# 每个事件循环一个客户端 (httpx 的连接池绑定到创建它的事件循环)
+_clients = weakref.WeakKeyDictionary()
+
+def get_async_client() -> AsyncDeepSeekClient:
+    """返回当前事件循环的客户端，首次调用时创建"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncDeepSeekClient()
+    return client
+
+async def close_async_client():
+    """关闭当前事件循环的客户端 (事件循环结束前调用，释放连接)"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+async def astream_deepseek_api(messages, model_name) -> AsyncIterator[str]:
+    """流式异步 DeepSeek API 调用，逐段产出回答文本；出错时记录日志并结束 (取消会向上传播)"""
+    api_url = f"{config.DEEPSEEK_BASE_URL}/chat/completions"
+    try:
+        log(f"准备异步调用 DeepSeek API ({model_name})...", title="API_CALL", style="cyan")
+        async for chunk in get_async_client().chat_stream(messages, model_name):
+            yield chunk
+        log("DeepSeek API 异步调用完成。", title="API_CALL", style="cyan")
+    except httpx.TimeoutException:
+        log(f"异步调用 DeepSeek API 超时 ({api_url})", title="API_ERROR", style="bold red")
+    except httpx.HTTPError as e:
+        log(f"异步调用 DeepSeek API 时出错 ({api_url}): {e}", title="API_ERROR", style="bold red")
+    except Exception as e:
+        log(f"处理 DeepSeek 异步响应时出错: {e}", title="ERROR", style="bold red")
@@ -1,34 +1,208 @@
 """
 封装 DeepSeek API 调用。
+使用带连接池的 requests.Session 复用 TCP/TLS 连接 (keep-alive)，对 429/5xx 进行带随机抖动的指数退避重试，
+并记录每次请求的建立连接、首字节 (TTFB) 和总耗时。
 """
+import json
+import random
+import threading
+import time
+from typing import Iterator
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError, NewConnectionError
 from logger import log
 import config
+from startup import LazySingleton
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# 记录当前线程最近一次新建连接的耗时 (urllib3 在调用线程中同步建立连接)
+_timing = threading.local()
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _timing.connect_s = time.perf_counter() - start
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect() # 包含 TLS 握手
+        _timing.connect_s = time.perf_counter() - start
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+def _is_connect_error(error: requests.exceptions.ConnectionError) -> bool:
+    """是否为连接阶段的失败 (建立连接失败或连接超时，请求未送达)；请求发出后的读取错误 (如连接被重置) 不算"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+class _TimedAdapter(HTTPAdapter):
+    """记录建立连接耗时的 HTTPAdapter"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+class DeepSeekClient:
+    """带连接池、重试和分阶段计时的 DeepSeek (OpenAI 兼容) 客户端，可指向本地桩服务器进行测试"""
+    def __init__(self, base_url: str | None = None, api_key: str | None = None,
+                 pool_size: int | None = None, max_retries: int | None = None,
+                 timeout: tuple[float, float] | None = None):
+        # 未指定的参数在创建时读取配置 (而不是导入时)，测试和压测可以先修改 config 再创建客户端
+        base_url = base_url if base_url is not None else config.DEEPSEEK_BASE_URL
+        api_key = api_key if api_key is not None else config.DEEPSEEK_API_KEY
+        pool_size = pool_size if pool_size is not None else config.DEEPSEEK_POOL_SIZE
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries if max_retries is not None else config.DEEPSEEK_MAX_RETRIES
+        self.timeout = timeout if timeout is not None else config.DEEPSEEK_TIMEOUT
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.new_connections = 0
+
+    def _backoff(self, attempt: int, response: requests.Response | None) -> float:
+        """计算重试等待时间: 优先使用 Retry-After，否则为带完全抖动的指数退避"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.replace(".", "", 1).isdigit():
+                return min(float(retry_after), config.DEEPSEEK_BACKOFF_MAX_S)
+        return random.uniform(0, min(config.DEEPSEEK_BACKOFF_MAX_S, config.DEEPSEEK_BACKOFF_BASE_S * (2 ** attempt)))
+
+    def post(self, path: str, payload: dict, stream: bool = False) -> requests.Response:
+        """发送 POST 请求 (可重试错误会自动重试)，返回已检查状态码的响应；stream=True 时响应体未读取"""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            _timing.connect_s = 0.0 # 复用连接时保持为 0
+            start = time.perf_counter()
+            response = None
+            try:
+                # stream=True 使 post 在收到响应头后即返回，便于测量首字节时间
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=True)
+                ttfb_s = time.perf_counter() - start
+                retryable = response.status_code in RETRY_STATUSES
+            except requests.exceptions.ConnectionError as e:
+                # 只重试连接阶段的失败 (请求未送达)；POST 已发出后的失败重试可能让服务端重复处理
+                if attempt >= self.max_retries or not _is_connect_error(e):
+                    raise
+                log(f"连接 DeepSeek 失败，准备重试: {e}", title="API_RETRY", style="yellow")
+                retryable, ttfb_s = True, None
+
+            with self._stats_lock:
+                self.requests += 1
+                if _timing.connect_s:
+                    self.new_connections += 1
+
+            if retryable and attempt < self.max_retries:
+                wait = self._backoff(attempt, response)
+                if response is not None:
+                    log(f"DeepSeek 返回 {response.status_code}，{wait:.2f}s 后重试 ({attempt + 1}/{self.max_retries})", title="API_RETRY", style="yellow")
+                    _ = response.content # 读完响应体，连接才能放回连接池复用
+                    response.close()
+                with self._stats_lock:
+                    self.retries += 1
+                time.sleep(wait)
+                continue
+
+            response.raise_for_status()
+            response.timing = {"connect_s": _timing.connect_s, "ttfb_s": ttfb_s, "start": start}
+            if not stream:
+                _ = response.content # 读取完整响应体
+                self.log_timing(response)
+            return response
+        raise RuntimeError("unreachable")
+
+    @staticmethod
+    def log_timing(response: requests.Response):
+        """记录本次请求的分阶段耗时"""
+        timing = response.timing
+        timing["total_s"] = time.perf_counter() - timing["start"]
+        connect = f"{timing['connect_s'] * 1000:.0f}ms" if timing["connect_s"] else "复用"
+        first_token = f"，首 token {timing['first_token_s'] * 1000:.0f}ms" if timing.get("first_token_s") else ""
+        log(f"连接 {connect}，首字节 {timing['ttfb_s'] * 1000:.0f}ms{first_token}，总计 {timing['total_s'] * 1000:.0f}ms",
+            title="API_TIMING", style="dim")
+
+    def chat(self, messages: list, model_name: str, **extra) -> dict | None:
+        """调用 /chat/completions，返回消息对象 {role: 'assistant', content: '...'}"""
+        payload = {
+            "model": model_name,
+            "messages": messages,
+            "max_tokens": 1536,
+            "temperature": 0.7,
+            **extra,
+        }
+        result = self.post("/chat/completions", payload).json()
+        if "choices" in result and len(result["choices"]) > 0:
+            return result["choices"][0]["message"]
+        log(f"DeepSeek API 返回无效响应: {result}", title="API_ERROR", style="bold red")
+        return None
+
+    def chat_stream(self, messages: list, model_name: str, **extra) -> Iterator[str]:
+        """以 SSE 流式调用 /chat/completions，逐段产出回答文本"""
+        payload = {
+            "model": model_name,
+            "messages": messages,
+            "max_tokens": 1536,
+            "temperature": 0.7,
+            "stream": True,
+            **extra,
+        }
+        response = self.post("/chat/completions", payload, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue # 跳过空行和 SSE 注释 (keep-alive)
+                data = line[len(b"data:"):].strip()
+                if data == b"[DONE]":
+                    continue # 继续读到流结束，连接才能放回连接池
+                choices = json.loads(data).get("choices") or []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    if "first_token_s" not in response.timing:
+                        response.timing["first_token_s"] = time.perf_counter() - response.timing["start"]
+                    yield content
+        finally:
+            response.close()
+        self.log_timing(response)
+
+    def stats(self) -> dict:
+        """返回请求统计 (新建连接数远小于请求数说明连接复用生效)"""
+        with self._stats_lock:
+            return {"requests": self.requests, "retries": self.retries, "new_connections": self.new_connections}
+
+
+# 全局客户端在首次调用时创建，所有线程共享同一个连接池
+_client = LazySingleton("deepseek_client", DeepSeekClient)
+get_client = _client.get
 
 def call_deepseek_api(messages, model_name):
     """通用的 DeepSeek API 调用函数"""
-    headers = {
-        "Authorization": f"Bearer {config.DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model_name,
-        "messages": messages,
-        "max_tokens": 1536,
-        "temperature": 0.7,
-    }
     api_url = f"{config.DEEPSEEK_BASE_URL}/chat/completions"
     try:
         log(f"准备调用 DeepSeek API ({model_name})...", title="API_CALL", style="cyan")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        result = response.json()
-        log(f"DeepSeek API 调用完成。", title="API_CALL", style="cyan")
-        if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"] # 返回消息对象 {role: 'assistant', content: '...'}
-        else:
-            log(f"DeepSeek API 返回无效响应: {result}", title="API_ERROR", style="bold red")
-            return None
+        message = get_client().chat(messages, model_name)
+        log("DeepSeek API 调用完成。", title="API_CALL", style="cyan")
+        return message
     except requests.exceptions.Timeout:
         log(f"调用 DeepSeek API 超时 ({api_url})", title="API_ERROR", style="bold red")
         return None
@@ -37,4 +211,18 @@ def call_deepseek_api(messages, model_name):
         return None
     except Exception as e:
         log(f"处理 DeepSeek API 响应时出错: {e}", title="ERROR", style="bold red")
-        return None
\ No newline at end of file
+        return None
+
+def stream_deepseek_api(messages, model_name) -> Iterator[str]:
+    """流式 DeepSeek API 调用，逐段产出回答文本；出错时记录日志并结束 (已产出的部分保留)"""
+    api_url = f"{config.DEEPSEEK_BASE_URL}/chat/completions"
+    try:
+        log(f"准备流式调用 DeepSeek API ({model_name})...", title="API_CALL", style="cyan")
+        yield from get_client().chat_stream(messages, model_name)
+        log("DeepSeek API 流式调用完成。", title="API_CALL", style="cyan")
+    except requests.exceptions.Timeout:
+        log(f"流式调用 DeepSeek API 超时 ({api_url})", title="API_ERROR", style="bold red")
+    except requests.exceptions.RequestException as e:
+        log(f"流式调用 DeepSeek API 时出错 ({api_url}): {e}", title="API_ERROR", style="bold red")
+    except Exception as e:
+        log(f"处理 DeepSeek 流式响应时出错: {e}", title="ERROR", style="bold red")
@@ -1,50 +1,86 @@
 """
 封装 Gemini API 调用。
 """
-import google.generativeai as genai
-# 导入 protos 以访问 FinishReason
-from google.generativeai import protos
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import asyncio
+import functools
 from logger import log
 import config
+import threading
+import time
 import traceback # 导入 traceback
+from typing import AsyncIterator, Iterator
+from startup import LazySingleton
 
-# 配置 Gemini (在模块加载时执行一次)
-try:
-    if config.GEMINI_API_KEY and config.GEMINI_API_KEY != "YOUR_GEMINI_API_KEY":
-        genai.configure(api_key=config.GEMINI_API_KEY)
-        log("Gemini API 已配置。", title="INIT", style="green")
-    else:
-        log("Gemini API 密钥未设置，无法配置。", title="CONFIG_ERROR", style="bold red")
-except Exception as e:
-    log(f"配置 Gemini API 时出错: {e}", title="ERROR", style="bold red")
-
-# 配置安全设置 (可选，降低阻塞可能性)
-safety_settings = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-}
-
-def call_gemini_api(prompt_parts, model_name, system_instruction=None):
-    """通用的 Gemini API 调用函数"""
+def _configure_gemini():
+    """导入并配置 Gemini SDK (导入 google.generativeai 较慢，推迟到首次调用)，返回 genai 模块"""
+    import google.generativeai as genai
+    try:
+        if config.GEMINI_API_KEY and config.GEMINI_API_KEY != "YOUR_GEMINI_API_KEY":
+            genai.configure(api_key=config.GEMINI_API_KEY)
+            log("Gemini API 已配置。", title="INIT", style="green")
+        else:
+            log("Gemini API 密钥未设置，无法配置。", title="CONFIG_ERROR", style="bold red")
+    except Exception as e:
+        log(f"配置 Gemini API 时出错: {e}", title="ERROR", style="bold red")
+    return genai
+
+# Gemini SDK 在首次调用时导入并配置 (线程安全)
+_gemini_sdk = LazySingleton("gemini_sdk", _configure_gemini)
+get_genai = _gemini_sdk.get
+
+@functools.lru_cache(maxsize=1)
+def _safety_settings():
+    """配置安全设置 (可选，降低阻塞可能性)"""
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+    return {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    }
+
+# 模型实例缓存: 按 (模型名, system_instruction) 复用，避免每次调用都重新构建
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(model_name, system_instruction=None):
+    """返回 (并缓存) 使用指定 system_instruction 的模型实例"""
+    key = (model_name, system_instruction)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            genai = get_genai()
+            model = genai.GenerativeModel(
+                model_name,
+                system_instruction=system_instruction,
+                safety_settings=_safety_settings() # 应用安全设置
+            )
+            _models[key] = model
+            log(f"已创建 Gemini 模型实例 ({model_name}，共缓存 {len(_models)} 个)", title="INIT", style="dim")
+    return model
+
+def _generate(model, prompt_parts, history, stream=False):
+    """发送请求: 提供 history 时通过 ChatSession 以原生多轮格式发送历史，否则单轮 generate_content"""
+    if history is not None:
+        # 每次调用新建 ChatSession (开销很小)，不在线程间共享可变的会话状态
+        return model.start_chat(history=history).send_message(prompt_parts, stream=stream)
+    return model.generate_content(prompt_parts, stream=stream)
+
+def call_gemini_api(prompt_parts, model_name, system_instruction=None, history=None):
+    """通用的 Gemini API 调用函数 (history 为原生格式的多轮历史 [{'role': 'user'/'model', 'parts': [...]}, ...])"""
     if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "YOUR_GEMINI_API_KEY":
         log("Gemini API 密钥未设置，无法调用。", title="API_ERROR", style="bold red")
         return None
     try:
+        # 导入 protos 以访问 FinishReason
+        from google.generativeai import protos
         log(f"准备调用 Gemini API ({model_name})...", title="API_CALL", style="cyan")
-        # 每次调用时创建模型实例，确保使用正确的 system_instruction
-        model = genai.GenerativeModel(
-            model_name,
-            system_instruction=system_instruction,
-            safety_settings=safety_settings # 应用安全设置
-        )
+        model = get_model(model_name, system_instruction)
         # 注意: prompt_parts 应该是 list 类型
         if not isinstance(prompt_parts, list):
             prompt_parts = [prompt_parts]
 
-        response = model.generate_content(prompt_parts)
+        response = _generate(model, prompt_parts, history)
         log(f"Gemini API 调用完成。", title="API_CALL", style="cyan")
 
         # 检查是否有候选内容，并处理可能的阻塞
@@ -76,3 +112,72 @@ def call_gemini_api(prompt_parts, model_name, system_instruction=None):
         # 可以在这里添加更详细的错误处理，例如网络错误 vs API 错误
         log(traceback.format_exc(), title="TRACEBACK", style="dim white")
         return None
+
+def stream_gemini_api(prompt_parts, model_name, system_instruction=None, history=None) -> Iterator[str]:
+    """流式 Gemini API 调用 (generate_content(stream=True))，逐段产出回答文本；出错时记录日志并结束"""
+    if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "YOUR_GEMINI_API_KEY":
+        log("Gemini API 密钥未设置，无法调用。", title="API_ERROR", style="bold red")
+        return
+    try:
+        log(f"准备流式调用 Gemini API ({model_name})...", title="API_CALL", style="cyan")
+        model = get_model(model_name, system_instruction)
+        if not isinstance(prompt_parts, list):
+            prompt_parts = [prompt_parts]
+
+        start = time.perf_counter()
+        first_token_s = None
+        response = _generate(model, prompt_parts, history, stream=True)
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # 该片段没有文本 (例如被安全策略阻塞)
+                log(f"Gemini 流式片段中无有效文本内容。阻塞详情: {response.prompt_feedback}", title="API_WARNING", style="yellow")
+                break
+            if text:
+                if first_token_s is None:
+                    first_token_s = time.perf_counter() - start
+                yield text
+        first_token = f"首 token {first_token_s * 1000:.0f}ms，" if first_token_s is not None else ""
+        log(f"Gemini API 流式调用完成 ({first_token}总计 {(time.perf_counter() - start) * 1000:.0f}ms)。", title="API_CALL", style="cyan")
+
+    except Exception as e:
+        log(f"流式调用 Gemini API 时出错 ({model_name}): {e}", title="API_ERROR", style="bold red")
+        log(traceback.format_exc(), title="TRACEBACK", style="dim white")
+
+async def astream_gemini_api(prompt_parts, model_name, system_instruction=None, history=None) -> AsyncIterator[str]:
+    """异步流式 Gemini API 调用 (generate_content_async / send_message_async)，逐段产出回答文本；出错时记录日志并结束"""
+    if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "YOUR_GEMINI_API_KEY":
+        log("Gemini API 密钥未设置，无法调用。", title="API_ERROR", style="bold red")
+        return
+    try:
+        log(f"准备异步调用 Gemini API ({model_name})...", title="API_CALL", style="cyan")
+        # 首次调用需要导入 SDK，放到线程中避免阻塞事件循环
+        model = await asyncio.to_thread(get_model, model_name, system_instruction)
+        if not isinstance(prompt_parts, list):
+            prompt_parts = [prompt_parts]
+
+        start = time.perf_counter()
+        first_token_s = None
+        if history is not None:
+            response = await model.start_chat(history=history).send_message_async(prompt_parts, stream=True)
+        else:
+            response = await model.generate_content_async(prompt_parts, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                log(f"Gemini 流式片段中无有效文本内容。阻塞详情: {response.prompt_feedback}", title="API_WARNING", style="yellow")
+                break
+            if text:
+                if first_token_s is None:
+                    first_token_s = time.perf_counter() - start
+                yield text
+        first_token = f"首 token {first_token_s * 1000:.0f}ms，" if first_token_s is not None else ""
+        log(f"Gemini API 异步调用完成 ({first_token}总计 {(time.perf_counter() - start) * 1000:.0f}ms)。", title="API_CALL", style="cyan")
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log(f"异步调用 Gemini API 时出错 ({model_name}): {e}", title="API_ERROR", style="bold red")
+        log(traceback.format_exc(), title="TRACEBACK", style="dim white")
@@ -0,0 +1,317 @@
+"""
+asyncio 助手核心: 每个回合 (识别 -> 功能调用 -> LLM -> TTS) 是一个 asyncio 任务，而不是占用一个线程。
+- STT 在 Whisper 工作池中执行 (await 其 Future)，截图、摄像头、搜索等阻塞操作放到线程中执行；
+- LLM 通过异步客户端流式输出 (DeepSeek: httpx，Gemini: generate_content_async)，TTS 逐句合成并播放；
+- 新的唤醒词会打断正在进行的语音回合 (取消任务会关闭 HTTP 流并停止播放)；HTTP 回合可以大量并发；
+- 流式识别的部分结果中唤醒词后的指令连续两次不变时 (handle_partial)，提前开始功能调用决策和主回答，
+  最终结果的指令与之相同时回合直接使用已开始的决策。
+main.py (语音) 和 backend_app.py (HTTP) 都通过 AssistantCore 驱动；同步调用方用 start() 在后台线程中运行事件循环。
+"""
+import asyncio
+import re
+import threading
+import traceback
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Coroutine
+from logger import log
+import config
+import speculation
+from audio import tts
+from conversation import EnhancedConversationContext
+from input_handler import take_screenshot, web_cam_capture
+from image_prep import image_mime
+from web_search import duckduckgo_search, process_search_results
+from llm_interface import llm_prompt_astream
+
+FORGET_COMMANDS = ["忘记所有", "清除记忆", "忘记刚才说的"]
+
+# 回合事件回调: on_event(事件名, 数据)，事件名为 "status" / "image" / "token" (供 Web 后端流式推送)
+EventCallback = Callable[[str, dict[str, Any]], None]
+
+def _ignore_event(event: str, data: dict[str, Any]):
+    pass
+
+def match_prompt(transcribed_text: str, wake_word: str) -> str | None:
+    """匹配唤醒词并返回其后的指令 (不记录日志，供流式部分结果频繁调用)"""
+    pattern = rf'.*?\b{re.escape(wake_word)}[\s,.?!]*([^\s].*)'
+    match = re.search(pattern, transcribed_text, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return None
+    prompt = match.group(1).strip()
+    prompt = re.sub(r'[.。，,?？!！]$', '', prompt).strip() # 移除结尾标点
+    return prompt if prompt else None
+
+def extract_prompt(transcribed_text: str, wake_word: str) -> str | None:
+    """从转录文本中提取唤醒词之后的有效指令"""
+    log(f"语音转文本结果: '{transcribed_text}'", title="DEBUG", style="bold blue")
+    prompt = match_prompt(transcribed_text, wake_word)
+    if prompt:
+        log(f"提取的指令: '{prompt}'", title="DEBUG", style="bold green")
+    else:
+        log("未匹配到唤醒词或唤醒词后无指令。", title="INFO", style="yellow")
+    return prompt
+
+def is_special_command(prompt: str) -> bool:
+    """是否为不经过常规 LLM 流程的特殊指令 (记住/忘记/搜索)"""
+    lowered = prompt.lower()
+    return lowered.startswith(("记住 ", "搜索 ")) or lowered in FORGET_COMMANDS
+
+@dataclass
+class TurnResult:
+    """一个回合的结果"""
+    prompt: str
+    text: str = ""
+    image: bytes | None = None # 截图/摄像头画面 (编码后的数据，格式见 image_prep.image_mime)
+    call: str = "none"
+
+
+class AssistantCore:
+    """asyncio 助手核心"""
+    def __init__(self, conversation_context: EnhancedConversationContext | None = None):
+        self.conversation_context = conversation_context or EnhancedConversationContext()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._voice_turn: asyncio.Task | None = None # 当前语音回合 (可被新的唤醒词打断)
+        self._partial_prompt: str | None = None # 上一个部分结果中的指令
+        self._early_plan: tuple[str, asyncio.Task] | None = None # (指令, 提前开始的 plan_turn_async 任务)
+        self.turns = 0
+        self.interrupted = 0
+        self.early_started = 0
+        self.early_used = 0
+
+    # --- 事件循环 (供同步调用方使用) ---
+    def start(self):
+        """在后台线程中运行事件循环"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="assistant-core", daemon=True)
+        self._thread.start()
+        log("asyncio 助手核心已启动。", title="INIT", style="green")
+
+    def submit(self, coro: Coroutine) -> Future:
+        """从其他线程提交协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine, timeout: float | None = None):
+        """从其他线程提交协程并等待结果"""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        """打断当前回合并停止事件循环"""
+        if self._loop is None:
+            return
+        self.submit(self.interrupt()).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    # --- 语音入口 ---
+    async def handle_speech(self, futures: list[Future], started_at: float | None = None,
+                            on_decoded: Callable[[], None] | None = None):
+        """等待 STT 工作池中各语音段的识别结果，拼接后处理 (started_at 为用户说完话的时间)"""
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+        texts = []
+        for result in results:
+            if isinstance(result, BaseException):
+                log(f"语音识别失败: {result}", title="ERROR", style="bold red")
+            else:
+                texts.append(result)
+        if on_decoded:
+            on_decoded()
+        transcript = "".join(texts).strip()
+        if transcript: # STT 失败或为空时跳过
+            await self.handle_transcript(transcript, started_at)
+
+    async def handle_partial(self, transcript: str):
+        """处理流式识别的部分结果: 唤醒词后的指令连续两次不变时，提前开始功能调用决策和主回答"""
+        prompt = match_prompt(transcript, config.WAKE_WORD)
+        if not prompt or is_special_command(prompt):
+            self._partial_prompt = None
+            return
+        early_prompt = self._early_plan[0] if self._early_plan else None
+        if prompt == self._partial_prompt and prompt != early_prompt:
+            self._take_early_plan(None) # 丢弃之前的指令提前开始的决策
+            log(f"检测到唤醒词，提前处理指令: '{prompt}'", title="SPECULATION", style="cyan")
+            self._early_plan = (prompt, asyncio.create_task(speculation.plan_turn_async(self.conversation_context, prompt)))
+            self.early_started += 1
+        self._partial_prompt = prompt
+
+    def _take_early_plan(self, prompt: str | None) -> asyncio.Task | None:
+        """取出提前开始的决策: 指令与 prompt 相同时返回其任务，否则丢弃"""
+        early, self._early_plan = self._early_plan, None
+        self._partial_prompt = None
+        if early is None:
+            return None
+        if early[0] == prompt:
+            self.early_used += 1
+            return early[1]
+        _discard_plan(early[1])
+        return None
+
+    async def handle_transcript(self, transcript: str, started_at: float | None = None):
+        """处理一条完整的识别文本: 提取指令，打断正在进行的语音回合并启动新回合 (不等待其完成)"""
+        prompt = extract_prompt(transcript, config.WAKE_WORD)
+        early_plan = self._take_early_plan(prompt)
+        if not prompt:
+            return
+        log(f'用户: {prompt}', title="USER_INPUT", style="bold green")
+        if await self.interrupt():
+            log("新的唤醒词打断了正在进行的回合。", title="INTERRUPT", style="bold yellow")
+        self._voice_turn = asyncio.create_task(self.handle_turn(prompt, started_at=started_at, speak=True, early_plan=early_plan))
+
+    async def interrupt(self) -> bool:
+        """取消正在进行的语音回合并等待其清理完毕，返回是否确实打断了回合"""
+        task = self._voice_turn
+        if task is None or task.done():
+            return False
+        task.cancel()
+        await asyncio.wait([task])
+        self.interrupted += 1
+        return True
+
+    # --- 回合 ---
+    async def handle_turn(self, prompt: str, conversation_context: EnhancedConversationContext | None = None,
+                          started_at: float | None = None, speak: bool = True,
+                          on_event: EventCallback | None = None,
+                          early_plan: asyncio.Task | None = None) -> TurnResult:
+        """
+        处理一条指令 (已去除唤醒词)；speak=False 时只返回文本 (HTTP 后端)，on_event 接收过程事件和回答片段，
+        early_plan 为根据部分识别结果提前开始的功能调用决策 (见 handle_partial)
+        """
+        context = conversation_context or self.conversation_context
+        emit = on_event or _ignore_event
+        result = TurnResult(prompt)
+        self.turns += 1
+        try:
+            chunks = await self._special_command(context, result, emit)
+            if chunks is None and not result.text:
+                chunks = await self._llm_turn(context, result, emit, early_plan)
+                add_exchange = True
+            else:
+                add_exchange = False # 特殊指令 (含搜索) 不写入对话历史
+
+            if chunks is not None:
+                if on_event:
+                    chunks = _emit_tokens(chunks, emit)
+                result.text = await self._respond(chunks, started_at, speak)
+                if add_exchange and result.text:
+                    context.add_exchange(result.prompt, result.text)
+            elif speak:
+                await tts.speak_async(result.text, started_at)
+
+            if result.text:
+                log(f'助手 ({config.ACTIVE_LLM.upper()}): {result.text}', title="ASSISTANT_RESPONSE", style="bold magenta")
+            else:
+                log("未能从 LLM 获取有效响应。", title="WARNING", style="yellow")
+        except asyncio.CancelledError:
+            log(f"回合已取消: '{prompt}'", title="INTERRUPT", style="yellow")
+            _discard_plan(early_plan)
+            raise
+        except Exception as e:
+            log(f"处理指令时发生错误: {e}", title="ERROR", style="bold red")
+            log(traceback.format_exc(), title="TRACEBACK", style="dim white")
+            result.text = f"处理指令时发生内部错误: {e}"
+        return result
+
+    async def _special_command(self, context: EnhancedConversationContext, result: TurnResult,
+                               emit: EventCallback) -> AsyncIterator[str] | None:
+        """处理特殊指令 (非 LLM)：直接回答时写入 result.text，搜索时返回 LLM 回答流"""
+        prompt = result.prompt
+        lowered = prompt.lower()
+        if lowered.startswith("记住 "):
+            info_to_remember = prompt[len("记住 "):].strip()
+            if info_to_remember:
+                await asyncio.to_thread(context.remember, info_to_remember) # 写入记忆库 (SQLite)
+                result.text = "好的，我记住这条信息了。" if config.ACTIVE_LLM == 'deepseek' else "Okay, I've remembered that."
+            else:
+                result.text = "请告诉我需要记住什么。" if config.ACTIVE_LLM == 'deepseek' else "Please tell me what to remember."
+        elif lowered in FORGET_COMMANDS:
+            # forget 方法返回确认信息；清空记忆库是 SQLite 操作，不在事件循环中执行
+            result.text = await asyncio.to_thread(context.forget, all_memories=lowered == "忘记所有")
+        elif lowered.startswith("搜索 "):
+            search_query = prompt[len("搜索 "):].strip()
+            if not search_query:
+                result.text = "请告诉我需要搜索什么内容。" if config.ACTIVE_LLM == 'deepseek' else "Please tell me what you want to search for."
+                return None
+            emit("status", {"stage": "search", "query": search_query})
+            search_results = await asyncio.to_thread(duckduckgo_search, search_query)
+            processed_results = process_search_results(search_results)
+            # 构造给 LLM 的提示，包含搜索结果
+            if config.ACTIVE_LLM == 'gemini':
+                llm_input_prompt = f"Please answer the user's question about '{search_query}' based on the following search results:\n\n{processed_results}"
+            else:
+                llm_input_prompt = f"请根据以下搜索结果回答用户关于 '{search_query}' 的问题:\n\n{processed_results}"
+            return llm_prompt_astream(context, llm_input_prompt)
+        return None
+
+    async def _llm_turn(self, context: EnhancedConversationContext, result: TurnResult, emit: EventCallback,
+                        early_plan: asyncio.Task | None = None):
+        """常规流程: 功能调用 (与主回答推测并行) -> 附加截图/剪贴板 -> 返回 LLM 回答流"""
+        plan = await (early_plan or speculation.plan_turn_async(context, result.prompt))
+        result.call = plan.call
+        emit("status", {"stage": "function_call", "call": plan.call})
+        if plan.answer is not None:
+            return plan.answer # 推测命中，直接使用已在生成的回答
+
+        clipboard_context = None
+        if 'take screenshot' in plan.call or 'capture webcam' in plan.call:
+            capture = take_screenshot if 'take screenshot' in plan.call else web_cam_capture
+            result.image = await asyncio.to_thread(capture)
+            if result.image:
+                emit("image", {"data": result.image, "mime": image_mime(result.image)})
+            elif 'take screenshot' in plan.call:
+                result.prompt += "(系统提示: 截图操作失败)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Screenshot failed)"
+            else:
+                result.prompt += "(系统提示: 摄像头捕捉失败)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Webcam capture failed)"
+        elif 'extract clipboard' in plan.call:
+            paste = await plan.get_clipboard_text()
+            if paste:
+                if config.ACTIVE_LLM == 'gemini':
+                    clipboard_context = f'\n\nCurrent clipboard content:\n"""\n{paste}\n"""'
+                else:
+                    clipboard_context = f'\n\n当前剪贴板内容如下:\n"""\n{paste}\n"""'
+            else:
+                clipboard_context = "\n\n(系统提示: 剪贴板为空或无法访问)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Clipboard is empty or inaccessible)"
+
+        final_prompt = result.prompt + (clipboard_context or "")
+        return llm_prompt_astream(context, final_prompt, image=result.image)
+
+    async def _respond(self, chunks: AsyncIterator[str], started_at: float | None, speak: bool) -> str:
+        """消费回答流: speak=True 时边生成边播报，返回完整文本"""
+        try:
+            if speak:
+                return await tts.speak_stream_async(chunks, started_at)
+            return "".join([chunk async for chunk in chunks])
+        finally:
+            await chunks.aclose() # 取消或出错时关闭 HTTP 流
+
+    def stats(self) -> dict:
+        """返回回合统计"""
+        return {"turns": self.turns, "interrupted": self.interrupted,
+                "early_started": self.early_started, "early_used": self.early_used}
+
+
+def _discard_plan(task: asyncio.Task | None):
+    """取消不再使用的提前决策，已完成时取消其推测回答和剪贴板预取"""
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None:
+        plan = task.result()
+        if plan.answer is not None:
+            plan.answer.cancel()
+        if plan.clipboard is not None:
+            plan.clipboard.cancel()
+
+
+async def _emit_tokens(chunks: AsyncIterator[str], emit: EventCallback) -> AsyncIterator[str]:
+    """原样转发回答流，同时把每个片段作为 "token" 事件发出"""
+    try:
+        async for chunk in chunks:
+            emit("token", {"text": chunk})
+            yield chunk
+    finally:
+        await chunks.aclose()
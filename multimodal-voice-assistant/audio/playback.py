@@ -0,0 +1,205 @@
+"""
+TTS 的内存播放引擎: 合成的音频解码为 PCM (pygame Sound) 后，在专用的混音通道上按顺序播放，不经过临时文件。
+- 当前段播放时，下一段已排入通道队列 (Channel.queue)，由混音器在当前段结束时立即接上，段与段之间没有间隙；
+- 播放线程只在 "下一段播放结束" 或 "有新的段就绪" 时被唤醒 (条件变量 + 超时)，不轮询 get_busy()；
+- stop() 立即停止当前段并丢弃所有排队的段 (用户打断时调用)；
+- 统计从缓冲就绪 (play 被调用) 到开始发声的延迟 (含混音器输出缓冲区的延迟)。
+"""
+import asyncio
+import io
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable
+import numpy as np
+from logger import log
+import config
+from startup import LazySingleton
+
+def _init_mixer():
+    """初始化 Pygame Mixer (如果尚未初始化)，返回 pygame 模块"""
+    import pygame
+    try:
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(buffer=config.TTS_MIXER_BUFFER)
+    except pygame.error as e:
+        log(f"初始化 Pygame Mixer 失败: {e}", title="WARNING", style="yellow")
+        # 即使 Mixer 初始化失败，也允许程序继续，只是无法播放声音
+    return pygame
+
+# Pygame Mixer 在首次播放时初始化 (线程安全)
+_mixer = LazySingleton("pygame_mixer", _init_mixer)
+get_pygame = _mixer.get
+
+def decode(audio: bytes):
+    """把压缩音频 (mp3 等) 解码为混音器格式的 PCM (pygame Sound)；应在合成一侧调用，不占用播放时间"""
+    pygame = get_pygame()
+    return pygame.mixer.Sound(file=io.BytesIO(audio))
+
+
+@dataclass(eq=False)
+class Clip:
+    """一段待播放的音频"""
+    sound: Any
+    length_s: float
+    ready_at: float # 缓冲就绪 (交给引擎) 的时间，perf_counter
+    on_start: Callable[[float], None] | None = None # 参数为 (预计) 开始发声的时间
+    on_done: Callable[["Clip"], None] | None = None # 播放结束或被停止时调用 (在播放线程中)
+    started_at: float | None = None
+    ends_at: float | None = None
+    cancelled: bool = False
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+class PlaybackEngine:
+    """在一个保留的混音通道上无缝播放 Clip 队列 (线程安全)"""
+    def __init__(self):
+        self._pygame = get_pygame()
+        mixer_format = self._pygame.mixer.get_init()
+        self.available = bool(mixer_format)
+        self._channel = None
+        self.output_latency_s = 0.0
+        if self.available:
+            self._pygame.mixer.set_reserved(1) # 通道 0 只用于语音，不会被其他 Sound.play() 占用
+            self._channel = self._pygame.mixer.Channel(0)
+            self.output_latency_s = config.TTS_MIXER_BUFFER / mixer_format[0]
+        self._cond = threading.Condition()
+        self._waiting: deque[Clip] = deque() # 等待通道空位的段
+        self._scheduled: deque[Clip] = deque() # 已交给通道的段 (正在播放的 + 通道队列中的)，按时间顺序
+        self._latencies = deque(maxlen=config.PLAYBACK_LATENCY_SAMPLES) # 空闲时开始播放的段: 就绪 -> 发声 (秒)
+        self.clips_played = 0
+        self.clips_gapless = 0 # 排入通道队列、紧接上一段播放的段数
+        self.clips_cancelled = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="tts-playback", daemon=True)
+        self._thread.start()
+
+    def play(self, sound, on_start: Callable[[float], None] | None = None,
+             on_done: Callable[[Clip], None] | None = None) -> Clip:
+        """把一段解码好的音频加入播放队列 (立即返回)；通道空闲时在当前线程中直接开始播放"""
+        clip = Clip(sound, sound.get_length(), time.perf_counter(), on_start, on_done)
+        if not self.available:
+            self._complete(clip, cancelled=True)
+            return clip
+        with self._cond:
+            self._waiting.append(clip)
+            now = time.perf_counter()
+            self._finish_elapsed(now)
+            self._pump(now)
+            self._cond.notify()
+        return clip
+
+    def play_async(self, sound, on_start: Callable[[float], None] | None = None) -> asyncio.Future:
+        """play 的 asyncio 版本: 返回该段播放结束 (或被停止) 时完成的 Future，需在事件循环线程中调用"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve():
+            if not future.done():
+                future.set_result(None)
+
+        self.play(sound, on_start=on_start, on_done=lambda clip: loop.call_soon_threadsafe(resolve))
+        return future
+
+    def stop(self):
+        """立即停止当前播放并丢弃所有排队的段"""
+        if not self.available:
+            return
+        with self._cond:
+            self._channel.stop() # 同时清除通道队列中的段
+            cancelled = list(self._scheduled) + list(self._waiting)
+            self._scheduled.clear()
+            self._waiting.clear()
+            for clip in cancelled:
+                self._complete(clip, cancelled=True)
+            self._cond.notify()
+
+    def close(self):
+        """停止播放并结束播放线程"""
+        self.stop()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        """播放线程: 在段结束时标记完成，并把等待中的段交给通道；其余时间阻塞等待"""
+        with self._cond:
+            while not self._closed:
+                now = time.perf_counter()
+                self._finish_elapsed(now)
+                timeout = self._pump(now)
+                if self._scheduled:
+                    next_end = self._scheduled[0].ends_at - now
+                    timeout = next_end if timeout is None else min(timeout, next_end)
+                self._cond.wait(timeout)
+
+    def _finish_elapsed(self, now: float):
+        """标记已播放结束的段 (调用方需持有锁)"""
+        while self._scheduled and self._scheduled[0].ends_at <= now:
+            self._complete(self._scheduled.popleft())
+
+    def _pump(self, now: float) -> float | None:
+        """把等待中的段交给通道 (正在播放的段之外最多排队一段)，返回需要提前重试的等待时间 (调用方需持有锁)"""
+        while self._waiting and len(self._scheduled) < 2:
+            clip = self._waiting[0]
+            if self._scheduled and self._channel.get_busy():
+                if self._channel.get_queue() is not None:
+                    # 估算的结束时间早于实际 (上一段仍在通道队列中)，稍后再排队以免覆盖
+                    return config.PLAYBACK_RETRY_S
+                self._channel.queue(clip.sound)
+                clip.started_at = self._scheduled[-1].ends_at
+                self.clips_gapless += 1
+            else:
+                self._channel.play(clip.sound)
+                clip.started_at = now + self.output_latency_s
+                self._latencies.append(clip.started_at - clip.ready_at)
+            self._waiting.popleft()
+            clip.ends_at = clip.started_at + clip.length_s
+            self._scheduled.append(clip)
+            if clip.on_start:
+                self._call(clip.on_start, clip.started_at)
+        return None
+
+    def _complete(self, clip: Clip, cancelled: bool = False):
+        clip.cancelled = cancelled
+        if cancelled:
+            self.clips_cancelled += 1
+        else:
+            self.clips_played += 1
+        clip.done.set()
+        if clip.on_done:
+            self._call(clip.on_done, clip)
+
+    @staticmethod
+    def _call(callback: Callable, arg):
+        try:
+            callback(arg)
+        except Exception as e:
+            log(f"播放回调出错: {e}", title="ERROR", style="bold red")
+
+    def stats(self) -> dict:
+        """返回播放统计: 段数，以及就绪到发声延迟的中位数 / p95 (毫秒)"""
+        with self._cond:
+            latencies = np.array(self._latencies) * 1000
+            result = {"played": self.clips_played, "gapless": self.clips_gapless, "cancelled": self.clips_cancelled}
+        if len(latencies):
+            result["latency_p50_ms"] = round(float(np.percentile(latencies, 50)), 1)
+            result["latency_p95_ms"] = round(float(np.percentile(latencies, 95)), 1)
+        return result
+
+
+# 播放引擎在首次播放时创建 (同时初始化 Mixer)
+_engine = LazySingleton("playback_engine", PlaybackEngine)
+get_engine = _engine.get
+
+def shutdown():
+    """结束时记录播放统计并释放 Pygame 资源 (仅在已加载时)"""
+    if _engine.loaded:
+        engine = get_engine()
+        log(f"语音播放: {engine.stats()}", title="PLAYBACK_STATS", style="cyan")
+        engine.close()
+    if _mixer.loaded:
+        get_pygame().quit()
+        log("Pygame 已退出。", title="INFO", style="dim")
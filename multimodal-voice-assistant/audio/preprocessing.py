@@ -1,31 +1,116 @@
 """
 音频预处理功能。
+所有处理均基于 NumPy 向量化运算，直接作用于内存中的 int16/float32 采样。
 """
+import wave
 from pathlib import Path
+import numpy as np
 from pydub import AudioSegment
 from pydub.exceptions import CouldntDecodeError
-from pydub.effects import normalize
 from logger import log
+import config
+
+_EPS = 1e-9
+
+def to_float32(samples: np.ndarray) -> np.ndarray:
+    """将 int16 或浮点采样统一转换为 float32 (-1.0 ~ 1.0)"""
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) * (1.0 / 32768.0)
+    return samples.astype(np.float32, copy=False)
+
+def pcm_to_float32(pcm: bytes, sample_width: int = config.STT_SAMPLE_WIDTH) -> np.ndarray:
+    """将 16-bit PCM 字节转换为 Whisper 可直接使用的 float32 数组 (-1.0 ~ 1.0)"""
+    if sample_width != 2:
+        raise ValueError(f"仅支持 16-bit PCM，收到 sample_width={sample_width}")
+    return to_float32(np.frombuffer(pcm, dtype=np.int16))
+
+def remove_dc_offset(samples: np.ndarray) -> np.ndarray:
+    """去除直流偏移 (原地修改 float32 数组)"""
+    samples -= samples.mean(dtype=np.float32)
+    return samples
+
+def normalize_peak(samples: np.ndarray, headroom_db: float = config.AUDIO_PEAK_HEADROOM_DB) -> np.ndarray:
+    """峰值归一化，使最大绝对值距离满幅 headroom_db 分贝 (原地修改)"""
+    peak = float(np.max(np.abs(samples))) if samples.size else 0.0
+    if peak > _EPS:
+        samples *= (10 ** (-headroom_db / 20)) / peak
+    return samples
+
+def normalize_rms(samples: np.ndarray, target_dbfs: float = config.AUDIO_RMS_TARGET_DBFS) -> np.ndarray:
+    """响度 (RMS) 归一化到 target_dbfs，并防止削波 (原地修改)"""
+    if not samples.size:
+        return samples
+    rms = float(np.sqrt(np.dot(samples, samples) / samples.size))
+    if rms > _EPS:
+        gain = (10 ** (target_dbfs / 20)) / rms
+        peak = float(np.max(np.abs(samples)))
+        samples *= min(gain, 1.0 / peak) if peak > _EPS else gain
+    return samples
+
+def pre_emphasis(samples: np.ndarray, coef: float = 0.97) -> np.ndarray:
+    """预加重滤波 y[n] = x[n] - coef * x[n-1]，提升高频"""
+    if samples.size < 2:
+        return samples
+    emphasized = np.empty_like(samples)
+    emphasized[0] = samples[0]
+    np.subtract(samples[1:], coef * samples[:-1], out=emphasized[1:])
+    return emphasized
+
+def preprocess_samples(samples: np.ndarray,
+                       normalization: str | None = config.AUDIO_NORMALIZATION,
+                       pre_emphasis_coef: float = config.AUDIO_PRE_EMPHASIS) -> np.ndarray:
+    """对 int16/float32 采样做去直流、归一化和可选预加重，返回新的 float32 数组"""
+    # astype 总会复制，避免修改调用方 (或 np.frombuffer 只读) 的缓冲区
+    out = to_float32(samples) if samples.dtype == np.int16 else samples.astype(np.float32)
+    if out.size < config.STT_SAMPLE_RATE // 10: # 小于 100ms
+        log("音频过短，跳过归一化。", title="AUDIO_PREP", style="yellow")
+        return out
+
+    remove_dc_offset(out)
+    if pre_emphasis_coef:
+        out = pre_emphasis(out, pre_emphasis_coef)
+    if normalization == 'peak':
+        normalize_peak(out)
+    elif normalization == 'rms':
+        normalize_rms(out)
+    return out
+
+def preprocess_pcm(pcm: bytes, sample_rate: int = config.STT_SAMPLE_RATE,
+                   sample_width: int = config.STT_SAMPLE_WIDTH) -> np.ndarray:
+    """在内存中对单声道 PCM 进行预处理，返回 float32 采样"""
+    if sample_rate != config.STT_SAMPLE_RATE:
+        log(f"PCM 采样率 {sample_rate} 与 STT 要求的 {config.STT_SAMPLE_RATE} 不一致", title="AUDIO_PREP", style="yellow")
+    if sample_width != 2:
+        raise ValueError(f"仅支持 16-bit PCM，收到 sample_width={sample_width}")
+    # 直接以 int16 视图交给 preprocess_samples，仅在转换为 float32 时复制一次
+    return preprocess_samples(np.frombuffer(pcm, dtype=np.int16))
+
+def load_audio_pcm(audio_path: Path) -> bytes:
+    """读取任意格式的音频文件，返回 16kHz 单声道 16-bit PCM 字节"""
+    audio = AudioSegment.from_file(audio_path)
+    audio = audio.set_frame_rate(config.STT_SAMPLE_RATE).set_channels(1).set_sample_width(config.STT_SAMPLE_WIDTH)
+    return audio.raw_data
+
+def save_wav(samples: np.ndarray, path: Path, sample_rate: int = config.STT_SAMPLE_RATE) -> Path:
+    """将 float32 采样写入 16-bit WAV 文件"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
+    return path
 
 def preprocess_audio(audio_path: Path) -> Path:
-    """对音频进行预处理（归一化），返回处理后的文件路径"""
+    """对音频文件进行预处理（归一化），返回处理后的文件路径 (兼容旧接口，内部使用内存处理)"""
     if not audio_path or not audio_path.exists():
         log(f"音频预处理失败: 文件不存在 {audio_path}", title="ERROR", style="bold red")
         return audio_path # 返回原路径或 None 可能更好?
 
     try:
         log(f"正在预处理音频: {audio_path.name}", title="AUDIO_PREP", style="cyan")
-        audio = AudioSegment.from_file(audio_path)
-
-        if len(audio) < 100: # 小于 100ms
-             log("音频过短，跳过归一化。", title="AUDIO_PREP", style="yellow")
-             return audio_path
-
-        # 应用归一化
-        normalized_audio = normalize(audio)
-
-        processed_path = audio_path.with_name(f"{audio_path.stem}_processed.wav")
-        normalized_audio.export(processed_path, format="wav")
+        samples = preprocess_pcm(load_audio_pcm(audio_path))
+        processed_path = save_wav(samples, audio_path.with_name(f"{audio_path.stem}_processed.wav"))
         log(f"音频预处理完成: {processed_path.name}", title="AUDIO_PREP", style="cyan")
         return processed_path
     except CouldntDecodeError:
@@ -33,4 +118,4 @@ def preprocess_audio(audio_path: Path) -> Path:
         return audio_path
     except Exception as e:
         log(f"音频预处理失败 ({audio_path.name}): {e}", title="ERROR", style="bold red")
-        return audio_path
\ No newline at end of file
+        return audio_path
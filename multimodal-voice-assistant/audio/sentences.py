@@ -0,0 +1,64 @@
+"""
+把 LLM 的流式输出切分为句子，供逐句 TTS 使用。
+同时支持中文 (。！？；…) 和英文 (.!?;) 标点；英文句点需后跟空白才视为句末 (避免切开 3.14 或 e.g.)。
+"""
+from typing import Iterable, Iterator
+import config
+
+HARD_TERMINATORS = set("。！？；…!?;\n")
+SOFT_BREAKS = set("，、：,:") # 句子过长时退而在这些位置切分
+CLOSING = set("”’\"'」』）)】》") # 紧跟在句末标点后的引号/括号归入当前句
+
+class SentenceSplitter:
+    """增量切句器: feed() 输入文本片段，返回已完整的句子"""
+    def __init__(self, min_chars: int = config.TTS_SENTENCE_MIN_CHARS, max_chars: int = config.TTS_SENTENCE_MAX_CHARS):
+        self.min_chars = min_chars # 短于该长度的句子与下一句合并 (减少 TTS 请求次数)
+        self.max_chars = max_chars # 超过该长度仍无句末标点时强制切分 (避免首句等待过久)
+        self._buffer = ""
+
+    def _find_end(self, text: str) -> int:
+        """返回第一个句子的结束位置 (不含)，没有完整句子时返回 -1"""
+        for i, ch in enumerate(text):
+            if ch in HARD_TERMINATORS:
+                end = i + 1
+            elif ch == "." and i + 1 < len(text) and text[i + 1].isspace():
+                end = i + 1
+            else:
+                continue
+            while end < len(text) and (text[end] in CLOSING or text[end] in HARD_TERMINATORS):
+                end += 1
+            if end == len(text) and text[i] != "\n":
+                return -1 # 后面可能还有引号或标点，等待更多文本
+            if len(text[:end].strip()) >= self.min_chars:
+                return end
+        if len(text) > self.max_chars:
+            soft = max((i for i, ch in enumerate(text[:self.max_chars]) if ch in SOFT_BREAKS), default=-1)
+            return soft + 1 if soft >= self.min_chars else self.max_chars
+        return -1
+
+    def feed(self, text: str) -> list[str]:
+        """追加文本，返回新完成的句子列表"""
+        self._buffer += text
+        sentences = []
+        while True:
+            end = self._find_end(self._buffer)
+            if end < 0:
+                break
+            sentence, self._buffer = self._buffer[:end].strip(), self._buffer[end:]
+            if sentence:
+                sentences.append(sentence)
+        return sentences
+
+    def flush(self) -> str | None:
+        """返回缓冲区中剩余的文本 (流结束时调用)"""
+        sentence, self._buffer = self._buffer.strip(), ""
+        return sentence or None
+
+def split_sentences(chunks: Iterable[str], **kwargs) -> Iterator[str]:
+    """把文本片段流转换为句子流"""
+    splitter = SentenceSplitter(**kwargs)
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    rest = splitter.flush()
+    if rest:
+        yield rest
@@ -0,0 +1,218 @@
+"""
+流式语音识别 (STT)，对持续到达的音频块做增量 Whisper 解码。
+每累积 STT_STREAM_STEP_S 秒新音频就对当前窗口解码一次并输出部分结果；
+连续两次解码结果的公共前缀视为稳定文本 (LocalAgreement)，窗口过长时提交稳定片段并裁剪音频；
+检测到语句结束 (静音超过 STT_STREAM_ENDPOINT_S) 后用完整 beam search 给出最终结果。
+实时采集时用 BackgroundTranscriber 在单独的解码线程中运行，采集线程只负责读取音频，不会因解码而丢帧。
+"""
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+import numpy as np
+from logger import log
+import config
+from audio import stt
+from audio.preprocessing import preprocess_samples, to_float32
+
+@dataclass
+class StreamEvent:
+    """流式识别事件: 部分结果 (is_final=False) 或语句结束后的最终结果"""
+    text: str
+    is_final: bool
+    audio_seconds: float
+
+def _common_prefix(a: str, b: str) -> str:
+    """返回两个字符串的最长公共前缀"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return a[:i]
+
+class StreamingTranscriber:
+    """增量式 Whisper 解码器，通过回调输出部分结果和最终结果 (非线程安全，应由单个线程调用 feed)"""
+    def __init__(self, on_partial: Callable[[StreamEvent], None] | None = None,
+                 on_final: Callable[[StreamEvent], None] | None = None,
+                 energy_threshold: float = 300.0,
+                 step_s: float = config.STT_STREAM_STEP_S,
+                 max_window_s: float = config.STT_STREAM_MAX_WINDOW_S,
+                 endpoint_silence_s: float = config.STT_STREAM_ENDPOINT_S,
+                 max_utterance_s: float = config.STT_STREAM_MAX_UTTERANCE_S,
+                 preroll_s: float = 0.3):
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.energy_threshold = energy_threshold # 与 SpeechRecognition 相同的 int16 RMS 标度
+        self.step_s = step_s
+        self.max_window_s = max_window_s
+        self.endpoint_silence_s = endpoint_silence_s
+        self.max_utterance_s = max_utterance_s
+        self._preroll = deque()
+        self._preroll_s = preroll_s
+        self._reset()
+
+    def _reset(self):
+        """清空当前语句的状态"""
+        self._chunks = [] # 尚未提交的音频 (float32 块列表，解码时才拼接)
+        self._committed = "" # 已提交 (稳定且音频已裁剪) 的文本
+        self._prev_hypothesis = "" # 上一次解码的未提交文本
+        self._in_speech = False
+        self._silence_s = 0.0
+        self._since_decode_s = 0.0
+        self._utterance_s = 0.0
+        self._preroll.clear()
+
+    @property
+    def in_speech(self) -> bool:
+        """当前是否处于语句中"""
+        return self._in_speech
+
+    def feed(self, chunk: bytes | np.ndarray, decode_partial: bool = True):
+        """输入一块 16kHz 单声道音频 (int16 PCM 字节或数组)；decode_partial=False 时推迟部分解码 (追赶积压的音频)"""
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = np.frombuffer(chunk, dtype=np.int16)
+        samples = to_float32(chunk)
+        if not samples.size:
+            return
+        duration = samples.size / config.STT_SAMPLE_RATE
+        rms = float(np.sqrt(np.dot(samples, samples) / samples.size)) * 32768.0
+        is_voiced = rms > self.energy_threshold
+
+        if not self._in_speech:
+            # 语句开始前只保留很短的预录音频，避免截掉首字
+            self._preroll.append(samples)
+            while len(self._preroll) > 1 and sum(c.size for c in self._preroll) > self._preroll_s * config.STT_SAMPLE_RATE:
+                self._preroll.popleft()
+            if not is_voiced:
+                return
+            self._in_speech = True
+            self._chunks = list(self._preroll)
+            self._preroll.clear()
+        else:
+            self._chunks.append(samples)
+
+        self._utterance_s += duration
+        self._since_decode_s += duration
+        self._silence_s = 0.0 if is_voiced else self._silence_s + duration
+
+        if self._silence_s >= self.endpoint_silence_s or self._utterance_s >= self.max_utterance_s:
+            self.finalize()
+        elif decode_partial and self._since_decode_s >= self.step_s:
+            self._decode_partial()
+
+    def _window(self) -> np.ndarray:
+        """拼接当前窗口音频"""
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def _transcribe(self, audio: np.ndarray, beam_size: int):
+        """对窗口解码，返回 (分段列表, 拼接文本)"""
+        segments_gen, _ = stt.get_whisper_model().transcribe(
+            preprocess_samples(audio), language='zh', beam_size=beam_size,
+            initial_prompt=self._committed[-200:] or None,
+            condition_on_previous_text=False,
+        )
+        segments = list(segments_gen)
+        return segments, "".join(s.text.strip() for s in segments)
+
+    def _decode_partial(self):
+        """对当前窗口做一次快速 (greedy) 解码并输出部分结果"""
+        self._since_decode_s = 0.0
+        audio = self._window()
+        try:
+            segments, hypothesis = self._transcribe(audio, beam_size=1)
+        except Exception as e:
+            log(f"流式识别部分解码失败: {e}", title="ERROR", style="bold red")
+            return
+
+        stable = _common_prefix(self._prev_hypothesis, hypothesis)
+        # 窗口过长时提交稳定的完整分段并裁剪对应音频，使每次解码的代价有上界
+        if audio.size / config.STT_SAMPLE_RATE > self.max_window_s and len(segments) > 1:
+            committed_len, cut_s = 0, 0.0
+            for segment in segments[:-1]:
+                seg_len = len(segment.text.strip())
+                if committed_len + seg_len > len(stable):
+                    break
+                committed_len += seg_len
+                cut_s = segment.end
+            if committed_len:
+                self._committed += hypothesis[:committed_len]
+                hypothesis = hypothesis[committed_len:]
+                self._chunks = [audio[int(cut_s * config.STT_SAMPLE_RATE):]]
+        self._prev_hypothesis = hypothesis
+
+        text = stt.get_converter().convert(self._committed + hypothesis)
+        if text and self.on_partial:
+            log(f"部分识别结果: {text}", title="STT_PARTIAL", style="dim")
+            self.on_partial(StreamEvent(text=text, is_final=False, audio_seconds=self._utterance_s))
+
+    def finalize(self) -> str:
+        """结束当前语句: 对剩余窗口做完整解码并输出最终结果"""
+        if not self._in_speech:
+            return ""
+        audio, utterance_s = self._window(), self._utterance_s
+        text = ""
+        try:
+            # 有效语音过短 (仅一次噪声尖峰) 不送入模型
+            if utterance_s - self._silence_s >= 0.3:
+                _, hypothesis = self._transcribe(audio, beam_size=5)
+                text = stt.get_converter().convert(self._committed + hypothesis)
+        except Exception as e:
+            log(f"流式识别最终解码失败: {e}", title="ERROR", style="bold red")
+        finally:
+            self._reset()
+
+        if text:
+            log(f"最终识别结果: {text}", title="STT_RESULT_SIMPLIFIED", style="dim")
+            if self.on_final:
+                self.on_final(StreamEvent(text=text, is_final=True, audio_seconds=utterance_s))
+        return text
+
+class BackgroundTranscriber:
+    """
+    在后台解码线程中运行 StreamingTranscriber: 采集线程调用 put() 只把音频块放入队列，不等待解码。
+    解码跟不上时积压的音频块按顺序补入，只对最新的窗口做部分解码；回调在解码线程中执行。
+    """
+    def __init__(self, transcriber: StreamingTranscriber):
+        self.transcriber = transcriber
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="streaming-decode", daemon=True)
+        self._thread.start()
+
+    def put(self, chunk: bytes | np.ndarray):
+        """放入一块音频 (立即返回)"""
+        self._queue.put(chunk)
+
+    def close(self, wait: bool = True):
+        """处理完已放入的音频并结束当前语句后停止解码线程"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        while (chunk := self._queue.get()) is not None:
+            try:
+                self.transcriber.feed(chunk, decode_partial=self._queue.empty())
+            except Exception as e:
+                log(f"流式识别出错: {e}", title="ERROR", style="bold red")
+        try:
+            self.transcriber.finalize()
+        except Exception as e:
+            log(f"流式识别出错: {e}", title="ERROR", style="bold red")
+
+def transcribe_stream(chunks: Iterable[bytes | np.ndarray], **kwargs) -> Iterator[StreamEvent]:
+    """生成器接口: 输入音频块序列，依次产出部分结果和最终结果"""
+    events = deque()
+    transcriber = StreamingTranscriber(on_partial=events.append, on_final=events.append, **kwargs)
+    for chunk in chunks:
+        transcriber.feed(chunk)
+        while events:
+            yield events.popleft()
+    transcriber.finalize()
+    while events:
+        yield events.popleft()
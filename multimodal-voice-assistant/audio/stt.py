@@ -1,112 +1,146 @@
 """
 语音转文本 (STT) 功能，使用 Faster Whisper 和缓存。
 """
-import os
-import hashlib
 import json
 from pathlib import Path
-from faster_whisper import WhisperModel
-import opencc
+import numpy as np
 from logger import log
 import config
+from cache import TieredCache, content_hash
+from startup import LazySingleton
+from audio.preprocessing import load_audio_pcm, pcm_to_float32
 
-# 初始化 Whisper 模型 (在模块加载时执行)
-whisper_model = None
-try:
-    num_cores = os.cpu_count() or 1
-    # 尝试 GPU
-    whisper_model = WhisperModel(config.WHISPER_MODEL_SIZE, device='cuda', compute_type='int8')
-    log(f"Whisper 模型 '{config.WHISPER_MODEL_SIZE}' 加载成功 (使用 GPU)", title="INIT", style="green")
-except Exception as e:
-    log(f"加载 Whisper GPU 模型失败: {e}. 尝试使用 CPU...", title="WARNING", style="yellow")
+def _load_whisper_model():
+    """加载 Whisper 模型，优先使用 GPU，失败时回退到 CPU"""
+    from faster_whisper import WhisperModel # 导入本身就较慢，推迟到首次使用
+    try:
+        # 尝试 GPU
+        model = WhisperModel(config.WHISPER_MODEL_SIZE, device='cuda', compute_type='int8', num_workers=config.STT_WORKERS)
+        log(f"Whisper 模型 '{config.WHISPER_MODEL_SIZE}' 加载成功 (使用 GPU)", title="INIT", style="green")
+        return model
+    except Exception as e:
+        log(f"加载 Whisper GPU 模型失败: {e}. 尝试使用 CPU...", title="WARNING", style="yellow")
     try:
         # 回退 CPU
-        whisper_model = WhisperModel(config.WHISPER_MODEL_SIZE, device='cpu', compute_type='int8', cpu_threads=num_cores // 2, num_workers=num_cores // 2)
+        # num_workers 允许多个线程同时调用 transcribe (STTService 的线程池依赖这一点)
+        model = WhisperModel(config.WHISPER_MODEL_SIZE, device='cpu', compute_type='int8',
+                             cpu_threads=config.STT_WORKER_CPU_THREADS, num_workers=config.STT_WORKERS)
         log(f"Whisper 模型 '{config.WHISPER_MODEL_SIZE}' 加载成功 (使用 CPU)", title="INIT", style="green")
+        return model
     except Exception as e_cpu:
         log(f"加载 Whisper CPU 模型失败: {e_cpu}", title="ERROR", style="bold red")
-        # 程序无法在没有 STT 的情况下运行，可以选择退出或抛出异常
-        raise RuntimeError("无法加载 Whisper 模型，程序无法继续。") from e_cpu
+        raise RuntimeError("无法加载 Whisper 模型。") from e_cpu
 
-# 创建 OpenCC 转换器实例 (繁体到简体)
-cc = opencc.OpenCC('t2s.json')
+def _load_converter():
+    """创建 OpenCC 转换器实例 (繁体到简体)"""
+    import opencc
+    return opencc.OpenCC('t2s.json')
 
-def _load_stt_cache(audio_path: Path, model_size: str) -> dict | None:
-    """加载缓存的 Whisper 转录结果"""
-    if not audio_path or not audio_path.exists():
-        return None
-    try:
-        cache_key = hashlib.md5(audio_path.read_bytes()).hexdigest()
-        cache_file = config.CACHE_DIR / f"{cache_key}_{model_size}.json"
-        if cache_file.is_file():
-            with cache_file.open("r", encoding="utf-8") as f:
-                cached_data = json.load(f)
-            if cached_data.get("model_size") == model_size:
-                log(f"使用缓存的 STT 结果: {cache_file.name}", title="CACHE", style="green")
-                return cached_data
-            else:
-                log("STT 缓存模型大小不匹配，忽略缓存。", title="CACHE", style="yellow")
-    except Exception as e:
-        log(f"加载 STT 缓存失败 ({audio_path.name}): {e}", title="ERROR", style="bold red")
-    return None
+# Whisper 模型和 OpenCC 转换器在首次使用时加载 (线程安全)，也可以通过 warmup() 提前加载
+_whisper_model = LazySingleton("whisper", _load_whisper_model)
+_converter = LazySingleton("opencc", _load_converter)
+get_whisper_model = _whisper_model.get
+get_converter = _converter.get
 
-def _save_stt_cache(audio_path: Path, model_size: str, result: dict):
-    """保存 Whisper 转录结果到缓存"""
-    if not audio_path or not audio_path.exists():
-        return
+def warmup():
+    """预先加载模型并用一小段静音跑一次推理，避免第一条语音承担初始化开销"""
     try:
-        cache_key = hashlib.md5(audio_path.read_bytes()).hexdigest()
-        cache_file = config.CACHE_DIR / f"{cache_key}_{model_size}.json"
-        result["model_size"] = model_size
-        with cache_file.open("w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        log(f"STT 结果已缓存: {cache_file.name}", title="CACHE", style="green")
+        segments, _ = get_whisper_model().transcribe(np.zeros(config.STT_SAMPLE_RATE // 2, dtype=np.float32), language='zh', beam_size=1)
+        list(segments)
+        get_converter()
+        log("STT 预热完成", title="WARMUP", style="green")
     except Exception as e:
-        log(f"保存 STT 缓存失败 ({audio_path.name}): {e}", title="ERROR", style="bold red")
+        log(f"STT 预热失败: {e}", title="WARNING", style="yellow")
 
-def wav_to_text(audio_path: Path) -> str:
-    """使用 Faster Whisper 将 WAV 音频文件转换为文本，使用缓存，并转换为简体中文"""
-    if whisper_model is None:
-        log("Whisper 模型未加载，无法进行语音识别。", title="ERROR", style="bold red")
-        return ""
-    if not audio_path or not audio_path.exists():
-        log(f"语音识别失败: 音频文件无效或不存在 {audio_path}", title="ERROR", style="bold red")
+def _purge_legacy_cache_files():
+    """删除旧版本每条结果一个 JSON 文件的缓存 (已迁移到单个 SQLite 文件)"""
+    removed = 0
+    for legacy_file in config.CACHE_DIR.glob("*.json"):
+        try:
+            legacy_file.unlink()
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        log(f"已清理 {removed} 个旧版 STT 缓存文件", title="CACHE", style="dim")
+
+def _create_stt_cache() -> TieredCache:
+    """打开 STT 结果缓存 (内存 LRU + SQLite 磁盘层，键为音频内容哈希 + 模型大小)，并清理旧版缓存文件"""
+    _purge_legacy_cache_files()
+    return TieredCache(
+        "STT", config.STT_CACHE_DB,
+        memory_items=config.STT_CACHE_MEMORY_ITEMS,
+        max_bytes=config.STT_CACHE_MAX_BYTES,
+        max_age_s=config.STT_CACHE_MAX_AGE_S,
+        serialize=lambda result: json.dumps(result, ensure_ascii=False).encode("utf-8"),
+        deserialize=lambda raw: json.loads(raw.decode("utf-8")),
+    )
+
+# STT 缓存在首次使用时打开: 导入本模块没有副作用 ('process' 工作池的子进程也会导入本模块，但不访问缓存)
+_stt_cache = LazySingleton("stt_cache", _create_stt_cache)
+get_stt_cache = _stt_cache.get
+
+def cache_key(samples: np.ndarray, model_size: str = config.WHISPER_MODEL_SIZE) -> str:
+    """对音频采样计算一次缓存键 (每条语音只哈希一次)"""
+    return f"{content_hash(np.ascontiguousarray(samples))}:{model_size}"
+
+def decode_samples(samples: np.ndarray, model=None) -> dict:
+    """运行 Whisper 解码 (不查缓存)，返回可序列化的转录结果；model 为空时使用全局模型"""
+    # faster-whisper 直接接受 16kHz float32 数组，无需落盘
+    segments_gen, info = (model or get_whisper_model()).transcribe(samples, language='zh', beam_size=5)
+    segments = list(segments_gen) # 转换生成器
+    return {
+        "text": "".join(s.text for s in segments).strip(),
+        "segments": [{"start": s.start, "end": s.end, "text": s.text} for s in segments],
+        "language": info.language,
+        "language_probability": info.language_probability,
+    }
+
+def result_to_text(result: dict, cached: bool = False) -> str:
+    """从转录结果中取出文本并转换为简体中文"""
+    if cached:
+        text = ''.join(segment.get("text", "") for segment in result.get("segments", [])).strip()
+        log(f"识别结果 (缓存): {text}", title="STT_RESULT_CACHE", style="dim")
+    else:
+        text = result["text"]
+        log(f"识别结果 (原始): {text}", title="STT_RESULT_ORIGINAL", style="dim")
+    simplified_text = get_converter().convert(text)
+    log(f"转换为简体{' (缓存)' if cached else ''}: {simplified_text}", title="STT_RESULT_SIMPLIFIED", style="dim")
+    return simplified_text
+
+def samples_to_text(samples: np.ndarray) -> str:
+    """使用 Faster Whisper 将 16kHz float32 采样转换为文本，使用缓存，并转换为简体中文"""
+    if samples is None or samples.size == 0:
+        log("语音识别失败: 音频数据为空", title="ERROR", style="bold red")
         return ""
 
     try:
         log("正在进行语音识别...", title="STT", style="blue")
 
-        cached_result = _load_stt_cache(audio_path, config.WHISPER_MODEL_SIZE)
+        key = cache_key(samples)
+        cached_result = get_stt_cache().get(key)
         if cached_result:
-            segments = cached_result.get("segments", [])
-            text = ''.join(segment.get("text", "") for segment in segments).strip()
-            simplified_text = cc.convert(text)
-            log(f"识别结果 (缓存): {text}", title="STT_RESULT_CACHE", style="dim")
-            log(f"转换为简体 (缓存): {simplified_text}", title="STT_RESULT_SIMPLIFIED", style="dim")
-            return simplified_text
-
-        segments_gen, info = whisper_model.transcribe(str(audio_path), language='zh', beam_size=5)
-        segments = list(segments_gen) # 转换生成器
-
-        transcription_result = {
-            "text": "".join(s.text for s in segments).strip(),
-            "segments": [{"start": s.start, "end": s.end, "text": s.text} for s in segments],
-            "language": info.language,
-            "language_probability": info.language_probability,
-        }
-
-        _save_stt_cache(audio_path, config.WHISPER_MODEL_SIZE, transcription_result)
-
-        text = transcription_result["text"]
-        log(f"识别结果 (原始): {text}", title="STT_RESULT_ORIGINAL", style="dim")
+            log("使用缓存的 STT 结果", title="CACHE", style="green")
+            return result_to_text(cached_result, cached=True)
 
-        simplified_text = cc.convert(text)
-        log(f"转换为简体: {simplified_text}", title="STT_RESULT_SIMPLIFIED", style="dim")
-
-        return simplified_text
+        transcription_result = decode_samples(samples)
+        get_stt_cache().put(key, transcription_result)
+        return result_to_text(transcription_result)
 
     except Exception as e:
-        log(f"语音识别失败 ({audio_path.name}): {e}", title="ERROR", style="bold red")
+        log(f"语音识别失败: {e}", title="ERROR", style="bold red")
         import traceback
         log(traceback.format_exc(), title="TRACEBACK", style="dim white")
         return ""
+
+def wav_to_text(audio_path: Path) -> str:
+    """将音频文件转换为文本 (兼容旧接口，内部读取为内存采样后调用 samples_to_text)"""
+    if not audio_path or not audio_path.exists():
+        log(f"语音识别失败: 音频文件无效或不存在 {audio_path}", title="ERROR", style="bold red")
+        return ""
+    try:
+        samples = pcm_to_float32(load_audio_pcm(audio_path))
+    except Exception as e:
+        log(f"语音识别失败: 无法读取音频文件 {audio_path.name}: {e}", title="ERROR", style="bold red")
+        return ""
+    return samples_to_text(samples)
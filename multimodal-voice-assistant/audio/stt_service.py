@@ -0,0 +1,156 @@
+"""
+STT 服务: 可配置的 Whisper 工作池，带有界请求队列 (背压) 和 submit/Future 接口。
+多个音频源或 HTTP 客户端同时提交时，吞吐量随核心数增长。
+
+- 'thread' 后端: 所有 worker 线程共享一个 WhisperModel (num_workers=STT_WORKERS)，
+  ctranslate2 在推理时释放 GIL，因此多个线程可以真正并行；
+- 'process' 后端: 每个子进程各自加载模型 (内存占用更高，但与主进程完全隔离)。
+两种后端都在主进程中查询/写入 STT 缓存并做繁简转换。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from logger import log
+import config
+from audio import stt
+from startup import LazySingleton
+
+# --- 子进程 worker ---
+_process_model = None
+
+def _init_process_worker(model_size: str, cpu_threads: int):
+    """子进程初始化: 加载进程私有的 Whisper 模型"""
+    global _process_model
+    from faster_whisper import WhisperModel
+    _process_model = WhisperModel(model_size, device='cpu', compute_type='int8', cpu_threads=cpu_threads)
+
+def _process_decode(samples: np.ndarray) -> tuple[dict, float]:
+    """在子进程中解码，返回 (转录结果, 解码占用的 CPU 时间)；子进程一次只解码一条，进程 CPU 时间包含 ctranslate2 的计算线程"""
+    cpu_start = time.process_time()
+    result = stt.decode_samples(samples, model=_process_model)
+    return result, time.process_time() - cpu_start
+
+def _thread_decode(samples: np.ndarray) -> tuple[dict, float]:
+    """
+    在 worker 线程中解码，返回 (转录结果, 解码期间的进程 CPU 时间)。
+    ctranslate2 在自己的计算线程中推理，只计 worker 线程 (thread_time) 会漏掉解码本身；
+    进程 CPU 时间是整个进程的计时，其他 worker 同时解码时偏大
+    """
+    cpu_start = time.process_time()
+    result = stt.decode_samples(samples)
+    return result, time.process_time() - cpu_start
+
+
+class TranscriptFuture(Future):
+    """结果为简体文本的 Future；decode_cpu_s 为解码期间的进程 CPU 时间 (见 _thread_decode，缓存命中时为 0)"""
+    def __init__(self):
+        super().__init__()
+        self.decode_cpu_s = 0.0
+
+
+class STTService:
+    """Whisper 工作池 (线程安全)"""
+    def __init__(self, num_workers: int = config.STT_WORKERS,
+                 cpu_threads: int = config.STT_WORKER_CPU_THREADS,
+                 queue_size: int = config.STT_QUEUE_SIZE,
+                 backend: str = config.STT_POOL_BACKEND):
+        self.num_workers = num_workers
+        self.backend = backend
+        if backend == 'process':
+            self._executor = ProcessPoolExecutor(
+                max_workers=num_workers, initializer=_init_process_worker,
+                initargs=(config.WHISPER_MODEL_SIZE, cpu_threads),
+            )
+        elif backend == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="stt-worker")
+        else:
+            raise ValueError(f"未知的 STT 工作池后端: {backend}")
+        # 正在执行 + 排队中的请求总数上限
+        self._slots = threading.BoundedSemaphore(num_workers + queue_size)
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self._in_flight = 0
+        self._total_latency_s = 0.0
+        log(f"STT 工作池已启动: {backend} x {num_workers}，队列上限 {queue_size}", title="INIT", style="green")
+
+    def submit(self, samples: np.ndarray, block: bool = True, timeout: float | None = None) -> TranscriptFuture:
+        """提交一段 16kHz float32 采样，返回结果为简体文本的 TranscriptFuture；队列已满且不等待 (或等待超时) 时抛出 queue.Full"""
+        key = stt.cache_key(samples)
+        cached = stt.get_stt_cache().get(key)
+        if cached:
+            with self._stats_lock:
+                self.cache_hits += 1
+            future = TranscriptFuture()
+            future.set_result(stt.result_to_text(cached, cached=True))
+            return future
+
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            with self._stats_lock:
+                self.rejected += 1
+            raise queue.Full("STT 请求队列已满")
+
+        with self._stats_lock:
+            self.submitted += 1
+            self._in_flight += 1
+        submitted_at = time.perf_counter()
+        outer = TranscriptFuture()
+
+        def on_done(inner: Future):
+            self._slots.release()
+            with self._stats_lock:
+                self._in_flight -= 1
+                self.completed += 1
+                self._total_latency_s += time.perf_counter() - submitted_at
+            try:
+                result, outer.decode_cpu_s = inner.result()
+                stt.get_stt_cache().put(key, result)
+                outer.set_result(stt.result_to_text(result))
+            except Exception as e:
+                log(f"STT 工作池识别失败: {e}", title="ERROR", style="bold red")
+                outer.set_exception(e)
+
+        decode = _process_decode if self.backend == 'process' else _thread_decode
+        try:
+            self._executor.submit(decode, samples).add_done_callback(on_done)
+        except Exception:
+            self._slots.release()
+            with self._stats_lock:
+                self._in_flight -= 1
+            raise
+        return outer
+
+    def transcribe(self, samples: np.ndarray, timeout: float | None = None) -> str:
+        """同步接口: 提交并等待结果，失败时返回空字符串"""
+        try:
+            return self.submit(samples).result(timeout=timeout)
+        except Exception as e:
+            log(f"语音识别失败: {e}", title="ERROR", style="bold red")
+            return ""
+
+    def stats(self) -> dict:
+        """返回工作池统计信息"""
+        with self._stats_lock:
+            return {
+                "backend": self.backend,
+                "workers": self.num_workers,
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "cache_hits": self.cache_hits,
+                "avg_latency_s": self._total_latency_s / self.completed if self.completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """关闭工作池"""
+        self._executor.shutdown(wait=wait)
+
+
+# 全局 STT 服务在首次使用时创建
+_service = LazySingleton("stt_service", STTService)
+get_stt_service = _service.get
@@ -1,70 +1,211 @@
 """
-文本转语音 (TTS) 功能，使用 edge-tts。
+文本转语音 (TTS) 功能。合成由 audio.tts_backends 中的后端完成 (默认 edge-tts，超出延迟预算或期限时回退到本地引擎)。
+合成结果按 (后端及其语音参数, 文本) 的内容哈希缓存 (内存 LRU + SQLite 磁盘层，容量有上限)，
+只缓存和使用当前首选后端的结果 (超过期限时由其他后端合成的音频不写入缓存)；重复的句子 (记住/忘记的确认、出错时的回退回答等) 直接播放缓存的音频，不再请求合成；
+这些固定回答在启动时预先合成 (prewarm_cache)。
+合成的音频解码后交给播放引擎 (audio.playback)，在内存中无缝逐句播放，不写临时文件。
 """
 import asyncio
-import os
-from pathlib import Path
-import tempfile
-import pygame
+import queue
+import threading
+import time
+from collections import deque
+from typing import AsyncIterable, Callable, Iterable
 from logger import log
 import config
+from cache import TieredCache, content_hash
+from startup import LazySingleton
+from audio import playback, tts_backends
+from audio.sentences import SentenceSplitter, split_sentences
 
-# 尝试导入 edge_tts
-try:
-    import edge_tts
-    EDGE_TTS_AVAILABLE = True
-except ImportError:
-    EDGE_TTS_AVAILABLE = False
-    log("错误: 未安装 edge-tts。无法使用 TTS 功能。", title="ERROR", style="bold red")
-    log("请尝试安装: pip install edge-tts", title="INFO", style="yellow")
-
-# 初始化 Pygame Mixer (如果尚未初始化)
-try:
-    if not pygame.mixer.get_init():
-        pygame.mixer.init()
-except pygame.error as e:
-    log(f"初始化 Pygame Mixer 失败: {e}", title="WARNING", style="yellow")
-    # 即使 Mixer 初始化失败，也允许程序继续，只是无法播放声音
-
-async def _generate_and_play(text: str):
+def _create_synth_cache() -> TieredCache:
+    """打开合成缓存: 键为 (后端及其语音参数, 文本) 的内容哈希，值为音频数据"""
+    return TieredCache(
+        "TTS", config.TTS_CACHE_DB,
+        memory_items=config.TTS_CACHE_MEMORY_ITEMS,
+        max_bytes=config.TTS_CACHE_MAX_BYTES,
+    )
+
+# 合成缓存在首次使用时打开: 导入本模块不会创建 SQLite 文件
+_synth_cache = LazySingleton("tts_cache", _create_synth_cache)
+get_synth_cache = _synth_cache.get
+
+# 固定回答 (记住/忘记的确认、功能提示、LLM 出错时的回退回答)，启动时预先合成
+CANNED_PHRASES = (
+    "好的，我记住这条信息了。",
+    "Okay, I've remembered that.",
+    "请告诉我需要记住什么。",
+    "Please tell me what to remember.",
+    "请告诉我需要搜索什么内容。",
+    "Please tell me what you want to search for.",
+    "好的，我已经忘记了我们之前的对话内容。",
+    "抱歉，我在处理你的 DeepSeek 请求时遇到了问题。",
+    "Sorry, I encountered an issue while processing your Gemini request.",
+    "抱歉，LLM 配置错误。",
+)
+
+def _cache_key(backend: tts_backends.TTSBackend, text: str) -> str:
+    return content_hash(f"{backend.cache_id}\n{text}".encode("utf-8"))
+
+def _tts_available() -> bool:
+    if tts_backends.get_policy().available:
+        return True
+    log("没有可用的 TTS 后端，跳过语音播放。", title="WARNING", style="yellow")
+    return False
+
+async def _synthesize(text: str) -> bytes:
+    """合成语音，首选后端合成过该句时直接返回缓存"""
+    policy = tts_backends.get_policy()
+    backends = policy.ranked()
+    if not config.TTS_CACHE_ENABLED:
+        return (await policy.synthesize(text, backends))[0]
+    # 只查询和写入首选后端的键: 回退后端的音频若也被缓存和命中，该句会一直使用回退的声音
+    key = _cache_key(backends[0], text)
+    audio = get_synth_cache().get(key)
+    if audio is None:
+        audio, backend = await policy.synthesize(text, backends)
+        if audio and backend is backends[0]:
+            get_synth_cache().put(key, audio)
+    return audio
+
+async def _prewarm(sentences: list[str]) -> int:
+    """用首选后端合成缓存中还没有的句子，返回新合成的数量"""
+    policy = tts_backends.get_policy()
+    count = 0
+    for sentence in sentences:
+        backends = policy.ranked()
+        key = _cache_key(backends[0], sentence)
+        if key in get_synth_cache():
+            continue
+        try:
+            audio, backend = await policy.synthesize(sentence, backends)
+        except Exception as e:
+            log(f"预合成语音时出错 ('{sentence[:20]}'): {e}", title="WARNING", style="yellow")
+            continue
+        if audio and backend is backends[0]:
+            get_synth_cache().put(key, audio)
+            count += 1
+    return count
+
+def prewarm_cache(phrases: Iterable[str] = CANNED_PHRASES):
+    """
+    预先合成固定回答并写入缓存 (阻塞，在预热线程中调用)。
+    按播放时相同的方式切分句子，保证缓存键与实际播放的句子一致。
+    """
+    if not (config.TTS_CACHE_ENABLED and tts_backends.get_policy().available):
+        return
+    # 每条回答单独切分 (播放时每个回答也是单独切分的)
+    sentences = [sentence for phrase in phrases for sentence in split_sentences([phrase])]
+    start = time.perf_counter()
+    count = asyncio.run(_prewarm(sentences))
+    log(f"已预合成 {count} 条固定回答 ({len(sentences) - count} 条已缓存)，耗时 {time.perf_counter() - start:.2f}s",
+        title="TTS", style="dim")
+
+def log_stats():
+    """记录合成缓存的命中率和各后端的合成耗时"""
+    if _synth_cache.loaded:
+        get_synth_cache().log_stats()
+    if tts_backends._policy.loaded:
+        tts_backends.get_policy().log_stats()
+
+def _get_engine() -> playback.PlaybackEngine | None:
+    """返回播放引擎 (首次调用时初始化 Mixer)，Mixer 不可用时返回 None"""
+    engine = playback.get_engine()
+    if not engine.available:
+        log("Pygame Mixer 未初始化，无法播放语音。", title="ERROR", style="bold red")
+        return None
+    return engine
+
+def _log_first_audio(started_at: float, audible_at: float | None = None):
+    """记录从用户说完话到开始发声的延迟"""
+    log(f"首音延迟: {(audible_at or time.perf_counter()) - started_at:.2f}s", title="LATENCY", style="bold cyan")
+
+def _first_audio_logger(started_at: float | None) -> Callable[[float], None] | None:
+    """返回记录首音延迟的 on_start 回调 (started_at 为用户说完话的时间，None 表示不记录)"""
+    if started_at is None:
+        return None
+    return lambda audible_at: _log_first_audio(started_at, audible_at)
+
+async def _generate_and_play(text: str, started_at: float | None = None):
     """异步生成并播放语音"""
-    import time
     log("正在生成语音...", title="TTS", style="cyan")
-    # 选择语音和语速
-    communicate = edge_tts.Communicate(text, "zh-CN-XiaoxiaoNeural", rate='+20%')
-    temp_file = config.TEMP_DIR / f"response_{int(time.time())}.mp3"
-
     try:
-        await communicate.save(str(temp_file))
+        audio = await _synthesize(text)
+        engine = _get_engine()
+        if engine is None:
+            return
+        clip = engine.play(playback.decode(audio), on_start=_first_audio_logger(started_at))
         log("语音生成完毕，正在播放...", title="TTS", style="cyan")
-
-        # 检查 Mixer 是否已初始化
-        if not pygame.mixer.get_init():
-             log("Pygame Mixer 未初始化，无法播放语音。", title="ERROR", style="bold red")
-             return
-
-        pygame.mixer.music.load(str(temp_file))
-        pygame.mixer.music.play()
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10) # 避免 CPU 占用
-        # 不需要手动 quit mixer，除非程序结束
-        log("语音播放完毕。", title="TTS", style="cyan")
-    except pygame.error as e:
-         log(f"播放语音时 Pygame 出错: {e}", title="ERROR", style="bold red")
+        clip.done.wait()
+        if not clip.cancelled:
+            log("语音播放完毕。", title="TTS", style="cyan")
     except Exception as e:
          log(f"生成或播放语音时出错: {e}", title="ERROR", style="bold red")
+
+def speak_stream(chunks: Iterable[str], started_at: float | None = None) -> str:
+    """
+    流式播报: 把文本片段流 (例如 LLM 流式输出) 切分为句子，后台线程逐句合成并解码，当前线程按顺序交给播放引擎，
+    播放第一句时后续句子仍在生成和合成，下一句排在当前句之后无缝播放。返回完整文本。
+    """
+    parts = []
+
+    def collect():
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+
+    if not _tts_available():
+        for _ in collect():
+            pass
+        return "".join(parts)
+
+    # 已解码待播放的音频 (None 表示结束)；队列有界，合成最多领先播放 TTS_PREFETCH_SENTENCES 句
+    ready = queue.Queue(maxsize=config.TTS_PREFETCH_SENTENCES)
+    stop = threading.Event()
+    engine = _get_engine()
+    if engine is None:
+        stop.set() # 无法播放，不合成，但继续接收剩余文本
+
+    def synthesize_all():
+        loop = asyncio.new_event_loop()
+        try:
+            for sentence in split_sentences(collect()):
+                if stop.is_set():
+                    continue # 不再合成，但继续读取剩余文本
+                try:
+                    sound = playback.decode(loop.run_until_complete(_synthesize(sentence)))
+                except Exception as e:
+                    log(f"合成语音时出错 ('{sentence[:20]}'): {e}", title="ERROR", style="bold red")
+                    continue
+                ready.put(sound)
+        except Exception as e:
+            log(f"流式生成回答时出错: {e}", title="ERROR", style="bold red")
+        finally:
+            loop.close()
+            ready.put(None)
+
+    producer = threading.Thread(target=synthesize_all, name="tts-synth", daemon=True)
+    producer.start()
+    on_start = _first_audio_logger(started_at)
+    playing = deque() # 已交给播放引擎的句子
+    try:
+        while (sound := ready.get()) is not None:
+            if stop.is_set():
+                continue
+            playing.append(engine.play(sound, on_start=on_start))
+            on_start = None
+            # 引擎中最多保留正在播放的一句和排在其后的一句，其余留在 ready 队列中 (合成不会无限领先)
+            while len(playing) > 1:
+                playing.popleft().done.wait()
+        for clip in playing:
+            clip.done.wait()
     finally:
-        # 清理临时文件
-        if temp_file.exists():
-            try:
-                os.remove(temp_file)
-            except Exception as e_del:
-                log(f"删除临时 TTS 文件失败: {e_del}", title="WARNING", style="yellow")
-
-def speak(text: str):
-    """使用 edge-tts 将文本转换为语音并播放 (同步接口)"""
-    if not EDGE_TTS_AVAILABLE:
-        log("edge-tts 不可用，跳过语音播放。", title="WARNING", style="yellow")
+        producer.join()
+    return "".join(parts)
+
+def speak(text: str, started_at: float | None = None):
+    """将文本转换为语音并播放 (同步接口)"""
+    if not _tts_available():
         return
     if not text:
         log("TTS 收到空文本，跳过播放。", title="WARNING", style="yellow")
@@ -80,9 +221,92 @@ def speak(text: str):
 
         if loop.is_running():
             # 如果在异步环境，创建任务
-            asyncio.ensure_future(_generate_and_play(text))
+            asyncio.ensure_future(_generate_and_play(text, started_at))
         else:
             # 否则，运行直到完成
-            loop.run_until_complete(_generate_and_play(text))
+            loop.run_until_complete(_generate_and_play(text, started_at))
     except Exception as e:
          log(f"运行 TTS 异步任务时出错: {e}", title="ERROR", style="bold red")
+
+
+# --- asyncio 接口 (供 assistant_core 使用) ---
+def stop_playback():
+    """立即停止当前播放并丢弃排队的句子 (用于打断)"""
+    if playback._engine.loaded:
+        playback.get_engine().stop()
+
+async def speak_stream_async(chunks: AsyncIterable[str], started_at: float | None = None) -> str:
+    """
+    speak_stream 的异步版本: 合成任务逐句合成 (合成后端都是异步接口)，播放由播放引擎的线程完成，
+    这里只等待每句播放结束的 Future。被取消时立即停止播放并丢弃尚未播放的句子。返回已生成的文本。
+    """
+    parts = []
+    if not _tts_available():
+        async for chunk in chunks:
+            parts.append(chunk)
+        return "".join(parts)
+
+    ready = asyncio.Queue(maxsize=config.TTS_PREFETCH_SENTENCES)
+    muted = asyncio.Event() # 无法播放时不再合成，但继续接收剩余文本
+    engine = await asyncio.to_thread(_get_engine) # 首次调用时初始化 Mixer
+    if engine is None:
+        muted.set()
+
+    async def synthesize(sentence: str):
+        if muted.is_set():
+            return
+        try:
+            sound = await asyncio.to_thread(playback.decode, await _synthesize(sentence))
+        except Exception as e:
+            log(f"合成语音时出错 ('{sentence[:20]}'): {e}", title="ERROR", style="bold red")
+            return
+        await ready.put(sound)
+
+    async def synthesize_all():
+        splitter = SentenceSplitter()
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                for sentence in splitter.feed(chunk):
+                    await synthesize(sentence)
+            rest = splitter.flush()
+            if rest:
+                await synthesize(rest)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"流式生成回答时出错: {e}", title="ERROR", style="bold red")
+        await ready.put(None)
+
+    producer = asyncio.create_task(synthesize_all())
+    on_start = _first_audio_logger(started_at)
+    playing = deque() # 已交给播放引擎的句子 (播放结束时完成的 Future)
+    try:
+        while (sound := await ready.get()) is not None:
+            if muted.is_set():
+                continue
+            playing.append(engine.play_async(sound, on_start=on_start))
+            on_start = None
+            while len(playing) > 1: # 同 speak_stream: 引擎中最多保留两句
+                await playing.popleft()
+        for done in playing:
+            await done
+        await producer
+    except asyncio.CancelledError:
+        stop_playback()
+        log("语音播报已被打断。", title="TTS", style="yellow")
+        raise
+    finally:
+        if not producer.done():
+            producer.cancel()
+    return "".join(parts)
+
+async def speak_async(text: str, started_at: float | None = None):
+    """speak 的异步版本"""
+    if not text:
+        log("TTS 收到空文本，跳过播放。", title="WARNING", style="yellow")
+        return
+
+    async def single():
+        yield text
+    await speak_stream_async(single(), started_at)
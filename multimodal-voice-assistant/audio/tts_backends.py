@@ -0,0 +1,265 @@
+"""
+可替换的语音合成后端，以及在多个后端之间按延迟选择的策略。
+- edge: edge-tts (在线，音质好，每句一次网络往返)；
+- espeak: 本地 espeak-ng/espeak 命令行，音频经 stdout 直接读入内存；
+- pyttsx3: 本地系统语音引擎 (Windows SAPI5 / macOS NSSpeechSynthesizer / Linux espeak)。
+策略 (BackendPolicy): 按 TTS_BACKENDS 的偏好顺序，优先使用近期平均合成耗时在 TTS_LATENCY_BUDGET_S 内的后端；
+一句话超过 TTS_DEADLINE_S 仍未合成完时，同时用下一个后端合成，取先完成的结果 (出错时立即换下一个后端)。
+"""
+import abc
+import asyncio
+import importlib.util
+import itertools
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from logger import log
+import config
+from startup import LazySingleton
+
+class TTSBackend(abc.ABC):
+    """合成后端接口: synthesize 返回一句话的完整音频 (mp3/wav 等，由播放引擎按内容识别格式)"""
+    name = ""
+    available = False
+    cache_id = "" # 后端及其语音参数的标识 (合成缓存的键的一部分)
+
+    @abc.abstractmethod
+    async def synthesize(self, text: str) -> bytes:
+        """合成一句话，返回完整音频"""
+
+    async def stream(self, text: str) -> AsyncIterator[bytes]:
+        """按块返回音频 (不支持流式输出的后端一次返回全部)"""
+        yield await self.synthesize(text)
+
+
+class EdgeTTSBackend(TTSBackend):
+    name = "edge"
+
+    def __init__(self, voice: str = config.TTS_EDGE_VOICE, rate: str = config.TTS_EDGE_RATE):
+        # 只检查 edge_tts 是否安装，真正的导入推迟到首次合成
+        self.available = importlib.util.find_spec("edge_tts") is not None
+        self.voice = voice
+        self.rate = rate
+        self.cache_id = f"edge|{voice}|{rate}"
+
+    async def stream(self, text: str) -> AsyncIterator[bytes]:
+        import edge_tts
+        communicate = edge_tts.Communicate(text, self.voice, rate=self.rate)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    async def synthesize(self, text: str) -> bytes:
+        return b"".join([chunk async for chunk in self.stream(text)])
+
+
+class EspeakBackend(TTSBackend):
+    name = "espeak"
+
+    def __init__(self, voice: str = config.TTS_ESPEAK_VOICE, rate: int = config.TTS_LOCAL_RATE):
+        self.executable = shutil.which("espeak-ng") or shutil.which("espeak")
+        self.available = self.executable is not None
+        self.voice = voice
+        self.rate = rate
+        self.cache_id = f"espeak|{voice}|{rate}"
+
+    async def synthesize(self, text: str) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            self.executable, "-v", self.voice, "-s", str(self.rate), "--stdout", text,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            audio, error = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(f"{os.path.basename(self.executable)} 退出码 {process.returncode}: {error.decode(errors='replace').strip()}")
+        return audio
+
+
+class Pyttsx3Backend(TTSBackend):
+    """
+    pyttsx3 的引擎只能在创建它的线程中使用，因此所有合成都在一个专用线程中串行执行。
+    pyttsx3 只能输出到文件，合成结果先写入临时文件，读回内存后立即删除。
+    """
+    name = "pyttsx3"
+
+    def __init__(self, voice: str | None = config.TTS_PYTTSX3_VOICE, rate: int = config.TTS_LOCAL_RATE):
+        self.available = importlib.util.find_spec("pyttsx3") is not None
+        self.voice = voice
+        self.rate = rate
+        self.cache_id = f"pyttsx3|{voice}|{rate}"
+        self._engine = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyttsx3")
+        self._counter = itertools.count()
+
+    def _init_engine(self):
+        import pyttsx3
+        engine = pyttsx3.init()
+        engine.setProperty("rate", self.rate)
+        voice = self.voice
+        if voice is None: # 自动选择中文语音
+            for candidate in engine.getProperty("voices"):
+                names = " ".join([candidate.id, candidate.name or ""] + [str(lang) for lang in candidate.languages or []]).lower()
+                if "zh" in names or "chinese" in names or "cmn" in names:
+                    voice = candidate.id
+                    break
+        if voice is not None:
+            engine.setProperty("voice", voice)
+        return engine
+
+    def _synthesize_blocking(self, text: str) -> bytes:
+        if self._engine is None:
+            self._engine = self._init_engine()
+        path = config.TEMP_DIR / f"pyttsx3_{os.getpid()}_{next(self._counter)}.wav"
+        try:
+            self._engine.save_to_file(text, str(path))
+            self._engine.runAndWait()
+            return path.read_bytes()
+        finally:
+            if path.exists():
+                os.remove(path)
+
+    async def synthesize(self, text: str) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._synthesize_blocking, text)
+
+
+BACKEND_TYPES = {"edge": EdgeTTSBackend, "espeak": EspeakBackend, "pyttsx3": Pyttsx3Backend}
+
+
+class BackendStats:
+    """一个后端的合成耗时统计 (指数滑动平均)"""
+    def __init__(self):
+        self.ewma_s: float | None = None
+        self.last_sample_at = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0 # 超过期限后输给了其他后端的次数
+
+    def record(self, seconds: float):
+        alpha = config.TTS_BACKEND_EWMA_ALPHA
+        self.ewma_s = seconds if self.ewma_s is None else alpha * seconds + (1 - alpha) * self.ewma_s
+        self.last_sample_at = time.monotonic()
+
+    def as_dict(self) -> dict:
+        result = {"ok": self.successes, "failed": self.failures, "timeouts": self.timeouts}
+        if self.ewma_s is not None:
+            result["avg_ms"] = round(self.ewma_s * 1000)
+        return result
+
+
+class BackendPolicy:
+    """按偏好顺序和近期合成耗时选择后端，超过期限时用下一个后端竞速"""
+    def __init__(self, names: list[str] = config.TTS_BACKENDS, latency_budget_s: float = config.TTS_LATENCY_BUDGET_S,
+                 deadline_s: float | None = config.TTS_DEADLINE_S):
+        self.latency_budget_s = latency_budget_s
+        self.deadline_s = deadline_s
+        self.backends: list[TTSBackend] = []
+        for name in names:
+            backend_type = BACKEND_TYPES.get(name)
+            if backend_type is None:
+                log(f"未知的 TTS 后端: {name}", title="WARNING", style="yellow")
+                continue
+            backend = backend_type()
+            if backend.available:
+                self.backends.append(backend)
+            else:
+                log(f"TTS 后端 {name} 不可用 (未安装)，已跳过。", title="TTS", style="dim")
+        self.stats = {backend.name: BackendStats() for backend in self.backends}
+        if self.backends:
+            log(f"TTS 后端: {', '.join(backend.name for backend in self.backends)}", title="INIT", style="green")
+        else:
+            log("错误: 没有可用的 TTS 后端。无法使用 TTS 功能。", title="ERROR", style="bold red")
+            log("请尝试安装: pip install edge-tts (或 pyttsx3 / espeak-ng)", title="INFO", style="yellow")
+
+    @property
+    def available(self) -> bool:
+        return bool(self.backends)
+
+    def ranked(self) -> list[TTSBackend]:
+        """
+        本次合成的后端顺序: 平均耗时在预算内 (或还没有样本) 的后端按偏好顺序在前，其余按平均耗时排在后面。
+        超出预算的后端每隔 TTS_BACKEND_PROBE_S 重新排到前面试一次，以便网络恢复后回到首选后端。
+        """
+        now = time.monotonic()
+        within, over = [], []
+        for backend in self.backends:
+            stats = self.stats[backend.name]
+            if (stats.ewma_s is None or stats.ewma_s <= self.latency_budget_s
+                    or now - stats.last_sample_at > config.TTS_BACKEND_PROBE_S):
+                within.append(backend)
+            else:
+                over.append(backend)
+        return within + sorted(over, key=lambda backend: self.stats[backend.name].ewma_s)
+
+    async def _timed(self, backend: TTSBackend, text: str) -> bytes:
+        stats = self.stats[backend.name]
+        start = time.perf_counter()
+        try:
+            audio = await backend.synthesize(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats.failures += 1
+            stats.record(self.deadline_s or 2 * self.latency_budget_s) # 按超时计，连续失败的后端 (如断网) 会排到后面
+            raise
+        stats.successes += 1
+        stats.record(time.perf_counter() - start)
+        return audio
+
+    async def synthesize(self, text: str, backends: list[TTSBackend] | None = None) -> tuple[bytes, TTSBackend]:
+        """合成一句话，返回 (音频, 实际使用的后端)；所有后端都失败时抛出 RuntimeError"""
+        candidates = deque(backends or self.ranked())
+        pending: dict[asyncio.Task, TTSBackend] = {}
+        started: dict[asyncio.Task, float] = {}
+
+        def launch_next():
+            if candidates:
+                backend = candidates.popleft()
+                task = asyncio.ensure_future(self._timed(backend, text))
+                pending[task] = backend
+                started[task] = time.perf_counter()
+
+        launch_next()
+        try:
+            while pending:
+                timeout = self.deadline_s if candidates else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    slow = ", ".join(backend.name for backend in pending.values())
+                    log(f"合成超过 {self.deadline_s:.1f}s ({slow})，同时尝试 {candidates[0].name}", title="TTS", style="yellow")
+                    launch_next()
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        return task.result(), backend
+                    except Exception as e:
+                        log(f"TTS 后端 {backend.name} 合成失败: {e}", title="WARNING", style="yellow")
+                        launch_next()
+            raise RuntimeError("所有 TTS 后端均合成失败")
+        finally:
+            for task, backend in pending.items():
+                if task.done() and not task.cancelled():
+                    task.exception() # 同时完成但未被采用的结果
+                    continue
+                task.cancel()
+                elapsed = time.perf_counter() - started[task]
+                if self.deadline_s is not None and elapsed >= self.deadline_s: # 超过期限后输给了其他后端
+                    stats = self.stats[backend.name]
+                    stats.timeouts += 1
+                    stats.record(elapsed) # 实际耗时的下限
+
+    def log_stats(self):
+        """记录各后端的合成耗时和回退次数"""
+        summary = "，".join(f"{name} {stats.as_dict()}" for name, stats in self.stats.items())
+        log(f"TTS 后端: {summary or '无'}", title="TTS_STATS", style="cyan")
+
+
+# 后端策略在首次合成时创建
+_policy = LazySingleton("tts_backends", BackendPolicy)
+get_policy = _policy.get
@@ -0,0 +1,92 @@
+"""
+语音活动检测 (VAD)，基于帧能量和过零率。
+在送入 Whisper 之前裁剪首尾静音、把长录音切分为语音段，并丢弃没有语音的片段。
+Whisper 的解码时间与音频长度成正比，裁剪掉的每一秒静音都直接节省 CPU。
+"""
+import numpy as np
+import config
+
+def _frame_features(samples: np.ndarray, frame_len: int) -> tuple[np.ndarray, np.ndarray]:
+    """按帧计算 RMS 能量和过零率 (向量化，丢弃不足一帧的尾部)"""
+    n_frames = samples.size // frame_len
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_len)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_len - 1)
+    return rms, zcr
+
+def detect_speech_regions(samples: np.ndarray,
+                          sample_rate: int = config.STT_SAMPLE_RATE,
+                          frame_ms: int = config.VAD_FRAME_MS,
+                          threshold_ratio: float = config.VAD_THRESHOLD_RATIO,
+                          min_rms: float = config.VAD_MIN_RMS,
+                          min_speech_s: float = config.VAD_MIN_SPEECH_S,
+                          min_silence_s: float = config.VAD_MIN_SILENCE_S,
+                          pad_s: float = config.VAD_PAD_S) -> list[tuple[int, int]]:
+    """检测语音段，返回 [(起始采样, 结束采样), ...]；输入为未归一化的 float32 采样"""
+    frame_len = int(sample_rate * frame_ms / 1000)
+    if samples.size < frame_len:
+        return []
+    rms, zcr = _frame_features(samples, frame_len)
+
+    # 自适应阈值: 以较安静帧的能量作为噪声底，语音帧需显著高于噪声底
+    noise_floor = float(np.percentile(rms, 10))
+    threshold = max(noise_floor * threshold_ratio, min_rms)
+    # 清辅音 (s/sh/x 等) 能量较低但过零率高，适当放宽
+    voiced = (rms > threshold) | ((rms > threshold * 0.5) & (zcr > 0.25))
+    if not voiced.any():
+        return []
+
+    # 找出连续语音帧的起止位置
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    frame_s = frame_len / sample_rate
+    max_gap = int(min_silence_s / frame_s)
+    min_len = int(min_speech_s / frame_s)
+    pad = int(pad_s / frame_s)
+
+    # 合并间隔过短的语音段 (词间停顿)
+    merged = [[starts[0], ends[0]]]
+    for start, end in zip(starts[1:], ends[1:]):
+        if start - merged[-1][1] <= max_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    n_frames = rms.size
+    regions = []
+    for start, end in merged:
+        if end - start < min_len: # 过短，视为噪声
+            continue
+        start = max(start - pad, 0)
+        end = min(end + pad, n_frames)
+        regions.append((int(start * frame_len), int(end * frame_len) if end < n_frames else int(samples.size)))
+    return regions
+
+def has_speech(samples: np.ndarray, **kwargs) -> bool:
+    """片段中是否包含语音"""
+    return bool(detect_speech_regions(samples, **kwargs))
+
+def trim_silence(samples: np.ndarray, **kwargs) -> np.ndarray:
+    """裁剪首尾静音；没有语音时返回空数组 (返回视图，不复制)"""
+    regions = detect_speech_regions(samples, **kwargs)
+    if not regions:
+        return samples[:0]
+    return samples[regions[0][0]:regions[-1][1]]
+
+def split_speech(samples: np.ndarray, max_region_s: float = config.VAD_MAX_REGION_S,
+                 sample_rate: int = config.STT_SAMPLE_RATE, **kwargs) -> list[np.ndarray]:
+    """把录音切分为语音段；相邻语音段在不超过 max_region_s 时合并，以保留上下文 (返回视图列表)"""
+    regions = detect_speech_regions(samples, sample_rate=sample_rate, **kwargs)
+    if not regions:
+        return []
+    max_len = int(max_region_s * sample_rate)
+    chunks = [list(regions[0])]
+    for start, end in regions[1:]:
+        if end - chunks[-1][0] <= max_len:
+            chunks[-1][1] = end # 合并时连同中间的短暂停顿一起保留
+        else:
+            chunks.append([start, end])
+    return [samples[start:end] for start, end in chunks]
@@ -0,0 +1,109 @@
+"""
+唤醒词门控: 在运行完整 Whisper 模型之前，用低成本的两级检测判断是否包含唤醒词。
+第一级: 能量检测，过滤几乎无声的片段；
+第二级: 用 tiny 模型 (greedy 解码) 只识别开头 WAKE_GATE_WINDOW_S 秒并查找唤醒词。
+只有命中的片段才交给完整模型识别，并统计命中率和节省的 CPU 时间。
+"""
+import threading
+import time
+import numpy as np
+from logger import log
+import config
+from audio import stt
+from audio.preprocessing import preprocess_samples
+
+class WakeWordGate:
+    """两级唤醒词门控 (线程安全)"""
+    def __init__(self, wake_word: str = config.WAKE_WORD,
+                 model_size: str = config.WAKE_GATE_MODEL_SIZE,
+                 window_s: float = config.WAKE_GATE_WINDOW_S,
+                 min_rms: float = config.WAKE_GATE_MIN_RMS):
+        self.wake_word = wake_word
+        self.model_size = model_size
+        self.window_s = window_s
+        self.min_rms = min_rms
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.energy_rejects = 0 # 第一级 (能量) 直接拒绝的次数，包含在 misses 中
+        self.gate_cpu_s = 0.0 # 门控自身消耗的 CPU 时间
+        self.saved_cpu_s = 0.0 # 估算: 被拒绝片段若送入完整模型所需的 CPU 时间
+        self._full_cpu_per_audio_s = None # 完整模型每秒音频的 CPU 耗时 (指数滑动平均)
+
+    def _get_model(self):
+        """首次使用时加载 tiny 模型"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from faster_whisper import WhisperModel
+                    self._model = WhisperModel(self.model_size, device='cpu', compute_type='int8', cpu_threads=2)
+                    log(f"唤醒词检测模型 '{self.model_size}' 加载成功", title="INIT", style="green")
+        return self._model
+
+    def check(self, samples: np.ndarray) -> bool:
+        """判断 16kHz float32 采样 (未归一化，以便能量检测有意义) 中是否包含唤醒词"""
+        cpu_start = time.process_time() # 进程 CPU 时间，包含 ctranslate2 的计算线程 (与其他线程的解码重叠时偏大)
+        audio_s = samples.size / config.STT_SAMPLE_RATE
+        try:
+            head = samples[:int(self.window_s * config.STT_SAMPLE_RATE)]
+            rms = float(np.sqrt(np.dot(head, head) / head.size)) if head.size else 0.0
+            if rms < self.min_rms:
+                with self._stats_lock:
+                    self.energy_rejects += 1
+                hit = False
+            else:
+                # 不用唤醒词作 initial_prompt: 提示会让模型倾向于输出唤醒词，增加误触发
+                segments, _ = self._get_model().transcribe(
+                    preprocess_samples(head), language='zh', beam_size=1, without_timestamps=True,
+                    condition_on_previous_text=False,
+                )
+                text = stt.get_converter().convert("".join(s.text for s in segments))
+                hit = self.wake_word in text
+                log(f"唤醒词检测: '{text}' -> {'命中' if hit else '未命中'}", title="WAKE_GATE", style="dim")
+        except Exception as e:
+            # 门控失败时放行，由完整模型兜底，避免漏掉指令
+            log(f"唤醒词检测失败，直接使用完整模型: {e}", title="WARNING", style="yellow")
+            hit = True
+
+        gate_cpu = time.process_time() - cpu_start
+        with self._stats_lock:
+            self.gate_cpu_s += gate_cpu
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if self._full_cpu_per_audio_s is not None:
+                    self.saved_cpu_s += max(self._full_cpu_per_audio_s * audio_s - gate_cpu, 0.0)
+        return hit
+
+    def record_full_decode(self, cpu_s: float, audio_s: float):
+        """记录一次完整模型识别的 CPU 耗时，用于估算门控节省的 CPU 时间"""
+        if audio_s <= 0 or cpu_s <= 0:
+            return
+        rate = cpu_s / audio_s
+        with self._stats_lock:
+            prev = self._full_cpu_per_audio_s
+            self._full_cpu_per_audio_s = rate if prev is None else 0.8 * prev + 0.2 * rate
+
+    def stats(self) -> dict:
+        """返回门控统计信息"""
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "total": total,
+                "hits": self.hits,
+                "misses": self.misses,
+                "energy_rejects": self.energy_rejects,
+                "hit_rate": self.hits / total if total else 0.0,
+                "gate_cpu_s": round(self.gate_cpu_s, 3),
+                "saved_cpu_s": round(self.saved_cpu_s, 3),
+            }
+
+    def log_stats(self):
+        """将统计信息写入日志"""
+        s = self.stats()
+        log(f"唤醒词门控: 共 {s['total']} 段，命中 {s['hits']}，拒绝 {s['misses']} (能量拒绝 {s['energy_rejects']})，"
+            f"命中率 {s['hit_rate']:.1%}，门控耗时 {s['gate_cpu_s']}s CPU，估计节省 {s['saved_cpu_s']}s CPU",
+            title="WAKE_GATE_STATS", style="cyan")
@@ -1,26 +1,42 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+_import_start = time.perf_counter() # 用于统计启动耗时
+from flask import Flask, Response, request, jsonify, send_from_directory
 import os
+import queue
 import traceback
 
 # --- 导入你的助手核心逻辑 ---
 # (假设你的模块化代码结构如之前建议)
 import config
+import startup
 from logger import log, save_log # 导入日志
 from conversation import EnhancedConversationContext
 # from audio import stt, tts # 后端可能不需要直接处理音频 I/O
-from input_handler import take_screenshot, web_cam_capture, get_clipboard_text, encode_image
+from input_handler import take_screenshot, web_cam_capture
+from image_prep import image_mime
 from web_search import duckduckgo_search, process_search_results
-from llm_interface import llm_prompt, function_call
+from llm_interface import llm_prompt
+import speculation
+from assistant_core import AssistantCore
+from web_stream import format_sse, images, IMAGE_URL_PREFIX
 
 # --- 初始化 Flask 应用 ---
 app = Flask(__name__, static_folder='voice-assistant-frontend', static_url_path='')
 
 # --- 初始化助手组件 ---
 # (这些组件现在由后端管理，而不是在 main.py 的监听循环中)
+core = None
 try:
     conversation_context = EnhancedConversationContext()
+    # asyncio 助手核心在后台线程中运行事件循环，请求线程只等待回合结果
+    if config.ASYNC_CORE:
+        core = AssistantCore(conversation_context)
+        core.start()
     log("后端应用启动，对话上下文已初始化。", title="BACKEND_INIT", style="green")
-    # 可以在这里预加载模型或进行其他初始化，如果需要的话
+    # LLM SDK 在首次请求时才加载；需要时可在后台线程中提前预热
+    if config.WARMUP_ON_START and config.ACTIVE_LLM == 'gemini':
+        startup.warmup(["gemini_sdk"], background=True)
+    log(f"后端模块导入耗时 {time.perf_counter() - _import_start:.2f}s (详细报告: python startup.py backend_app)", title="BACKEND_INIT", style="dim")
 except Exception as e:
     log(f"后端初始化助手组件时出错: {e}", title="BACKEND_ERROR", style="bold red")
     # 根据错误严重性决定是否退出
@@ -31,7 +47,12 @@ def handle_command(command_text):
     """处理来自前端的文本指令"""
     log(f'收到指令: {command_text}', title="API_REQUEST", style="bold green")
     response_text = ""
-    image_data_base64 = None # 用于存储可能的图片数据
+    image = None # 截图/摄像头画面 (编码后的数据)
+
+    if core:
+        result = core.run(core.handle_turn(command_text, speak=False))
+        log(f'助手响应: {result.text[:100]}...', title="API_RESPONSE", style="bold magenta")
+        return result.text, result.image
 
     try:
         # --- 处理特殊指令 ---
@@ -43,7 +64,7 @@ def handle_command(command_text):
             else:
                 response_text = "请告诉我需要记住什么。" if config.ACTIVE_LLM == 'deepseek' else "Please tell me what to remember."
         elif command_text.lower() in ["忘记所有", "清除记忆", "忘记刚才说的"]:
-            response_text = conversation_context.forget()
+            response_text = conversation_context.forget(all_memories=command_text.lower() == "忘记所有")
         elif command_text.lower().startswith("搜索 "):
             search_query = command_text[len("搜索 "):].strip()
             if search_query:
@@ -59,31 +80,23 @@ def handle_command(command_text):
 
         # --- 常规处理流程 ---
         else:
-            call = function_call(command_text)
-            img_base64_for_llm = None
+            # 本地路由器没有把握时，LLM 决策与不带附件的主回答并行推测执行
+            plan = speculation.plan_turn(conversation_context, command_text)
+            call = plan.call
             clipboard_context = None
-            photo_path_to_delete = None # 追踪临时文件
 
             if 'take screenshot' in call:
-                photo_path = take_screenshot()
-                if photo_path:
-                    img_base64_for_llm = encode_image(photo_path)
-                    image_data_base64 = img_base64_for_llm # 将截图数据也传给前端（如果需要）
-                    photo_path_to_delete = photo_path
-                else:
+                image = take_screenshot() # 同一份数据传给 LLM 和前端
+                if not image:
                     error_msg = "(系统提示: 截图操作失败)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Screenshot failed)"
                     command_text += error_msg
             elif 'capture webcam' in call:
-                photo_path = web_cam_capture()
-                if photo_path:
-                    img_base64_for_llm = encode_image(photo_path)
-                    image_data_base64 = img_base64_for_llm # 将摄像头数据也传给前端
-                    photo_path_to_delete = photo_path
-                else:
+                image = web_cam_capture()
+                if not image:
                     error_msg = "(系统提示: 摄像头捕捉失败)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Webcam capture failed)"
                     command_text += error_msg
             elif 'extract clipboard' in call:
-                paste = get_clipboard_text()
+                paste = plan.get_clipboard_text()
                 if paste:
                     if config.ACTIVE_LLM == 'gemini':
                          clipboard_context = f'\n\nCurrent clipboard content:\n"""\n{paste}\n"""'
@@ -96,22 +109,17 @@ def handle_command(command_text):
             if clipboard_context:
                 final_prompt += clipboard_context
 
-            response_text = llm_prompt(conversation_context, final_prompt, img_base64=img_base64_for_llm)
+            if plan.answer: # 推测命中，直接使用已在生成的回答
+                response_text = "".join(plan.answer)
+            else:
+                response_text = llm_prompt(conversation_context, final_prompt, image=image)
 
             # 添加交互到上下文
             if response_text:
                  conversation_context.add_exchange(command_text, response_text) # 使用原始指令
 
-            # 清理临时图片文件
-            if photo_path_to_delete and photo_path_to_delete.exists():
-                try:
-                    os.remove(photo_path_to_delete)
-                    log(f"已删除临时图片文件: {photo_path_to_delete.name}", title="CLEANUP", style="dim")
-                except Exception as e_del_img:
-                    log(f"删除临时图片文件失败: {e_del_img}", title="WARNING", style="yellow")
-
         log(f'助手响应: {response_text[:100]}...', title="API_RESPONSE", style="bold magenta")
-        return response_text, image_data_base64 # 返回文本和可能的图片数据
+        return response_text, image # 返回文本和可能的图片数据
 
     except Exception as e:
         log(f"处理指令时发生错误: {e}", title="API_ERROR", style="bold red")
@@ -131,19 +139,69 @@ def api_command():
     command = data['command']
     # command_type = data.get('type', 'text') # 可以根据类型做不同处理，暂时只用 command
 
-    response_text, image_data = handle_command(command)
+    response_text, image = handle_command(command)
 
     if response_text is None: # 如果处理函数返回 None 表示严重错误
          return jsonify({"error": "处理指令时发生严重内部错误"}), 500
 
     response_payload = {"response": response_text}
-    if image_data:
-        # 如果有图片，将其包含在响应中 (例如 Base64 格式)
-        response_payload["image_base64"] = image_data
-        # 或者可以保存图片并返回 URL，但这更复杂
+    if image:
+        response_payload["image_url"] = images.put(image, image_mime(image)) # 前端按 URL 获取图片
 
     return jsonify(response_payload)
 
+@app.route('/api/command/stream', methods=['POST'])
+def api_command_stream():
+    """以 SSE 推送回合: status (功能调用/搜索)、image (图片 URL)、token (回答片段)，最后是 done 或 error"""
+    data = request.get_json()
+    if not data or 'command' not in data:
+        return jsonify({"error": "请求体无效，缺少 'command' 字段"}), 400
+    command = data['command']
+    return Response(_stream_command(command), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _stream_command(command):
+    """生成回合的 SSE 事件；未启用助手核心时只在回合结束后发送一条 done 事件"""
+    log(f'收到指令: {command}', title="API_REQUEST", style="bold green")
+    if not core:
+        response_text, image = handle_command(command)
+        payload = {"response": response_text}
+        if image:
+            payload["image_url"] = images.put(image, image_mime(image))
+        yield format_sse("done", payload)
+        return
+
+    events = queue.Queue() # 事件在助手核心的事件循环线程中产生
+    turn = core.submit(core.handle_turn(command, speak=False, on_event=lambda event, data: events.put((event, data))))
+    turn.add_done_callback(lambda _: events.put(("done", None)))
+    image_url = None
+    try:
+        while True:
+            event, data = events.get()
+            if event == "image":
+                image_url = images.put(data["data"], data["mime"])
+                data = {"url": image_url}
+            elif event == "done":
+                result = turn.result()
+                log(f'助手响应: {result.text[:100]}...', title="API_RESPONSE", style="bold magenta")
+                data = {"response": result.text}
+                if image_url:
+                    data["image_url"] = image_url
+            yield format_sse(event, data)
+            if event == "done":
+                break
+    finally:
+        turn.cancel() # 客户端断开时取消回合 (关闭 LLM 流)
+
+@app.route(IMAGE_URL_PREFIX + '<image_id>')
+def api_image(image_id):
+    """返回回合中捕捉的图片"""
+    image = images.get(image_id)
+    if image is None:
+        return jsonify({"error": "图片不存在或已过期"}), 404
+    data, mime = image
+    return Response(data, mimetype=mime, headers={"Cache-Control": "private, max-age=600"})
+
 # --- 前端文件服务 ---
 @app.route('/')
 def serve_index():
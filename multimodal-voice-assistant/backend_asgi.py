@@ -0,0 +1,185 @@
+"""
+ASGI 版 Web 后端 (Starlette + uvicorn)，与 backend_app.py 的接口兼容。
+- 每个会话独立的对话上下文 (session id 取自请求体 session_id、X-Session-Id 请求头或 Cookie，
+  只接受本服务签发的 id，缺省或无效时签发新的并通过 HttpOnly Cookie 返回)；
+- 所有回合在同一个事件循环中并发执行，同时进行的回合数受 BACKEND_MAX_CONCURRENT_TURNS 限制，排队超时返回 503；
+- /api/command/stream 以 SSE 推送过程事件和回答片段，图片通过 /api/images/<id> 获取。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python backend_asgi.py
+    或 uvicorn backend_asgi:app --host 0.0.0.0 --port 5000
+"""
+import time
+_import_start = time.perf_counter() # 用于统计启动耗时
+import asyncio
+import contextlib
+import os
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+import config
+import startup
+from logger import log, save_log
+from assistant_core import AssistantCore, TurnResult
+from sessions import Session, SessionStore
+from web_stream import format_sse, images, IMAGE_URL_PREFIX
+from image_prep import image_mime
+from api.deepseek_async import close_async_client
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'voice-assistant-frontend')
+SESSION_COOKIE = "session_id"
+
+core = AssistantCore()
+sessions = SessionStore()
+_turn_slots = asyncio.Semaphore(config.BACKEND_MAX_CONCURRENT_TURNS)
+
+class BackendBusy(Exception):
+    """排队等待回合名额超时"""
+
+def _session_id(request: Request, data: dict) -> tuple[str, bool]:
+    """返回 (session id, 是否为新分配)；客户端自选或伪造的 id 不被接受"""
+    for candidate in (data.get("session_id"), request.headers.get("X-Session-Id"), request.cookies.get(SESSION_COOKIE)):
+        if sessions.is_valid_id(candidate):
+            return candidate, False
+    return sessions.new_id(), True
+
+async def _parse_command(request: Request) -> tuple[str, Session, bool] | JSONResponse:
+    """解析请求体，返回 (指令, 会话, 会话是否为新分配)；请求无效时返回 400 响应"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'command' not in data:
+        return JSONResponse({"error": "请求体无效，缺少 'command' 字段"}, status_code=400)
+    session_id, is_new = _session_id(request, data)
+    log(f'收到指令 [{session_id[:8]}]: {data["command"]}', title="API_REQUEST", style="bold green")
+    return data['command'], sessions.get(session_id), is_new
+
+@contextlib.asynccontextmanager
+async def _turn_slot(session: Session):
+    """占用一个回合名额并锁定会话；排队超时抛出 BackendBusy"""
+    queued_at = time.perf_counter()
+    try:
+        await asyncio.wait_for(_turn_slots.acquire(), config.BACKEND_QUEUE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        log(f"排队超过 {config.BACKEND_QUEUE_TIMEOUT_S:.0f}s，拒绝请求。", title="API_BUSY", style="yellow")
+        raise BackendBusy from None
+    try:
+        queue_s = time.perf_counter() - queued_at
+        if queue_s > 0.1:
+            log(f"请求排队 {queue_s:.2f}s", title="API_QUEUE", style="dim")
+        async with session.lock:
+            yield
+    finally:
+        _turn_slots.release()
+
+def _with_session_cookie(response: Response, session: Session, is_new: bool) -> Response:
+    if is_new:
+        response.set_cookie(SESSION_COOKIE, session.session_id, httponly=True, samesite="lax")
+    return response
+
+def _result_payload(result: TurnResult, session: Session, image_url: str | None) -> dict:
+    payload = {"response": result.text, "session_id": session.session_id}
+    if image_url:
+        payload["image_url"] = image_url
+    return payload
+
+async def api_command(request: Request):
+    """接收前端指令并返回响应 (与 Flask 版相同: {"response": ..., "image_url": ...})"""
+    parsed = await _parse_command(request)
+    if isinstance(parsed, Response):
+        return parsed
+    command, session, is_new = parsed
+    try:
+        async with _turn_slot(session):
+            result = await core.handle_turn(command, conversation_context=session.context, speak=False)
+    except BackendBusy:
+        return JSONResponse({"error": "服务器繁忙，请稍后再试"}, status_code=503)
+
+    log(f'助手响应: {result.text[:100]}...', title="API_RESPONSE", style="bold magenta")
+    payload = _result_payload(result, session, images.put(result.image, image_mime(result.image)) if result.image else None)
+    return _with_session_cookie(JSONResponse(payload), session, is_new)
+
+async def api_command_stream(request: Request):
+    """以 SSE 推送回合: status (功能调用/搜索)、image (图片 URL)、token (回答片段)，最后是 done 或 error"""
+    parsed = await _parse_command(request)
+    if isinstance(parsed, Response):
+        return parsed
+    command, session, is_new = parsed
+    events = asyncio.Queue()
+    image_url = None
+
+    def on_event(event: str, data: dict):
+        events.put_nowait((event, data))
+
+    async def run_turn():
+        try:
+            async with _turn_slot(session):
+                result = await core.handle_turn(command, conversation_context=session.context, speak=False, on_event=on_event)
+            events.put_nowait(("done", result))
+        except BackendBusy:
+            events.put_nowait(("error", {"error": "服务器繁忙，请稍后再试"}))
+
+    async def stream():
+        nonlocal image_url
+        turn = asyncio.create_task(run_turn())
+        try:
+            while True:
+                event, data = await events.get()
+                if event == "image":
+                    image_url = images.put(data["data"], data["mime"])
+                    data = {"url": image_url}
+                elif event == "done":
+                    log(f'助手响应: {data.text[:100]}...', title="API_RESPONSE", style="bold magenta")
+                    data = _result_payload(data, session, image_url)
+                yield format_sse(event, data)
+                if event in ("done", "error"):
+                    break
+        finally:
+            turn.cancel() # 客户端断开时取消回合 (关闭 LLM 流)
+
+    response = StreamingResponse(stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return _with_session_cookie(response, session, is_new)
+
+async def api_image(request: Request):
+    """返回回合中捕捉的图片"""
+    image = images.get(request.path_params["image_id"])
+    if image is None:
+        return JSONResponse({"error": "图片不存在或已过期"}, status_code=404)
+    data, mime = image
+    return Response(data, media_type=mime, headers={"Cache-Control": "private, max-age=600"})
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # LLM SDK 在首次请求时才加载；需要时可在后台线程中提前预热
+    if config.WARMUP_ON_START and config.ACTIVE_LLM == 'gemini':
+        startup.warmup(["gemini_sdk"], background=True)
+    log(f"后端模块导入耗时 {time.perf_counter() - _import_start:.2f}s", title="BACKEND_INIT", style="dim")
+    yield
+    await close_async_client()
+    log(f"后端已停止 (回合: {core.stats()}，会话: {sessions.stats()})", title="BACKEND_INIT", style="dim")
+    save_log()
+
+app = Starlette(
+    routes=[
+        Route('/api/command', api_command, methods=['POST']),
+        Route('/api/command/stream', api_command_stream, methods=['POST']),
+        Route(IMAGE_URL_PREFIX + '{image_id}', api_image, methods=['GET']),
+        Mount('/', StaticFiles(directory=STATIC_DIR, html=True)), # 前端文件服务
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    key_to_check = config.GEMINI_API_KEY if config.ACTIVE_LLM == 'gemini' else config.DEEPSEEK_API_KEY
+    if not key_to_check or not key_to_check.strip() or key_to_check in ("YOUR_GEMINI_API_KEY", "sk-xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"):
+        log(f"错误: 请在 config.py 中为 {config.ACTIVE_LLM.upper()} 设置有效的 API 密钥。后端服务未启动。", title="CONFIG_ERROR", style="bold red")
+        save_log()
+    else:
+        log("启动 ASGI 后端服务器...", title="BACKEND_INIT", style="bold blue")
+        uvicorn.run(app, host=config.BACKEND_HOST, port=config.BACKEND_PORT)
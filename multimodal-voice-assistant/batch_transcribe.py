@@ -0,0 +1,152 @@
+"""
+批量转录离线音频语料，用于评估唤醒词和模型大小等设置。
+复用 STT 缓存和 Whisper 工作池，结果写入 JSONL，并报告实时率 (RTF) 和吞吐量。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python batch_transcribe.py recordings/ -o results.jsonl
+    python batch_transcribe.py a.wav b.mp3 @more_files.txt --batch-size 16
+"""
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+import config
+from logger import log
+from audio import preprocessing, stt, stt_service, vad
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".ogg", ".m4a", ".webm"}
+
+def collect_files(inputs: list[str]) -> list[Path]:
+    """展开输入: 目录 (递归查找音频文件)、单个文件，或以 @ 开头的文件列表"""
+    files = []
+    for item in inputs:
+        if item.startswith("@"):
+            list_file = Path(item[1:])
+            files.extend(Path(line.strip()) for line in list_file.read_text(encoding="utf-8").splitlines() if line.strip())
+            continue
+        path = Path(item)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+def load_samples(path: Path, use_vad: bool):
+    """解码音频文件并预处理，返回 (采样, 原始时长秒)"""
+    raw = preprocessing.pcm_to_float32(preprocessing.load_audio_pcm(path))
+    duration = raw.size / config.STT_SAMPLE_RATE
+    if use_vad:
+        raw = vad.trim_silence(raw)
+    return preprocessing.preprocess_samples(raw), duration
+
+class _BatchedDecoder:
+    """使用 faster-whisper 的 BatchedInferencePipeline，在单个文件内按批解码 (适合 GPU 和长音频)"""
+    def __init__(self, batch_size: int):
+        from faster_whisper import BatchedInferencePipeline
+        self.pipeline = BatchedInferencePipeline(model=stt.get_whisper_model())
+        self.batch_size = batch_size
+
+    def transcribe(self, samples) -> str:
+        """查缓存，未命中时批量解码并写入缓存"""
+        key = stt.cache_key(samples)
+        cached = stt.get_stt_cache().get(key)
+        if cached:
+            return stt.result_to_text(cached, cached=True)
+        segments_gen, info = self.pipeline.transcribe(samples, language='zh', batch_size=self.batch_size)
+        segments = list(segments_gen)
+        result = {
+            "text": "".join(s.text for s in segments).strip(),
+            "segments": [{"start": s.start, "end": s.end, "text": s.text} for s in segments],
+            "language": info.language,
+            "language_probability": info.language_probability,
+        }
+        stt.get_stt_cache().put(key, result)
+        return stt.result_to_text(result)
+
+def run(files: list[Path], output: Path, use_vad: bool = True, batch_size: int = 1,
+        loaders: int = 2, max_pending: int | None = None) -> dict:
+    """转录文件列表并写入 JSONL，返回吞吐量统计"""
+    service = None if batch_size > 1 else stt_service.get_stt_service()
+    batched = _BatchedDecoder(batch_size) if batch_size > 1 else None
+    max_pending = max_pending or config.STT_WORKERS + config.STT_QUEUE_SIZE
+    pending = deque() # (路径, 解码 Future, 识别 Future)，按提交顺序写出，保证内存有界
+    total_audio_s = 0.0
+    done = failed = 0
+    wall_start = time.perf_counter()
+
+    def write_one(out, path, load_future: Future, text_future: Future | None):
+        nonlocal total_audio_s, done, failed
+        record = {"path": str(path)}
+        try:
+            _, duration = load_future.result()
+            text = text_future.result() if text_future else ""
+            record.update(text=text, duration_s=round(duration, 3))
+            total_audio_s += duration
+            done += 1
+        except Exception as e:
+            record["error"] = str(e)
+            failed += 1
+            log(f"转录失败 {path}: {e}", title="ERROR", style="bold red")
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    # 批量解码在单独的线程中按提交顺序执行 (同一时间只占用一次模型)，使文件加载与解码重叠
+    with output.open("w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=loaders, thread_name_prefix="loader") as loader_pool, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="batched-stt") as decode_pool:
+        # 预先提交少量解码任务，使磁盘 I/O 和音频解码与识别重叠
+        load_futures = deque((path, loader_pool.submit(load_samples, path, use_vad)) for path in files[:max_pending])
+        next_index = len(load_futures)
+        while load_futures or pending:
+            if load_futures:
+                path, load_future = load_futures.popleft()
+                if next_index < len(files):
+                    load_futures.append((files[next_index], loader_pool.submit(load_samples, files[next_index], use_vad)))
+                    next_index += 1
+                text_future = None
+                try:
+                    samples, _ = load_future.result()
+                    if samples.size:
+                        if batched:
+                            text_future = decode_pool.submit(batched.transcribe, samples)
+                        else:
+                            text_future = service.submit(samples) # 队列满时阻塞 (背压)
+                except Exception:
+                    pass # 错误在 write_one 中记录
+                pending.append((path, load_future, text_future))
+            # 队列达到上限或输入耗尽时按顺序写出已提交的结果
+            while pending and (len(pending) >= max_pending or not load_futures):
+                write_one(out, *pending.popleft())
+
+    wall_s = time.perf_counter() - wall_start
+    return {
+        "files": done,
+        "failed": failed,
+        "audio_s": round(total_audio_s, 2),
+        "wall_s": round(wall_s, 2),
+        "rtf": round(wall_s / total_audio_s, 4) if total_audio_s else None, # 实时率: 越小越快
+        "audio_s_per_wall_s": round(total_audio_s / wall_s, 2) if wall_s else None,
+        "cache_hit_rate": round(stt.get_stt_cache().stats()["hit_rate"], 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="批量转录音频文件", formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("inputs", nargs="+", help="音频目录、音频文件或 @文件列表")
+    parser.add_argument("-o", "--output", type=Path, default=Path("transcripts.jsonl"), help="输出 JSONL 文件")
+    parser.add_argument("--no-vad", action="store_true", help="不裁剪首尾静音")
+    parser.add_argument("--batch-size", type=int, default=1, help=">1 时使用 BatchedInferencePipeline 在文件内批量解码")
+    parser.add_argument("--loaders", type=int, default=2, help="并行解码音频文件的线程数")
+    args = parser.parse_args()
+
+    files = collect_files(args.inputs)
+    if not files:
+        print("没有找到音频文件。")
+        sys.exit(1)
+    log(f"开始批量转录 {len(files)} 个文件...", title="BATCH", style="bold blue")
+    stats = run(files, args.output, use_vad=not args.no_vad, batch_size=args.batch_size, loaders=args.loaders)
+    log(f"批量转录完成: {stats}", title="BATCH", style="bold green")
+    print(json.dumps(stats, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+截图准备基准: 对固定的图像集比较各编码方案的编码耗时、数据大小和画质。
+- 图像集: 合成的代码编辑器 / 文档 / 界面截图 (2560x1440) 和摄像头画面 (640x480)，每张图中有一个小字号的编号；
+  也可以用 --images 加入真实截图；
+- 方案: 旧方案 (原分辨率 JPEG q15) 和 image_prep 的各格式 x 目标分辨率 (在 --max-kb 预算内搜索质量)；
+  编码耗时分别列出首次 (没有上次的质量可参考，完整搜索) 和之后各次的中位数 (连续截图的情况)；
+- 画质: 解码后放大回原尺寸与原图比较的 PSNR (近似可读性，不需要 API 密钥)；
+  加 --ask 时把图片发给当前配置的 LLM，问图中的编号，统计答对率和请求耗时 (真实的回答质量，需要 API 密钥)。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python benchmarks/bench_image_prep.py [--formats webp jpeg] [--sides 1024 1536] [--max-kb 150] [--repeat 5] [--images a.png ...] [--ask]
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import config
+import image_prep
+
+QUESTION = "图片中 “编号:” 后面的编号是什么？只回答编号本身。"
+
+def _font(size: int):
+    return ImageFont.load_default(size=size)
+
+def _code_screen(rng: np.random.Generator, code: str) -> Image.Image:
+    """深色背景的代码编辑器截图"""
+    image = Image.new("RGB", (2560, 1440), (30, 30, 36))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 360, 1440), fill=(37, 37, 44)) # 文件列表
+    words = ["def", "return", "self", "import", "for", "in", "if", "else", "config", "log", "await", "async", "None"]
+    colors = [(86, 156, 214), (206, 145, 120), (220, 220, 170), (156, 220, 254), (212, 212, 212)]
+    for row in range(1, 60):
+        draw.text((20, row * 24), f"module_{row}.py", fill=(170, 170, 170), font=_font(15))
+        x = 400 + 28 * int(rng.integers(0, 4))
+        for _ in range(int(rng.integers(2, 9))):
+            word = str(rng.choice(words))
+            draw.text((x, row * 24), word, fill=colors[int(rng.integers(len(colors)))], font=_font(16))
+            x += 12 * len(word) + 10
+    draw.text((2100, 1400), f"编号: {code}", fill=(200, 200, 200), font=_font(16))
+    return image
+
+def _document_screen(rng: np.random.Generator, code: str) -> Image.Image:
+    """白底黑字的文档截图"""
+    image = Image.new("RGB", (2560, 1440), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz     "))
+    for row in range(2, 58):
+        line = "".join(rng.choice(letters, size=int(rng.integers(120, 190))))
+        draw.text((200, row * 24), line, fill=(20, 20, 20), font=_font(16))
+    draw.text((200, 1400), f"编号: {code}", fill=(20, 20, 20), font=_font(16))
+    return image
+
+def _ui_screen(rng: np.random.Generator, code: str) -> Image.Image:
+    """带渐变背景、色块和按钮的界面截图"""
+    x = np.linspace(0, 1, 2560, dtype=np.float32)[None, :, None]
+    y = np.linspace(0, 1, 1440, dtype=np.float32)[:, None, None]
+    gradient = (np.array([40, 90, 160]) * (1 - x) + np.array([200, 120, 60]) * x) * (0.6 + 0.4 * y)
+    image = Image.fromarray(gradient.astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        left, top = int(rng.integers(0, 2300)), int(rng.integers(0, 1300))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        draw.rounded_rectangle((left, top, left + int(rng.integers(80, 260)), top + int(rng.integers(30, 140))), 8, fill=color)
+        draw.text((left + 10, top + 8), "Button", fill=(255, 255, 255), font=_font(16))
+    draw.rectangle((1900, 1380, 2200, 1420), fill=(255, 255, 255))
+    draw.text((1910, 1390), f"编号: {code}", fill=(0, 0, 0), font=_font(16))
+    return image
+
+def _webcam_frame(rng: np.random.Generator, code: str) -> Image.Image:
+    """带传感器噪声的摄像头画面"""
+    x = np.linspace(-1, 1, 640, dtype=np.float32)[None, :]
+    y = np.linspace(-1, 1, 480, dtype=np.float32)[:, None]
+    face = np.exp(-(x ** 2 + (y + 0.1) ** 2) * 4)[..., None] * np.array([120, 90, 70])
+    frame = np.array([60, 70, 80]) + face + rng.normal(0, 8, (480, 640, 3))
+    image = Image.fromarray(np.clip(frame, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((20, 420, 260, 460), fill=(250, 250, 250))
+    draw.text((30, 430), f"编号: {code}", fill=(0, 0, 0), font=_font(18))
+    return image
+
+def make_image_set() -> list[tuple[str, Image.Image, str]]:
+    """固定的合成图像集: (名称, 图像, 图中的编号)"""
+    rng = np.random.default_rng(0)
+    generators = [("code", _code_screen), ("document", _document_screen), ("ui", _ui_screen), ("webcam", _webcam_frame)]
+    images = []
+    for name, generate in generators:
+        code = f"{int(rng.integers(1000, 9999))}-{''.join(rng.choice(list('ABCDEFGHJKLMNPQRSTUVWXYZ'), 2))}"
+        images.append((name, generate(rng, code), code))
+    return images
+
+def psnr(original: Image.Image, data: bytes) -> float:
+    """解码后放大回原尺寸，与原图比较的 PSNR (dB)"""
+    decoded = Image.open(io.BytesIO(data)).convert("RGB").resize(original.size, Image.Resampling.BICUBIC)
+    error = np.mean((np.asarray(original, dtype=np.float32) - np.asarray(decoded, dtype=np.float32)) ** 2)
+    return float("inf") if error == 0 else 10 * np.log10(255 ** 2 / error)
+
+def baseline(image: Image.Image) -> image_prep.PreparedImage:
+    """旧方案: 原分辨率 JPEG，固定质量 15"""
+    start = time.perf_counter()
+    data = image_prep.encode(image, "jpeg", 15)
+    return image_prep.PreparedImage(data, "image/jpeg", image.width, image.height, 15, (time.perf_counter() - start) * 1000)
+
+def ask(data: bytes, code: str) -> tuple[bool, float]:
+    """把图片发给当前配置的 LLM 询问编号，返回 (是否答对, 请求耗时秒)"""
+    from conversation import EnhancedConversationContext
+    from llm_interface import llm_prompt
+    start = time.perf_counter()
+    answer = llm_prompt(EnhancedConversationContext(), QUESTION, image=data) or ""
+    return code.replace(" ", "") in answer.replace(" ", "").upper(), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=["webp", "jpeg"], help="编码格式")
+    parser.add_argument("--sides", type=int, nargs="+", default=sorted(set(config.IMAGE_MAX_SIDE.values())),
+                        help="目标分辨率 (长边像素)")
+    parser.add_argument("--max-kb", type=float, default=config.IMAGE_MAX_BYTES / 1024, help="字节预算 (KB)")
+    parser.add_argument("--repeat", type=int, default=5, help="每个方案的编码次数 (至少 2 次)")
+    parser.add_argument("--images", nargs="*", default=[], help="额外加入的截图文件 (没有编号，不参与 --ask)")
+    parser.add_argument("--ask", action="store_true", help=f"把图片发给 {config.ACTIVE_LLM} 询问编号 (需要 API 密钥)")
+    args = parser.parse_args()
+
+    image_set = make_image_set() + [(Path(path).stem, Image.open(path).convert("RGB"), None) for path in args.images]
+    max_bytes = int(args.max_kb * 1024)
+    schemes = [("jpeg q15 原尺寸", baseline)] + [
+        (f"{fmt} {side}", lambda image, fmt=fmt, side=side: image_prep.prepare_image(image, side, fmt, max_bytes))
+        for fmt in args.formats for side in args.sides
+    ]
+
+    header = (f"{'图像':<10} {'方案':<16} {'尺寸':>10} {'质量':>4} {'大小(KB)':>9} "
+              f"{'首次(ms)':>9} {'之后(ms)':>9} {'PSNR(dB)':>9}")
+    print(f"字节预算 {args.max_kb:.0f} KB，每个方案编码 {args.repeat} 次")
+    print(header + (f" {'答对':>4} {'请求(s)':>8}" if args.ask else ""))
+    for name, image, code in image_set:
+        for label, prepare in schemes:
+            image_prep._last_quality.clear()
+            runs = [prepare(image) for _ in range(max(2, args.repeat))]
+            result = runs[-1]
+            line = (f"{name:<10} {label:<16} {f'{result.width}x{result.height}':>10} {result.quality:>4} "
+                    f"{len(result.data) / 1024:>9.1f} {runs[0].encode_ms:>9.1f} "
+                    f"{statistics.median(run.encode_ms for run in runs[1:]):>9.1f} {psnr(image, result.data):>9.2f}")
+            if args.ask and code:
+                correct, seconds = ask(result.data, code)
+                line += f" {'是' if correct else '否':>4} {seconds:>8.2f}"
+            print(line)
+
+if __name__ == "__main__":
+    main()
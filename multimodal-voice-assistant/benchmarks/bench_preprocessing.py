@@ -0,0 +1,68 @@
+"""
+音频预处理微基准: NumPy 向量化路径 vs 旧的 pydub 路径。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python benchmarks/bench_preprocessing.py [--lengths 1 3 5 10 20] [--repeat 50]
+"""
+import argparse
+import io
+import sys
+import timeit
+import wave
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.effects import normalize
+import config
+from audio.preprocessing import preprocess_pcm
+
+def make_utterance(seconds: float, seed: int = 0) -> bytes:
+    """生成带直流偏移和噪声的合成语音 PCM (16kHz, int16)"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * config.STT_SAMPLE_RATE)
+    t = np.arange(n, dtype=np.float32) / config.STT_SAMPLE_RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) # 模拟音节起伏
+    signal = 0.2 * envelope * np.sin(2 * np.pi * 220 * t) + 0.01 * rng.standard_normal(n) + 0.02
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes()
+
+def to_wav_bytes(pcm: bytes) -> bytes:
+    """将 PCM 封装为内存中的 WAV 文件"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(config.STT_SAMPLE_WIDTH)
+        wf.setframerate(config.STT_SAMPLE_RATE)
+        wf.writeframes(pcm)
+    return buffer.getvalue()
+
+def pydub_path(wav_bytes: bytes) -> bytes:
+    """旧路径: 解码 WAV -> pydub normalize -> 重新编码 WAV (使用内存缓冲区，未计入磁盘 I/O)"""
+    audio = AudioSegment.from_file(io.BytesIO(wav_bytes), format="wav")
+    out = io.BytesIO()
+    normalize(audio).export(out, format="wav")
+    return out.getvalue()
+
+def numpy_path(pcm: bytes) -> np.ndarray:
+    """新路径: int16 PCM -> 向量化去直流 + 峰值归一化 -> float32"""
+    return preprocess_pcm(pcm)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=float, nargs="+", default=[1, 3, 5, 10, 20], help="语句长度 (秒)")
+    parser.add_argument("--repeat", type=int, default=50, help="每个长度的重复次数")
+    args = parser.parse_args()
+
+    print(f"{'长度(s)':>8} {'pydub(ms)':>10} {'numpy(ms)':>10} {'加速比':>8}")
+    for seconds in args.lengths:
+        pcm = make_utterance(seconds)
+        wav_bytes = to_wav_bytes(pcm)
+
+        t_pydub = min(timeit.repeat(lambda: pydub_path(wav_bytes), number=1, repeat=args.repeat)) * 1000
+        t_numpy = min(timeit.repeat(lambda: numpy_path(pcm), number=1, repeat=args.repeat)) * 1000
+        print(f"{seconds:>8.1f} {t_pydub:>10.3f} {t_numpy:>10.3f} {t_pydub / t_numpy:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
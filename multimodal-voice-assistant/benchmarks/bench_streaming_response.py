@@ -0,0 +1,65 @@
+"""
+流式回答基准: 比较 "等待完整回答再整段合成" 与 "流式回答 + 逐句合成" 从说完话到听到第一个字的时间。
+LLM 使用本地桩服务器 (见 stub_llm_server.py)；TTS 合成耗时用 固定开销 + 每字耗时 模拟，不依赖网络。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python benchmarks/bench_streaming_response.py [--latency-ms 300] [--token-delay-ms 30] [--extra-sentences 8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_llm_server import start_server
+from api.deepseek_client import DeepSeekClient
+from audio.sentences import split_sentences
+
+MESSAGES = [{"role": "user", "content": "介绍一下你自己"}]
+
+def simulated_tts_s(text: str, overhead_ms: float, ms_per_char: float) -> float:
+    """模拟合成一段文本所需的时间"""
+    return (overhead_ms + ms_per_char * len(text)) / 1000
+
+def blocking_first_audio(client: DeepSeekClient, overhead_ms: float, ms_per_char: float) -> float:
+    """原流程: 等待完整回答，整段合成后开始播放"""
+    start = time.perf_counter()
+    text = client.chat(MESSAGES, "stub")["content"]
+    time.sleep(simulated_tts_s(text, overhead_ms, ms_per_char))
+    return time.perf_counter() - start
+
+def streaming_first_audio(client: DeepSeekClient, overhead_ms: float, ms_per_char: float) -> float:
+    """流式流程: 第一句完整后立即合成并播放"""
+    start = time.perf_counter()
+    chunks = client.chat_stream(MESSAGES, "stub")
+    first_sentence = next(split_sentences(chunks))
+    time.sleep(simulated_tts_s(first_sentence, overhead_ms, ms_per_char))
+    elapsed = time.perf_counter() - start
+    for _ in chunks: # 读完剩余内容，连接才能复用
+        pass
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=300, help="桩服务器返回首个 token 前的延迟")
+    parser.add_argument("--token-delay-ms", type=float, default=30, help="桩服务器每个 token 的间隔")
+    parser.add_argument("--extra-sentences", type=int, default=8, help="追加的句子数 (回答长度)")
+    parser.add_argument("--tts-overhead-ms", type=float, default=250, help="模拟的每次合成固定开销")
+    parser.add_argument("--tts-ms-per-char", type=float, default=8, help="模拟的每字合成耗时")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_server(latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms, extra_sentences=args.extra_sentences)
+    client = DeepSeekClient(base_url=f"http://127.0.0.1:{server.server_address[1]}", api_key="stub")
+    blocking = min(blocking_first_audio(client, args.tts_overhead_ms, args.tts_ms_per_char) for _ in range(args.repeat))
+    streaming = min(streaming_first_audio(client, args.tts_overhead_ms, args.tts_ms_per_char) for _ in range(args.repeat))
+    server.shutdown()
+
+    print(f"{'模式':<10} {'首音延迟(ms)':>14}")
+    print(f"{'整段':<10} {blocking * 1000:>14.0f}")
+    print(f"{'流式':<10} {streaming * 1000:>14.0f}")
+    print(f"加速比: {blocking / streaming:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+TTS 后端基准: 对固定语料逐句合成，报告每个后端的首块音频时间 (time-to-first-audio) 和整句合成时间。
+播放引擎在整句合成完成后才开始播放，因此整句合成时间就是实际的首音延迟；edge-tts 按块流式返回，首块时间单独列出。
+第一次合成 (建立连接、加载引擎) 单独记为冷启动，不计入分位数。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python benchmarks/bench_tts_backends.py [--backends edge espeak pyttsx3] [--repeat 3] [--budget-ms 800]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+from audio.tts_backends import BACKEND_TYPES, TTSBackend
+
+CORPUS = [
+    "好的。",
+    "好的，我记住这条信息了。",
+    "今天北京晴，最高气温二十六度，适合出门散步。",
+    "这张截图里是一个代码编辑器，左侧是文件列表，右侧打开的是一个 Python 文件。",
+    "抱歉，我在处理你的 DeepSeek 请求时遇到了问题。",
+    "Okay, I've remembered that.",
+    "The screenshot shows a terminal window with a failing test and a stack trace.",
+    "第一，先把问题拆成小块；第二，逐个验证；第三，把结论记录下来，方便以后查阅。",
+]
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def measure(backend: TTSBackend, text: str) -> tuple[float, float]:
+    """合成一句，返回 (首块音频时间, 整句合成时间)，单位秒"""
+    start = time.perf_counter()
+    first = None
+    size = 0
+    async for chunk in backend.stream(text):
+        if first is None and chunk:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    if not size:
+        raise RuntimeError("没有返回音频")
+    return first, total
+
+async def bench_backend(backend: TTSBackend, repeat: int) -> dict:
+    result = {"first": [], "total": [], "failed": 0, "cold": None}
+    try:
+        result["cold"] = (await measure(backend, CORPUS[0]))[1]
+    except Exception as e:
+        print(f"{backend.name}: 冷启动失败: {e}")
+        result["failed"] += 1
+    for _ in range(repeat):
+        for text in CORPUS:
+            try:
+                first, total = await measure(backend, text)
+            except Exception as e:
+                print(f"{backend.name}: 合成失败 ('{text[:10]}'): {e}")
+                result["failed"] += 1
+                continue
+            result["first"].append(first)
+            result["total"].append(total)
+    return result
+
+async def run(names: list[str], repeat: int) -> dict[str, dict]:
+    results = {}
+    for name in names:
+        backend_type = BACKEND_TYPES.get(name)
+        if backend_type is None:
+            print(f"未知的后端: {name}")
+            continue
+        backend = backend_type()
+        if not backend.available:
+            print(f"{name}: 不可用 (未安装)，跳过")
+            continue
+        results[name] = await bench_backend(backend, repeat)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=config.TTS_BACKENDS, help="要测试的后端 (按偏好排序)")
+    parser.add_argument("--repeat", type=int, default=3, help="语料重复次数")
+    parser.add_argument("--budget-ms", type=float, default=config.TTS_LATENCY_BUDGET_S * 1000, help="延迟预算")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.backends, args.repeat))
+    print(f"语料 {len(CORPUS)} 句 x {args.repeat} 次")
+    print(f"{'后端':<10} {'冷启动(ms)':>10} {'首块p50':>9} {'首块p95':>9} {'整句p50':>9} {'整句p95':>9} {'失败':>6}")
+    for name, result in results.items():
+        cold = f"{result['cold'] * 1000:.0f}" if result["cold"] is not None else "-"
+        if result["total"]:
+            stats = [percentile(result[key], q) * 1000 for key in ("first", "total") for q in (0.5, 0.95)]
+            print(f"{name:<10} {cold:>10} " + " ".join(f"{value:>9.0f}" for value in stats) + f" {result['failed']:>6}")
+        else:
+            print(f"{name:<10} {cold:>10} {'-':>9} {'-':>9} {'-':>9} {'-':>9} {result['failed']:>6}")
+
+    # 与 BackendPolicy 相同的规则: 预算内按偏好顺序取第一个，都超出预算时取最快的
+    medians = {name: statistics.median(result["total"]) * 1000 for name, result in results.items() if result["total"]}
+    if medians:
+        within = [name for name in medians if medians[name] <= args.budget_ms]
+        choice = within[0] if within else min(medians, key=medians.get)
+        print(f"预算 {args.budget_ms:.0f}ms 下的首选后端: {choice} (整句中位数 {medians[choice]:.0f}ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Web 后端压测: 对 /api/command 发起并发请求，报告 p50/p99 延迟和每秒请求数。
+LLM 使用本地桩服务器 (见 stub_llm_server.py)，后端在本进程的后台线程中启动，不需要真实的 API 密钥。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python benchmarks/load_test.py [--backend asgi|flask] [--requests 200] [--concurrency 32] [--sessions 50]
+"""
+import argparse
+import asyncio
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from stub_llm_server import start_server
+import config
+import logger
+
+PROMPTS = ["给我讲个笑话", "今天天气怎么样", "推荐几本好书", "北京有哪些好玩的地方", "tell me a joke"]
+
+def configure(stub_port: int):
+    """把助手指向桩服务器 (必须在创建 DeepSeek 客户端之前调用，客户端在首次使用时读取这些配置)"""
+    config.ACTIVE_LLM = 'deepseek'
+    config.DEEPSEEK_BASE_URL = f"http://127.0.0.1:{stub_port}"
+    config.DEEPSEEK_API_KEY = "stub"
+    config.WARMUP_ON_START = False
+    logger.console.quiet = True # 每个请求都会输出多条日志面板，压测时关闭控制台输出
+
+def start_backend(backend: str) -> tuple[str, callable]:
+    """在后台线程启动后端，返回 (基础 URL, 停止函数)"""
+    if backend == 'asgi':
+        import uvicorn
+        from backend_asgi import app
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        thread = threading.Thread(target=server.run, name="backend", daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        port = server.servers[0].sockets[0].getsockname()[1]
+
+        def stop():
+            server.should_exit = True
+            thread.join(timeout=5)
+        return f"http://127.0.0.1:{port}", stop
+
+    from werkzeug.serving import make_server
+    from backend_app import app
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="backend", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+async def run_load(base_url: str, total: int, concurrency: int, num_sessions: int) -> tuple[list[float], int, float]:
+    """以固定并发发送 total 个请求，返回 (成功请求的延迟列表, 失败数, 总耗时)"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def open_session(client: httpx.AsyncClient) -> str | None:
+        """session id 由服务端签发: 先不带 id 请求一次，之后的请求使用响应中的 id (Flask 版没有会话，返回 None)"""
+        response = await client.post("/api/command", json={"command": PROMPTS[0]})
+        response.raise_for_status()
+        return response.json().get("session_id")
+
+    async def worker(client: httpx.AsyncClient, session_ids: list[str | None]):
+        nonlocal errors
+        for i in counter:
+            body = {"command": PROMPTS[i % len(PROMPTS)]}
+            if session_ids[i % num_sessions]:
+                body["session_id"] = session_ids[i % num_sessions]
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/command", json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    no_cookies = CookieJar(DefaultCookiePolicy(allowed_domains=[])) # 所有 worker 共用一个客户端，会话只由请求体区分
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120, cookies=no_cookies) as client:
+        session_ids = await asyncio.gather(*(open_session(client) for _ in range(num_sessions))) # 不计入统计
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, session_ids) for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩法百分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["asgi", "flask"], default="asgi")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=32, help="同时进行的请求数")
+    parser.add_argument("--sessions", type=int, default=50, help="轮流使用的会话数 (Flask 版所有请求共用一个上下文)")
+    parser.add_argument("--latency-ms", type=float, default=200, help="桩服务器返回首个 token 前的延迟")
+    parser.add_argument("--token-delay-ms", type=float, default=10, help="桩服务器每个 token 的间隔")
+    args = parser.parse_args()
+
+    stub = start_server(latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms)
+    configure(stub.server_address[1])
+    base_url, stop = start_backend(args.backend)
+    asyncio.run(run_load(base_url, args.concurrency, args.concurrency, args.sessions)) # 预热连接池
+    latencies, errors, elapsed = asyncio.run(run_load(base_url, args.requests, args.concurrency, args.sessions))
+    stop()
+    stub.shutdown()
+
+    print(f"后端: {args.backend}  请求: {args.requests}  并发: {args.concurrency}  会话: {args.sessions}")
+    if latencies:
+        print(f"p50: {percentile(latencies, 50) * 1000:.0f}ms  p99: {percentile(latencies, 99) * 1000:.0f}ms  "
+              f"平均: {statistics.mean(latencies) * 1000:.0f}ms")
+    print(f"吞吐: {len(latencies) / elapsed:.1f} 请求/秒  失败: {errors}")
+
+if __name__ == "__main__":
+    main()
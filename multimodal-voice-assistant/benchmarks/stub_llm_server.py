@@ -0,0 +1,121 @@
+"""
+本地 LLM 桩服务器: 模拟 DeepSeek (OpenAI 兼容) 的 /chat/completions 接口，用于离线测试客户端和压测后端。
+支持固定延迟、逐 token 的 SSE 流式输出，以及按间隔注入 429 错误以验证重试逻辑。
+
+用法 (在 multimodal-voice-assistant 目录下):
+    python benchmarks/stub_llm_server.py --port 8765 --latency-ms 200 --fail-every 5
+然后在 config.py 中设置 DEEPSEEK_BASE_URL = "http://127.0.0.1:8765"。
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubConfig:
+    """桩服务器行为配置"""
+    def __init__(self, latency_ms: float = 100, token_delay_ms: float = 20, fail_every: int = 0, extra_sentences: int = 0):
+        self.latency_ms = latency_ms
+        self.extra_sentences = extra_sentences # 在固定回复后追加的句子数 (模拟较长的回答)
+        self.token_delay_ms = token_delay_ms
+        self.fail_every = fail_every
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        """每 fail_every 个请求返回一次 429"""
+        with self._lock:
+            n = next(self._counter)
+        return bool(self.fail_every) and n % self.fail_every == 0
+
+def _reply_for(messages: list, extra_sentences: int = 0) -> str:
+    """根据请求内容构造固定回复"""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    if isinstance(system, str) and ("功能调用" in system or "function call" in system):
+        return "None"
+    last = messages[-1].get("content", "") if messages else ""
+    if isinstance(last, list): # 多模态内容
+        last = " ".join(part.get("text", "") for part in last if part.get("type") == "text")
+    reply = f"这是桩服务器的回答。你说的是: {last[:50]}。第二句话用于测试分句！Third sentence for testing."
+    return reply + "".join(f"这是用于模拟较长回答的第 {i + 1} 句话。" for i in range(extra_sentences))
+
+def make_handler(stub: StubConfig):
+    """创建绑定了配置的请求处理类"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # 支持 keep-alive
+
+        def log_message(self, format, *args):
+            pass # 保持安静
+
+        def _send_json(self, status: int, body: dict, headers: dict | None = None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": "not found"})
+                return
+            if stub.should_fail():
+                self._send_json(429, {"error": "rate limited"}, {"Retry-After": "0"})
+                return
+            time.sleep(stub.latency_ms / 1000)
+            reply = _reply_for(payload.get("messages", []), stub.extra_sentences)
+            if payload.get("stream"):
+                self._stream(reply)
+            else:
+                self._send_json(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}]})
+
+        def _stream(self, reply: str):
+            """以 SSE 格式逐 token 输出 (每 2 个字符一个 token)"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_chunk(data: bytes):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            for i in range(0, len(reply), 2):
+                delta = {"choices": [{"index": 0, "delta": {"content": reply[i:i + 2]}}]}
+                write_chunk(f"data: {json.dumps(delta, ensure_ascii=False)}\n\n".encode("utf-8"))
+                time.sleep(stub.token_delay_ms / 1000)
+            write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+    return Handler
+
+def start_server(port: int = 0, **kwargs) -> ThreadingHTTPServer:
+    """在后台线程启动桩服务器，返回 server (server.server_address[1] 为实际端口)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(StubConfig(**kwargs)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=100, help="返回响应头前的固定延迟")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="流式输出时每个 token 的间隔")
+    parser.add_argument("--fail-every", type=int, default=0, help="每 N 个请求返回一次 429 (0 表示不注入)")
+    parser.add_argument("--extra-sentences", type=int, default=0, help="在固定回复后追加的句子数")
+    args = parser.parse_args()
+    server = start_server(args.port, latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms,
+                          fail_every=args.fail_every, extra_sentences=args.extra_sentences)
+    print(f"桩服务器运行于 http://127.0.0.1:{server.server_address[1]} (Ctrl+C 退出)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+通用缓存子系统: 进程内 LRU 层 + SQLite 磁盘层 (容量和过期限制)。
+所有条目都存放在单个 SQLite 文件中，而不是成千上万个小文件；各层统计命中/未命中/淘汰次数。
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+from logger import log
+
+# 尝试导入 xxhash (更快的非加密哈希)
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+def content_hash(data) -> str:
+    """计算内容哈希 (支持 bytes/memoryview/NumPy 数组等缓冲区对象)，优先使用 xxh3_128，未安装时回退到 blake2b"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class CacheStats:
+    """缓存统计 (线程安全)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, hit: bool):
+        """记录一次查询结果"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evicted(self, count: int = 1):
+        """记录淘汰的条目数"""
+        with self._lock:
+            self.evictions += count
+
+    def as_dict(self) -> dict:
+        """返回统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class LRUCache:
+    """进程内 LRU 缓存 (线程安全)"""
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get(self, key: str, default=None):
+        """查询缓存，命中时移到最近使用端"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.stats.record(True)
+                return self._data[key]
+        self.stats.record(False)
+        return default
+
+    def put(self, key: str, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        evicted = 0
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.stats.evicted(evicted)
+
+    def __contains__(self, key: str) -> bool:
+        """是否已缓存 (不计入统计，不改变 LRU 顺序)"""
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+
+EVICT_BATCH = 64 # 磁盘层每次淘汰时读取的最旧条目数
+
+class SQLiteCache:
+    """基于单个 SQLite 文件的磁盘缓存，按总字节数和条目年龄淘汰 (LRU)"""
+    def __init__(self, path: Path, max_bytes: int = 64 * 1024 * 1024, max_age_s: float | None = None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(created)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        with self._lock:
+            self._purge_expired_locked()
+
+    def get(self, key: str) -> bytes | None:
+        """查询缓存，过期条目视为未命中并删除"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, size, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_s is not None and now - row[2] > self.max_age_s:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= row[1]
+                self.stats.evicted()
+                row = None
+            if row is not None:
+                self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self.stats.record(row is not None)
+        return bytes(row[0]) if row is not None else None
+
+    def __contains__(self, key: str) -> bool:
+        """是否已缓存 (不计入统计，不更新访问时间)"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key: str, value: bytes):
+        """写入缓存，超出容量时按最久未访问淘汰"""
+        now = time.time()
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+
+    def _evict_locked(self):
+        """先删除过期条目，仍超出上限时分批淘汰最久未访问的条目，直到总大小降到上限的 90% (调用方需持有锁)"""
+        self._purge_expired_locked()
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        while self._total_bytes > target:
+            # 每次只取一小批最旧的条目，不把整张表读进内存
+            rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC LIMIT ?", (EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            keys = []
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                keys.append(key)
+                self._total_bytes -= size
+            self._conn.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(keys))})", keys)
+            removed += len(keys)
+        if removed:
+            self.stats.evicted(removed)
+
+    def _purge_expired_locked(self):
+        """删除所有过期条目 (调用方需持有锁)"""
+        if self.max_age_s is None:
+            return
+        cutoff = time.time() - self.max_age_s
+        row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE created < ?", (cutoff,)).fetchone()
+        if row[0]:
+            self._conn.execute("DELETE FROM entries WHERE created < ?", (cutoff,))
+            self._total_bytes -= row[1]
+            self.stats.evicted(row[0])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def total_bytes(self) -> int:
+        """当前占用的字节数 (不含 SQLite 自身开销)"""
+        return self._total_bytes
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._total_bytes = 0
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """两级缓存: 先查内存 LRU，再查 SQLite 磁盘层 (命中后提升到内存)"""
+    def __init__(self, name: str, path: Path, memory_items: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 max_age_s: float | None = None,
+                 serialize: Callable[[Any], bytes] = bytes,
+                 deserialize: Callable[[bytes], Any] = bytes):
+        self.name = name
+        self.memory = LRUCache(memory_items)
+        self.disk = None
+        self.serialize = serialize
+        self.deserialize = deserialize
+        try:
+            self.disk = SQLiteCache(path, max_bytes=max_bytes, max_age_s=max_age_s)
+        except Exception as e:
+            # 磁盘层不可用时退化为纯内存缓存
+            log(f"打开 {name} 磁盘缓存失败，仅使用内存缓存: {e}", title="WARNING", style="yellow")
+
+    def get(self, key: str):
+        """查询缓存，未命中返回 None"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            return None
+        try:
+            raw = self.disk.get(key)
+            if raw is None:
+                return None
+            value = self.deserialize(raw)
+        except Exception as e:
+            log(f"读取 {self.name} 磁盘缓存失败: {e}", title="ERROR", style="bold red")
+            return None
+        self.memory.put(key, value)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        """任一层中是否已缓存 (不计入统计，用于预热)"""
+        if key in self.memory:
+            return True
+        try:
+            return self.disk is not None and key in self.disk
+        except Exception:
+            return False
+
+    def put(self, key: str, value):
+        """同时写入内存层和磁盘层"""
+        self.memory.put(key, value)
+        if self.disk is None:
+            return
+        try:
+            self.disk.put(key, self.serialize(value))
+        except Exception as e:
+            log(f"写入 {self.name} 磁盘缓存失败: {e}", title="ERROR", style="bold red")
+
+    def stats(self) -> dict:
+        """返回各层统计信息及整体命中率"""
+        memory = self.memory.stats.as_dict()
+        disk = self.disk.stats.as_dict() if self.disk else None
+        hits = memory["hits"] + (disk["hits"] if disk else 0)
+        total = memory["hits"] + memory["misses"]
+        result = {
+            "hits": hits,
+            "misses": total - hits,
+            "hit_rate": hits / total if total else 0.0,
+            "memory": memory | {"items": len(self.memory)},
+        }
+        if disk:
+            result["disk"] = disk | {"bytes": self.disk.total_bytes}
+        return result
+
+    def log_stats(self):
+        """将统计信息写入日志"""
+        s = self.stats()
+        disk = s.get("disk")
+        disk_info = (f"，磁盘层命中 {disk['hits']} / 淘汰 {disk['evictions']} / 占用 {disk['bytes'] / 1024:.0f} KB"
+                     if disk else "")
+        log(f"{self.name} 缓存: 命中 {s['hits']}，未命中 {s['misses']}，命中率 {s['hit_rate']:.1%}，"
+            f"内存层 {s['memory']['items']} 项 / 淘汰 {s['memory']['evictions']}{disk_info}",
+            title="CACHE_STATS", style="cyan")
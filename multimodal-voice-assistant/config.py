@@ -1,6 +1,7 @@
 """
 配置文件，存储 API 密钥、模型名称、唤醒词等。
 """
+import os
 from pathlib import Path
 import tempfile
 
@@ -11,12 +12,18 @@ DEEPSEEK_BASE_URL = "https://api.deepseek.com"
 DEEPSEEK_CHAT_MODEL = "deepseek-chat"
 DEEPSEEK_VISION_MODEL = "deepseek-chat" # DeepSeek 可能使用相同模型处理视觉
 DEEPSEEK_THINKING_MODEL = "deepseek-Reasoner" # 用于功能判断的模型 (如果需要区分)
+DEEPSEEK_POOL_SIZE = 10 # 连接池大小 (keep-alive 连接数上限)
+DEEPSEEK_MAX_RETRIES = 3 # 429/5xx 和连接失败的最大重试次数
+DEEPSEEK_BACKOFF_BASE_S = 0.5 # 指数退避的基础等待时间
+DEEPSEEK_BACKOFF_MAX_S = 8.0 # 单次重试的最长等待时间
+DEEPSEEK_TIMEOUT = (5, 60) # (连接超时, 读取超时) 秒
 
 # Gemini
 GEMINI_API_KEY = " " # <--- 在这里替换为你的 Gemini API 密钥
 GEMINI_CHAT_MODEL = "gemini-1.5-flash-latest" # 文本模型
 GEMINI_VISION_MODEL = "gemini-1.5-flash-latest" # 视觉模型 (Flash 支持多模态)
 GEMINI_BASE_URL = "https://generativelanguage.googleapis.com" # 基础 URL (库内部使用)
+GEMINI_CHAT_SESSION = True # 以 ChatSession 原生多轮格式发送对话历史 (False 时将历史拼接进提示文本)
 
 # --- 选择使用的 LLM ---
 # 设置为 'gemini' 或 'deepseek'
@@ -59,11 +66,135 @@ GEMINI_FUNC_SYS_MSG = (
 
 # --- Whisper 配置 ---
 WHISPER_MODEL_SIZE = 'medium'
+# Whisper 要求的输入格式: 16kHz 单声道
+STT_SAMPLE_RATE = 16000
+STT_SAMPLE_WIDTH = 2 # 16-bit PCM
+# 音频预处理: 'peak' (峰值归一化) / 'rms' (响度归一化) / None (不归一化)
+AUDIO_NORMALIZATION = 'peak'
+AUDIO_PEAK_HEADROOM_DB = 0.1 # 峰值归一化后距离 0 dBFS 的余量 (与 pydub.effects.normalize 默认一致)
+AUDIO_RMS_TARGET_DBFS = -20.0 # 响度归一化的目标 RMS
+AUDIO_PRE_EMPHASIS = 0.0 # 预加重系数，0 表示关闭 (常用值 0.97)
+# Whisper 工作池: 多个 worker 并发识别，每个 worker 使用 STT_WORKER_CPU_THREADS 个线程
+STT_POOL_BACKEND = 'thread' # 'thread' (共享一个模型，ctranslate2 释放 GIL) 或 'process' (每个进程各自加载模型)
+STT_WORKERS = 2
+STT_WORKER_CPU_THREADS = max(1, (os.cpu_count() or 2) // STT_WORKERS)
+STT_QUEUE_SIZE = 8 # 排队等待的请求上限，超出后 submit 阻塞或拒绝 (背压)
+# 语音活动检测 (VAD): 裁剪静音、切分长录音、丢弃无语音片段
+VAD_ENABLED = True
+VAD_FRAME_MS = 30 # 帧长
+VAD_THRESHOLD_RATIO = 3.0 # 语音帧能量需超过噪声底的倍数
+VAD_MIN_RMS = 0.005 # 语音帧的最低 RMS (float32 标度)
+VAD_MIN_SPEECH_S = 0.2 # 短于该时长的语音段视为噪声
+VAD_MIN_SILENCE_S = 0.3 # 短于该时长的停顿不切分
+VAD_PAD_S = 0.15 # 语音段前后保留的余量
+VAD_MAX_REGION_S = 15.0 # 切分后单段最长时长
+# 流式识别: 边说边解码，唤醒词检测和 LLM 调用可以在语句结束前开始
+STT_STREAMING = False
+STT_STREAM_STEP_S = 1.0 # 每累积多少秒新音频解码一次部分结果
+STT_STREAM_MAX_WINDOW_S = 15.0 # 解码窗口超过该长度时提交稳定文本并裁剪音频
+STT_STREAM_ENDPOINT_S = 0.8 # 静音超过该时长视为语句结束 (同 pause_threshold)
+STT_STREAM_MAX_UTTERANCE_S = 20.0 # 单句最长时长 (同 phrase_time_limit)
+# 唤醒词门控: 先用小模型检测开头是否包含唤醒词，命中后才运行完整模型
+WAKE_GATE_ENABLED = True
+WAKE_GATE_MODEL_SIZE = 'tiny'
+WAKE_GATE_WINDOW_S = 1.5 # 只检测开头多少秒 (唤醒词应在指令开头说出)
+WAKE_GATE_MIN_RMS = 0.01 # 低于该 RMS (float32 标度) 的片段直接拒绝
+WAKE_GATE_STATS_INTERVAL = 20 # 每处理多少段音频输出一次门控统计
 # 缓存目录
 CACHE_DIR = Path(tempfile.gettempdir()) / "whisper_stt_cache"
 CACHE_DIR.mkdir(exist_ok=True)
+# STT 结果缓存: 内存 LRU 层 + 单个 SQLite 文件的磁盘层
+STT_CACHE_DB = CACHE_DIR / "stt_cache.sqlite3"
+STT_CACHE_MEMORY_ITEMS = 256 # 内存层最多缓存的条目数
+STT_CACHE_MAX_BYTES = 32 * 1024 * 1024 # 磁盘层容量上限，超出后按最久未访问淘汰
+STT_CACHE_MAX_AGE_S = 7 * 24 * 3600 # 磁盘层条目的最长保留时间
+
+# --- 启动配置 ---
+# 模型、SDK 等重量级组件均在首次使用时加载；开启后在启动时于后台线程提前加载
+WARMUP_ON_START = True
+
+# --- 助手核心 ---
+# 使用 asyncio 核心处理回合 (异步 LLM/TTS，新的唤醒词可以打断正在进行的回合)；False 时使用同步的指令线程
+ASYNC_CORE = True
+
+# --- Web 后端 ---
+# 地址、端口和并发限制用于 ASGI 版 (backend_asgi.py)；Flask 版 (backend_app.py) 由 app.run 参数决定
+BACKEND_HOST = '0.0.0.0'
+BACKEND_PORT = 5000
+BACKEND_MAX_CONCURRENT_TURNS = 16 # 同时进行的回合 (LLM 调用) 上限，超出的请求排队
+BACKEND_QUEUE_TIMEOUT_S = 30.0 # 排队超过该时间返回 503
+BACKEND_IMAGE_MAX_ITEMS = 64 # 内存中保留的截图/摄像头画面数 (前端按 URL 获取)
+BACKEND_IMAGE_TTL_S = 600 # 图片 URL 的有效期
+SESSION_MAX_COUNT = 5000 # 保留的会话数上限，超出后淘汰最久未访问的会话
+SESSION_IDLE_TIMEOUT_S = 1800 # 会话空闲超过该时间后淘汰 (对话上下文随之丢弃)
+SESSION_SECRET = None # session id 的签名密钥 (字符串)；None 时每次启动随机生成，重启后客户端会分配到新会话
+
+# --- 对话上下文 ---
+# 上下文按 token 预算组装 (本地估算: 中文约 1 字 1 token，其他约 4 字符 1 token)
+CONTEXT_MAX_TURNS = 10 # 对话窗口最多保留的回合数
+CONTEXT_TOKEN_BUDGET = 1500 # 对话窗口的 token 预算，超出的旧回合在后台压缩进滚动摘要
+CONTEXT_MESSAGE_MAX_TOKENS = 500 # 单条消息 (如粘贴的长文本) 保存进历史时的截断长度
+CONTEXT_SUMMARY_MAX_TOKENS = 300 # 滚动摘要的长度上限
+CONTEXT_FACTS_TOKEN_BUDGET = 300 # 每轮提示中 "记住" 的信息的总预算
+# 记忆库: "记住" 的信息持久保存，每轮检索与指令最相关的几条放入提示
+MEMORY_ENABLED = True
+MEMORY_DB = Path("data") / "memory.sqlite3"
+MEMORY_TOP_K = 5 # 每轮最多检索的条数
+MEMORY_MIN_SCORE = 0.1 # 相似度低于该值的不放入提示
+MEMORY_DUPLICATE_SCORE = 0.95 # 与已有事实相似度超过该值时视为重复，不再保存
+MEMORY_INDEX_SCOPES = 256 # 内存中缓存索引的作用域数 (每个 Web 会话一个作用域)
+
+# --- 流式回答 ---
+# 开启后 LLM 以流式返回，按句切分并边生成边合成、播放 (缩短从说完话到听到第一个字的时间)
+LLM_STREAMING = True
+TTS_SENTENCE_MIN_CHARS = 6 # 短于该长度的句子与下一句合并
+TTS_SENTENCE_MAX_CHARS = 60 # 超过该长度仍无句末标点时在逗号处强制切分
+TTS_PREFETCH_SENTENCES = 2 # 最多提前合成的句子数
+# 合成后端 (audio/tts_backends.py)，按偏好排序；edge 为在线合成 (音质好)，espeak / pyttsx3 为本地离线合成
+TTS_BACKENDS = ["edge", "espeak", "pyttsx3"]
+TTS_EDGE_VOICE = "zh-CN-XiaoxiaoNeural"
+TTS_EDGE_RATE = '+20%'
+TTS_ESPEAK_VOICE = "cmn" # espeak-ng 的普通话语音
+TTS_PYTTSX3_VOICE = None # pyttsx3 的语音 ID (None 时自动选择中文语音)
+TTS_LOCAL_RATE = 200 # 本地后端的语速 (每分钟词数)
+TTS_LATENCY_BUDGET_S = 0.8 # 平均合成耗时超过预算的后端排到预算内的后端之后
+TTS_DEADLINE_S = 1.5 # 一句话合成超过该时间仍未完成时，同时用下一个后端合成，取先完成的 (None 表示不限)
+TTS_BACKEND_EWMA_ALPHA = 0.3 # 合成耗时滑动平均中新样本的权重
+TTS_BACKEND_PROBE_S = 60 # 超出预算的后端每隔这么久重新作为首选尝试一次 (网络恢复后回到首选后端)
+# 合成缓存: 相同的句子 (同一后端、语音和语速) 直接播放缓存的音频
+TTS_CACHE_ENABLED = True
+TTS_CACHE_DB = CACHE_DIR / "tts_cache.sqlite3"
+TTS_CACHE_MEMORY_ITEMS = 64 # 内存层最多缓存的句子数
+TTS_CACHE_MAX_BYTES = 64 * 1024 * 1024 # 磁盘层容量上限，超出后按最久未访问淘汰
+TTS_CACHE_PREWARM = True # 启动时预先合成固定回答 (记住/忘记的确认、出错时的回退回答等)
+# 播放引擎: 解码后的音频在内存中逐句无缝播放
+TTS_MIXER_BUFFER = 512 # 混音器输出缓冲区的采样数 (越小发声延迟越低，过小可能出现爆音)
+PLAYBACK_RETRY_S = 0.005 # 上一句仍在通道队列中时，重试排队的间隔
+PLAYBACK_LATENCY_SAMPLES = 256 # 保留的 "就绪 -> 发声" 延迟样本数 (用于统计中位数和 p95)
+
+# --- 截图 ---
+SCREENSHOT_MONITOR = 1 # mss 的显示器编号: 1 为主显示器，0 为所有显示器拼接成的整个桌面
+SCREENSHOT_ACTIVE_WINDOW = False # 只截取当前活动窗口 (Windows，或装有 xdotool 的 Linux)；无法获取窗口位置时截取整个显示器
+# 截图和摄像头画面发送前的缩放和编码 (image_prep)
+IMAGE_MAX_SIDE = {"gemini": 1536, "deepseek": 1024} # 各 LLM 的目标分辨率 (长边像素)，未列出的 LLM 不缩放
+# 编码格式 "jpeg" 或 "webp": WebP 同样质量下小 40~60%，但编码慢一个数量级，截图的字节预算不紧时 JPEG 的总延迟更低
+# (两者的对比: python benchmarks/bench_image_prep.py)；Pillow 不支持 WebP 时使用 JPEG
+IMAGE_FORMAT = "jpeg"
+IMAGE_MAX_BYTES = 150 * 1024 # 编码后的字节预算，在预算内选择最高质量 (0 表示不限)
+IMAGE_QUALITY_RANGE = (20, 80) # 质量搜索范围 (最低, 最高)
+IMAGE_QUALITY_STEP = 5 # 质量搜索的步长 (越大编码次数越少)
+IMAGE_WEBP_METHOD = 2 # WebP 编码速度与压缩率的权衡 (0 最快，6 最小)
 
 # --- 其他配置 ---
 TEMP_DIR = Path(tempfile.gettempdir())
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
+
+# --- 功能调用路由 ---
+# 先用本地关键词规则和分类器判断功能调用，没有把握时才调用 LLM
+INTENT_ROUTER_ENABLED = True
+INTENT_ROUTER_MIN_CONFIDENCE = 0.99 # 本地判断为 "none" 的最低后验概率 (启动时在留出集上校准，只会更高)
+INTENT_LOG_PATH = LOG_DIR / "function_calls.jsonl" # LLM 决策日志 (分类器训练数据)
+# 路由器没有把握时，LLM 决策与不带附件的主回答并行执行；决策为 "none" 时直接使用该回答
+SPECULATIVE_ANSWER = True
+SPECULATION_POOL_SIZE = 12 # 推测执行的线程数 (每轮最多占用 3 个: 决策、主回答、剪贴板预取)
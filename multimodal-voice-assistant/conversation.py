@@ -1,95 +1,226 @@
 """
 管理对话历史，支持基于相似度的上下文清除。
+- 每轮用户输入的稀疏向量 (字符 bigram + 英文单词的词频) 在加入时计算并缓存，
+  判断话题变化只需向量化新输入，代价为 O(新文本长度)，不再每轮对全部历史重新拟合 TF-IDF；
+- 上下文按 token 预算组装: 最近的回合原样保留，超出预算的旧回合在后台线程中压缩进滚动摘要，
+  "记住" 的信息持久保存在记忆库 (memory_store) 中，每轮检索与指令相关的几条，不占用对话窗口。
+  每轮提示的大小与对话长度无关。
 """
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import math
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 from logger import log # 导入日志记录器
+import config
+import memory_store
+from text_similarity import cosine_similarity, text_vector
+
+_WIDE_CHAR_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]") # 中文字符和全角标点
+MESSAGE_OVERHEAD_TOKENS = 4 # 每条消息的角色、分隔符等开销
+
+# 摘要在后台线程中生成，不阻塞回合
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+
+def estimate_tokens(text: str) -> int:
+    """快速估算 token 数: 中文字符约 1 个 token，其他文本约 4 个字符 1 个 token (偏保守)"""
+    other = len(_WIDE_CHAR_PATTERN.sub("", text))
+    return (len(text) - other) + math.ceil(other / 4)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本使其估算 token 数不超过 max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high: # 二分查找最长的前缀
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+def _default_summarizer(previous_summary: str, messages: list[dict]) -> str | None:
+    from llm_interface import llm_summarize # 避免循环导入
+    return llm_summarize(previous_summary, messages)
 
 class EnhancedConversationContext:
     """管理对话历史，支持基于相似度的上下文清除和摘要"""
-    def __init__(self, max_turns=5, similarity_threshold=0.3):
-        self.history = [] # 存储对话历史
-        self.max_turns = max_turns # 最大保留的回合数
+    def __init__(self, max_turns=config.CONTEXT_MAX_TURNS, similarity_threshold=0.3,
+                 token_budget: int = config.CONTEXT_TOKEN_BUDGET,
+                 summarizer: Callable[[str, list[dict]], str | None] | None = None, memory_scope: str = "default"):
+        self.max_turns = max_turns # 窗口内最多保留的回合数 (同时受 token 预算限制)
+        self.token_budget = token_budget # 对话窗口的 token 预算 (不含摘要和记住的信息)
+        self.history = deque() # 对话窗口 (user 和 assistant 各占一条)
+        self._user_vectors = deque() # 与 history 中的 user 消息一一对应的缓存向量
+        self._history_tokens = 0
         self.similarity_threshold = similarity_threshold # 相似度阈值，低于此值认为话题改变
-        self.vectorizer = TfidfVectorizer() # TF-IDF 向量化器
+        self.facts: list[str] = [] # 本次对话中 "记住" 的信息 (总在提示中)，与对话窗口分开保存
+        self.memory_scope = memory_scope # 记忆库中的作用域 (语音助手为 default，Web 后端每个会话一个)
+        # 滚动摘要: 移出窗口的回合先进入 _to_summarize，由后台线程合并进 summary
+        self.summary = ""
+        self._summarizer = summarizer or _default_summarizer
+        self._to_summarize: list[dict] = []
+        self._summarizing = False
+        self._epoch = 0 # clear() 后递增，丢弃进行中的过期摘要
+        # 保护对话窗口、记住的信息和摘要: 指令线程写入的同时，推测执行和摘要线程也会读取
+        self._lock = threading.RLock()
 
     def add_exchange(self, user_input, assistant_response):
         """添加一次用户和助手的交互，并根据相似度判断是否清除旧上下文"""
-        if self.history:
-            try:
-                similarity = self.calculate_similarity(user_input)
+        vector = text_vector(user_input)
+        with self._lock:
+            if self.history:
+                similarity = self.calculate_similarity(user_input, vector)
                 log(f"与上一轮的相似度: {similarity:.2f}", title="CONTEXT_SIMILARITY", style="dim")
                 if similarity < self.similarity_threshold:
                     log("检测到话题变化，清除旧上下文。", title="CONTEXT_UPDATE", style="yellow")
                     self.clear() # 如果话题变化显著，清除历史记录
+            self._append_pair(user_input, assistant_response, vector)
+
+    def _append_pair(self, user_input, assistant_response, vector):
+        """加入一个回合 (单条消息截断到 CONTEXT_MESSAGE_MAX_TOKENS)，超出窗口的旧回合交给摘要 (调用方需持有锁)"""
+        for role, content in (("user", user_input), ("assistant", assistant_response)):
+            content = truncate_to_tokens(content, config.CONTEXT_MESSAGE_MAX_TOKENS)
+            self.history.append({"role": role, "content": content})
+            self._history_tokens += estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        self._user_vectors.append(vector)
+
+        evicted = []
+        while len(self.history) > 2 and (len(self.history) > self.max_turns * 2 or self._history_tokens > self.token_budget):
+            for _ in range(2):
+                message = self.history.popleft()
+                self._history_tokens -= estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+                evicted.append(message)
+            self._user_vectors.popleft()
+        if evicted:
+            self._schedule_summary(evicted)
+
+    def _schedule_summary(self, messages: list[dict]):
+        """把移出窗口的消息加入待摘要列表；没有进行中的摘要时提交后台任务"""
+        with self._lock:
+            self._to_summarize.extend(messages)
+            if self._summarizing:
+                return # 进行中的任务结束后会处理新加入的消息
+            self._summarizing = True
+        _summary_executor.submit(self._summarize_pending)
+
+    def _summarize_pending(self):
+        """后台线程: 把待摘要的消息合并进滚动摘要，直到没有新的待摘要消息"""
+        while True:
+            with self._lock:
+                messages, self._to_summarize = self._to_summarize, []
+                if not messages:
+                    self._summarizing = False
+                    return
+                previous, epoch = self.summary, self._epoch
+            try:
+                summary = self._summarizer(previous, messages)
             except Exception as e:
-                 log(f"计算相似度时出错: {e}", title="ERROR", style="bold red")
-
-        self.history.append({
-            "role": "user", # 使用 role 区分
-            "content": user_input
-        })
-        self.history.append({
-            "role": "assistant",
-            "content": assistant_response
-        })
-        # 如果历史记录超过最大回合数 * 2 (因为 user 和 assistant 各占一条)，移除最早的两条
-        while len(self.history) > self.max_turns * 2:
-            self.history.pop(0)
-            self.history.pop(0) # 移除一对
+                log(f"生成对话摘要时出错: {e}", title="ERROR", style="bold red")
+                summary = None
+            with self._lock:
+                if epoch != self._epoch:
+                    continue # 期间上下文已被清除
+                if summary:
+                    self.summary = truncate_to_tokens(summary.strip(), config.CONTEXT_SUMMARY_MAX_TOKENS)
+                    log(f"已将 {len(messages) // 2} 个旧回合压缩进摘要 (约 {estimate_tokens(self.summary)} tokens)", title="CONTEXT_SUMMARY", style="dim")
 
     def get_context(self):
         """获取格式化的对话上下文 (适用于 DeepSeek 的 messages 格式)"""
-        return self.history # 直接返回列表
+        with self._lock:
+            return list(self.history) # 返回副本，调用方遍历时不受并发写入影响
 
-    def get_formatted_context_string(self):
-        """将历史记录格式化为字符串 (适用于 Gemini 的简单文本上下文)"""
-        context_str = ""
-        for i in range(0, len(self.history), 2):
-            user_msg = self.history[i]['content'][:500] + '...' if len(self.history[i]['content']) > 500 else self.history[i]['content']
-            if i + 1 < len(self.history):
-                assistant_msg = self.history[i+1]['content'][:500] + '...' if len(self.history[i+1]['content']) > 500 else self.history[i+1]['content']
-                context_str += f"User: {user_msg}\nAssistant: {assistant_msg}\n\n"
-            else: # 处理只有用户输入的情况 (理论上不应发生在此结构中)
-                context_str += f"User: {user_msg}\n\n"
-        return context_str.strip()
-
-
-    def calculate_similarity(self, new_input):
-        """计算新输入与历史用户输入的平均余弦相似度"""
-        user_inputs = [exchange['content'] for exchange in self.history if exchange['role'] == 'user']
-        if not user_inputs:
-            return 0.0 # 如果没有历史用户输入，相似度为0
+    def _relevant_facts(self, query: str | None) -> list[str]:
+        """本次对话记住的信息 + 记忆库中与 query 最相关的信息，总长度不超过 CONTEXT_FACTS_TOKEN_BUDGET"""
+        with self._lock:
+            facts = list(self.facts)
+        if query and config.MEMORY_ENABLED:
+            try:
+                retrieved = memory_store.get_store().search(query, scope=self.memory_scope)
+            except Exception as e:
+                log(f"检索记忆库时出错: {e}", title="ERROR", style="bold red")
+                retrieved = []
+            facts.extend(text for text, _ in retrieved if text not in facts)
+        budget = config.CONTEXT_FACTS_TOKEN_BUDGET
+        selected = []
+        for fact in facts:
+            budget -= estimate_tokens(fact)
+            if budget < 0:
+                break
+            selected.append(fact)
+        return selected
+
+    def get_memory_text(self, query: str | None = None) -> str:
+        """记住的信息 (含与 query 相关的记忆) 和之前对话的摘要 (拼接进系统提示或历史开头)，没有时返回空字符串"""
+        english = config.ACTIVE_LLM == 'gemini'
+        with self._lock:
+            summary = self.summary
+        sections = []
+        facts = self._relevant_facts(query)
+        if facts:
+            heading = "Facts the user asked you to remember:" if english else "用户要求记住的信息:"
+            sections.append(heading + "\n" + "\n".join(f"- {fact}" for fact in facts))
+        if summary:
+            heading = "Summary of the earlier conversation:" if english else "之前对话的摘要:"
+            sections.append(f"{heading}\n{summary}")
+        return "\n\n".join(sections)
 
-        all_inputs = user_inputs + [new_input] # 包含新输入的列表
+    def context_tokens(self) -> int:
+        """当前上下文 (对话窗口 + 摘要 + 记住的信息) 的估算 token 数"""
+        with self._lock:
+            history_tokens = self._history_tokens
+        return history_tokens + estimate_tokens(self.get_memory_text())
 
-        try:
-            tfidf_matrix = self.vectorizer.fit_transform(all_inputs)
-            cosine_similarities = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1])
-            if cosine_similarities.size > 0:
-                 return np.mean(cosine_similarities)
-            else:
-                 return 0.0
-        except ValueError:
-             log("无法计算文本相似度（可能输入过短）", title="WARNING", style="yellow")
-             return 0.0
+    def get_formatted_context_string(self, query: str | None = None):
+        """将历史记录格式化为字符串 (适用于 Gemini 的简单文本上下文)"""
+        with self._lock:
+            history = list(self.history)
+        memory = self.get_memory_text(query)
+        lines = [memory] if memory else []
+        for message in history:
+            speaker = "User" if message["role"] == "user" else "Assistant"
+            lines.append(f"{speaker}: {message['content']}")
+        return "\n\n".join(lines)
+
+    def calculate_similarity(self, new_input, vector=None):
+        """计算新输入与历史用户输入的平均余弦相似度 (vector 为已计算好的新输入向量)"""
+        if not self._user_vectors:
+            return 0.0 # 如果没有历史用户输入，相似度为0
+        vector = text_vector(new_input) if vector is None else vector
+        return sum(cosine_similarity(vector, past) for past in self._user_vectors) / len(self._user_vectors)
 
     def clear(self):
-        """清除对话历史"""
-        self.history = []
+        """清除对话历史和摘要 (记住的信息保留)"""
+        with self._lock:
+            self.history.clear()
+            self._user_vectors.clear()
+            self._history_tokens = 0
+            self.summary = ""
+            self._to_summarize = []
+            self._epoch += 1
 
     def remember(self, information):
-        """添加需要记住的信息到历史记录"""
-        self.history.append({"role": "user", "content": f"请记住以下信息: {information}"})
-        self.history.append({"role": "assistant", "content": "好的，我记住了。"})
+        """记住一条信息: 持久保存到记忆库，并在本次对话中总是放入提示 (超出预算时丢弃最早的，记忆库中仍保留)"""
+        information = truncate_to_tokens(information, config.CONTEXT_MESSAGE_MAX_TOKENS)
+        if config.MEMORY_ENABLED:
+            try:
+                memory_store.get_store().add(information, scope=self.memory_scope)
+            except Exception as e:
+                log(f"保存到记忆库时出错: {e}", title="ERROR", style="bold red")
+        with self._lock:
+            self.facts.append(information)
+            while len(self.facts) > 1 and sum(estimate_tokens(fact) for fact in self.facts) > config.CONTEXT_FACTS_TOKEN_BUDGET:
+                self.facts.pop(0)
         log(f"已记住信息: {information}", title="MEMORY", style="cyan")
-        while len(self.history) > self.max_turns * 2:
-            self.history.pop(0)
-            self.history.pop(0)
 
-    def forget(self):
-        """清除所有对话历史"""
-        self.clear()
+    def forget(self, all_memories: bool = False):
+        """清除对话历史和本次对话记住的信息；all_memories=True 时同时清空记忆库"""
+        with self._lock:
+            self.clear()
+            self.facts.clear()
+        if all_memories and config.MEMORY_ENABLED:
+            memory_store.get_store().clear(self.memory_scope)
         log("已清除所有对话上下文。", title="MEMORY", style="yellow")
         return "好的，我已经忘记了我们之前的对话内容。"
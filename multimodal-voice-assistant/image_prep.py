@@ -0,0 +1,147 @@
+"""
+发送给视觉模型之前的图像准备: 截图和摄像头画面在这里缩放、编码，再交给 LLM 和前端。
+- 缩放: 按当前 LLM 的目标分辨率 (IMAGE_MAX_SIDE) 缩小，超出模型处理分辨率的像素只会增加上传量和 token；
+- 编码: JPEG 或 WebP (IMAGE_FORMAT)，在字节预算 (IMAGE_MAX_BYTES) 内查找最高的质量 (从上次选中的质量开始试)，
+  最低质量仍超出预算时再缩小分辨率 (比把文字压成色块更利于模型读出内容)；
+- 格式由数据内容识别 (image_mime)，调用方只传递编码后的 bytes。
+"""
+import functools
+import io
+import time
+from dataclasses import dataclass
+from logger import log
+import config
+
+MIN_SIDE = 512 # 为满足字节预算而缩小时，长边不低于该值 (再小文字就无法辨认了)
+SHRINK_FACTOR = 0.75 # 最低质量仍超出预算时每次缩小的比例
+
+@dataclass
+class PreparedImage:
+    """编码后的图像及其编码参数"""
+    data: bytes
+    mime: str
+    width: int
+    height: int
+    quality: int
+    encode_ms: float # 缩放和编码 (含质量搜索) 的总耗时
+
+
+def image_mime(data: bytes) -> str:
+    """按文件头识别编码后的图像格式，返回 MIME 类型"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    return "image/jpeg"
+
+def target_side(llm: str | None = None) -> int | None:
+    """当前 (或指定) LLM 的目标分辨率 (长边像素)，None 表示不缩放"""
+    return config.IMAGE_MAX_SIDE.get(llm or config.ACTIVE_LLM)
+
+@functools.cache
+def _webp_supported() -> bool:
+    from PIL import features
+    if features.check("webp"):
+        return True
+    log("Pillow 不支持 WebP 编码，改用 JPEG。", title="WARNING", style="yellow")
+    return False
+
+def resolve_format(fmt: str | None = None) -> str:
+    """返回实际使用的编码格式 ("webp" / "jpeg")：Pillow 未编译 WebP 支持时回退到 JPEG"""
+    fmt = (fmt or config.IMAGE_FORMAT).lower()
+    if fmt == "webp" and not _webp_supported():
+        return "jpeg"
+    return fmt
+
+def resize(image, max_side: int | None):
+    """按比例缩小到长边不超过 max_side (不放大)"""
+    from PIL import Image
+    if not max_side or max(image.size) <= max_side:
+        return image
+    scale = max_side / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    # reducing_gap: 先用整数倍的 box 缩小再做 LANCZOS，大幅缩小时快得多，画质几乎不变
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+def encode(image, fmt: str, quality: int) -> bytes:
+    """把 PIL Image 编码为 fmt 格式 (在内存中)"""
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=config.IMAGE_WEBP_METHOD)
+    else:
+        image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+# 上次选中的质量 (按格式和尺寸)，连续截图的内容相近，从这里开始搜索通常只需编码一两次
+_last_quality: dict[tuple[str, int, int], int] = {}
+
+def _quality_steps() -> list[int]:
+    low, high = config.IMAGE_QUALITY_RANGE
+    qualities = list(range(low, high + 1, config.IMAGE_QUALITY_STEP))
+    if qualities[-1] != high:
+        qualities.append(high)
+    return qualities
+
+def _encode_within(image, fmt: str, max_bytes: int | None) -> tuple[bytes, int]:
+    """在质量范围内查找不超出 max_bytes 的最高质量，返回 (数据, 质量)；最低质量仍超出时返回最低质量的结果"""
+    qualities = _quality_steps()
+    if not max_bytes:
+        return encode(image, fmt, qualities[-1]), qualities[-1]
+    key = (fmt, image.width, image.height)
+    results: dict[int, bytes] = {} # 下标 -> 编码结果
+
+    def fits(index: int) -> bool:
+        if index not in results:
+            results[index] = encode(image, fmt, qualities[index])
+        return len(results[index]) <= max_bytes
+
+    # 先试上次的质量和相邻一档，不符合时在剩余范围内二分查找
+    lo, hi = 0, len(qualities) - 1
+    hint = qualities.index(_last_quality[key]) if _last_quality.get(key) in qualities else None
+    if hint is not None:
+        if fits(hint):
+            lo = hint + 1
+            if lo <= hi and not fits(lo):
+                hi = hint
+        else:
+            hi = hint - 1
+            if hi >= lo and fits(hi):
+                lo = hi + 1
+    best = max((index for index in results if len(results[index]) <= max_bytes), default=None)
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if fits(mid):
+            best, lo = mid, mid + 1
+        else:
+            hi = mid - 1
+    if best is None: # 最低质量也超出预算
+        best = 0
+        fits(best)
+    _last_quality[key] = qualities[best]
+    return results[best], qualities[best]
+
+def prepare_image(image, max_side: int | None = None, fmt: str | None = None,
+                  max_bytes: int | None = None) -> PreparedImage:
+    """
+    缩放并编码图像 (PIL Image)。未指定的参数取配置: 目标分辨率按 ACTIVE_LLM 取 IMAGE_MAX_SIDE，
+    格式取 IMAGE_FORMAT，字节预算取 IMAGE_MAX_BYTES (0/None 表示不限，使用最高质量)。
+    """
+    start = time.perf_counter()
+    fmt = resolve_format(fmt)
+    max_side = max_side if max_side is not None else target_side()
+    max_bytes = max_bytes if max_bytes is not None else config.IMAGE_MAX_BYTES
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    resized = resize(image, max_side)
+    data, quality = _encode_within(resized, fmt, max_bytes)
+    # 最低质量仍超出预算: 逐步缩小分辨率
+    while max_bytes and len(data) > max_bytes and max(resized.size) * SHRINK_FACTOR >= MIN_SIDE:
+        resized = resize(image, int(max(resized.size) * SHRINK_FACTOR))
+        data, quality = _encode_within(resized, fmt, max_bytes)
+    if max_bytes and len(data) > max_bytes:
+        log(f"图像在最低质量下仍超出字节预算 ({len(data) / 1024:.0f} KB > {max_bytes / 1024:.0f} KB)",
+            title="WARNING", style="yellow")
+
+    return PreparedImage(data, f"image/{fmt}", resized.width, resized.height, quality,
+                         (time.perf_counter() - start) * 1000)
@@ -1,36 +1,107 @@
 """
-处理截图、摄像头捕捉、剪贴板和图像编码。
+处理截图、摄像头捕捉和剪贴板。
+截图和摄像头画面经 image_prep 缩放到当前 LLM 的目标分辨率并在字节预算内编码 (WebP/JPEG)，以 bytes 返回
+(不写临时文件、不做 base64)，调用方原样传给 LLM 和前端 (格式由 image_prep.image_mime 识别)；
+base64 只在构造 DeepSeek 请求的 JSON 时进行 (见 llm_interface)。
 """
-import base64
+import importlib.util
+import shutil
+import subprocess
+import sys
+import threading
 import time
-from pathlib import Path
-import tempfile
-from PIL import ImageGrab, Image
 import pyperclip
-import pygame
-import pygame.camera
 from logger import log
 import config
+from image_prep import prepare_image
 
-def take_screenshot() -> Path | None:
-    """截取屏幕并保存为低质量 JPG 文件，返回文件路径"""
+# 优先使用 mss 截屏 (比 PIL.ImageGrab 快)，未安装时回退到 ImageGrab；真正的导入推迟到首次截屏
+MSS_AVAILABLE = importlib.util.find_spec("mss") is not None
+_local = threading.local() # mss 实例不是线程安全的，每个线程一个
+
+MIN_WINDOW_SIDE = 200 # 活动窗口小于该尺寸时 (如弹出菜单) 截取整个显示器
+
+def _active_window_bounds() -> tuple[int, int, int, int] | None:
+    """返回当前活动窗口的屏幕区域 (left, top, right, bottom)，无法获取时返回 None"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            import ctypes.wintypes
+            user32 = ctypes.windll.user32
+            hwnd = user32.GetForegroundWindow()
+            rect = ctypes.wintypes.RECT()
+            # mss 在 Windows 上会把进程设为 DPI 感知，此时返回的是物理像素坐标，与截图一致
+            if not hwnd or not user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+                return None
+            return rect.left, rect.top, rect.right, rect.bottom
+        if shutil.which("xdotool"):
+            output = subprocess.run(["xdotool", "getactivewindow", "getwindowgeometry", "--shell"],
+                                    capture_output=True, text=True, timeout=1, check=True).stdout
+            geometry = dict(line.split("=", 1) for line in output.splitlines() if "=" in line)
+            left, top = int(geometry["X"]), int(geometry["Y"])
+            return left, top, left + int(geometry["WIDTH"]), top + int(geometry["HEIGHT"])
+    except Exception as e:
+        log(f"获取活动窗口位置失败: {e}", title="WARNING", style="yellow")
+    return None
+
+def _clip_region(bounds: tuple[int, int, int, int] | None, screen: dict) -> dict | None:
+    """把窗口区域裁剪到屏幕范围内 (mss 的区域格式)，区域太小或不在屏幕上时返回 None"""
+    if bounds is None:
+        return None
+    left, top = max(bounds[0], screen["left"]), max(bounds[1], screen["top"])
+    right = min(bounds[2], screen["left"] + screen["width"])
+    bottom = min(bounds[3], screen["top"] + screen["height"])
+    if right - left < MIN_WINDOW_SIDE or bottom - top < MIN_WINDOW_SIDE:
+        return None
+    return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+def _grab_screen():
+    """截取屏幕 (SCREENSHOT_ACTIVE_WINDOW 开启时只截取活动窗口)，返回 PIL Image (RGB)"""
+    from PIL import Image # 推迟导入，避免拖慢启动
+    bounds = _active_window_bounds() if config.SCREENSHOT_ACTIVE_WINDOW else None
+    if MSS_AVAILABLE:
+        sct = getattr(_local, "mss", None)
+        if sct is None:
+            import mss
+            sct = _local.mss = mss.mss()
+        # 只截取窗口区域 (比截取整个屏幕再裁剪少拷贝像素)；monitors[0] 为所有显示器拼接成的整个桌面
+        region = _clip_region(bounds, sct.monitors[0]) or sct.monitors[config.SCREENSHOT_MONITOR]
+        shot = sct.grab(region)
+        # 直接从 mss 的 BGRA 缓冲区解码为 RGB，不经过中间的像素列表
+        return Image.frombuffer("RGB", shot.size, shot.bgra, "raw", "BGRX", 0, 1)
+    from PIL import ImageGrab
+    screenshot = ImageGrab.grab() # 主显示器，坐标原点与窗口坐标相同
+    region = _clip_region(bounds, {"left": 0, "top": 0, "width": screenshot.width, "height": screenshot.height})
+    if region:
+        screenshot = screenshot.crop((region["left"], region["top"],
+                                      region["left"] + region["width"], region["top"] + region["height"]))
+    return screenshot.convert("RGB")
+
+def take_screenshot() -> bytes | None:
+    """截取屏幕，缩放并编码为当前 LLM 适用的图像，返回编码后的数据"""
     log("正在截屏...", title="ACTION", style="bold blue")
     try:
-        path = config.TEMP_DIR / f"screenshot_{int(time.time())}.jpg"
-        screenshot = ImageGrab.grab()
-        rgb_screenshot = screenshot.convert('RGB')
-        rgb_screenshot.save(path, quality=15) # 低质量 JPG
-        log(f"截屏已保存到 {path}", title="ACTION", style="bold blue")
-        return path
+        start = time.perf_counter()
+        screenshot = _grab_screen()
+        grabbed_at = time.perf_counter()
+        prepared = prepare_image(screenshot)
+        log(f"截屏完成 ({screenshot.width}x{screenshot.height} -> {prepared.width}x{prepared.height} "
+            f"{prepared.mime} q{prepared.quality}, {len(prepared.data) / 1024:.0f} KB; "
+            f"截取 {(grabbed_at - start) * 1000:.0f} ms, 编码 {prepared.encode_ms:.0f} ms)",
+            title="ACTION", style="bold blue")
+        return prepared.data
     except Exception as e:
         log(f"截屏失败: {e}", title="ERROR", style="bold red")
         return None
 
-def web_cam_capture() -> Path | None:
-    """使用 Pygame 捕捉摄像头图像并保存，返回文件路径"""
+def web_cam_capture() -> bytes | None:
+    """使用 Pygame 捕捉摄像头图像并编码 (同截图)，返回编码后的数据"""
     log("正在捕捉摄像头图像...", title="ACTION", style="bold blue")
     cam = None # 初始化 cam 变量
     try:
+        import pygame # 推迟导入，只有使用摄像头时才加载 pygame.camera
+        import pygame.camera
+        from PIL import Image
         pygame.camera.init()
         cameras = pygame.camera.list_cameras()
 
@@ -46,11 +117,10 @@ def web_cam_capture() -> Path | None:
         cam.stop() # 停止摄像头
         pygame.camera.quit() # 退出摄像头模块
 
-        path = config.TEMP_DIR / f"webcam_{int(time.time())}.jpg"
-        pygame.image.save(image, str(path)) # 保存图像
-
-        log(f"摄像头图像已捕捉并保存到 {path}", title="ACTION", style="bold blue")
-        return path
+        prepared = prepare_image(Image.frombytes("RGB", image.get_size(), pygame.image.tobytes(image, "RGB")))
+        log(f"摄像头图像已捕捉 ({prepared.mime} q{prepared.quality}, {len(prepared.data) / 1024:.0f} KB)",
+            title="ACTION", style="bold blue")
+        return prepared.data
     except ImportError:
          log("错误: Pygame 未安装或初始化失败。无法捕捉摄像头。", title="ERROR", style="bold red")
          return None
@@ -61,35 +131,26 @@ def web_cam_capture() -> Path | None:
                 cam.stop()
             except: pass
         try: # 尝试退出摄像头模块
+            import pygame.camera
             pygame.camera.quit()
         except: pass
         return None
 
 
-def get_clipboard_text() -> str | None:
-    """获取剪贴板中的文本内容"""
-    log("正在提取剪贴板文本...", title="ACTION", style="bold blue")
+def get_clipboard_text(quiet: bool = False) -> str | None:
+    """获取剪贴板中的文本内容 (quiet=True 用于预取，不输出过程日志)"""
+    if not quiet:
+        log("正在提取剪贴板文本...", title="ACTION", style="bold blue")
     try:
         clipboard_content = pyperclip.paste()
         if isinstance(clipboard_content, str) and clipboard_content.strip():
-            log("剪贴板文本已提取。", title="ACTION", style="bold blue")
+            if not quiet:
+                log("剪贴板文本已提取。", title="ACTION", style="bold blue")
             return clipboard_content[:1500] + '...' if len(clipboard_content) > 1500 else clipboard_content
         else:
-            log('剪贴板中没有文本内容', title="INFO", style="yellow")
+            if not quiet:
+                log('剪贴板中没有文本内容', title="INFO", style="yellow")
             return None
     except Exception as e:
         log(f'无法访问剪贴板: {e}', title="ERROR", style="bold red")
         return None
-
-
-def encode_image(image_path: Path) -> str | None:
-    """将图像文件编码为 Base64 字符串"""
-    if not image_path or not image_path.exists():
-        log(f"错误: 图像文件无效或不存在 {image_path}", title="ERROR", style="bold red")
-        return None
-    try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    except Exception as e:
-        log(f"编码图像时出错 ({image_path}): {e}", title="ERROR", style="bold red")
-        return None
@@ -0,0 +1,259 @@
+"""
+本地功能调用路由: 在调用 LLM 做功能判断之前，先在本地判断，有把握时直接返回 (微秒级)，没有把握时才交给 LLM。
+- 截图/摄像头/剪贴板只在明确的指令句式 (动作 + 对象，且不是 "怎么截图" 之类的问句) 下本地决定，
+  其余涉及这些功能的说法 (单个关键词、分类器的判断) 一律交给 LLM: 误判为截图/摄像头会把屏幕或摄像头画面发出去；
+- 字符 n-gram 朴素贝叶斯分类器只用于本地判断 "none"，且不能有任何功能关键词；
+  朴素贝叶斯的后验概率偏高，阈值在标注的留出集 (CALIBRATION_EXAMPLES) 上校准，保证留出集上没有误判为 "none" 的指令。
+LLM 的有效决策会追加到 JSONL 日志中，作为分类器的训练数据 (启动时加载，运行中增量更新)。
+"""
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from logger import log
+import config
+from startup import LazySingleton
+
+LABELS = ["extract clipboard", "take screenshot", "capture webcam", "none"]
+
+# 功能关键词: 命中任一时不在本地判断为 "none" (可能需要附件，交给 LLM)
+KEYWORD_RULES = [
+    ("extract clipboard", re.compile(r"剪贴板|剪切板|粘贴板|复制|拷贝|clipboard|copied|copy", re.I)),
+    ("take screenshot", re.compile(r"屏幕|截图|截屏|页面|网页|窗口|界面|报错|这是什么|这个是什么|screen|page|window|error|what is this", re.I)),
+    ("capture webcam", re.compile(r"摄像头|相机|镜头|看看我|看一下我|我(穿|戴|拿|手里|手上|的脸|的衣服|的发型|长得|看起来)|webcam|camera|look at me|am i (wearing|holding)|how do i look", re.I)),
+]
+
+# 明确的指令句式: (标签, 动作, 对象)，动作和对象都命中、且不是求助类问句时才在本地决定
+COMMAND_RULES = [
+    ("extract clipboard",
+     re.compile(r"总结|翻译|解释|看看|看一下|读一下|改写|润色|summari[sz]e|translate|explain|read|rewrite|look at", re.I),
+     re.compile(r"剪贴板(里|中)|我(刚才?|刚刚)?复制的|what i('ve)? (just )?copied|(my|the) clipboard", re.I)),
+    ("take screenshot",
+     re.compile(r"看看|看一下|帮我看|读一下|分析|解释|总结|翻译|是什么意思|说的是什么|在讲什么|是什么|look at|read|explain|summari[sz]e|what does|what'?s|what is", re.I),
+     re.compile(r"屏幕上|我的屏幕|当前的?(屏幕|页面|窗口)|我(现在)?打开的(这个)?(页面|网页|窗口)|on my screen|this (page|window)", re.I)),
+    ("capture webcam",
+     re.compile(r"看看|看一下|看到|瞧瞧|好看吗|怎么样|look at|can you see|what am i|how do i look", re.I),
+     re.compile(r"我(今天)?(穿的|戴的|手里|手上拿|拿着的)|我的(脸|衣服|发型)|摄像头里|look at me|am i (wearing|holding)|how do i look", re.I)),
+]
+# 求助/询问类问句: 提到了截图、摄像头等，但不是让助手去看 ("Windows 怎么截图"、"相机买哪个好")
+NOT_A_COMMAND = re.compile(
+    r"怎么(办|弄|做|截|用|设置|修)|如何|怎样|为什么|为啥|哪个好|推荐|买|坏了|清理|清空|删除|设置|快捷键|"
+    r"how (do|to|can|should)|why|which|buy|recommend|broken|clear|delete|shortcut|settings", re.I)
+
+# 冷启动样本: 日志中还没有 LLM 决策时，分类器仍能处理常见说法
+SEED_EXAMPLES = [
+    ("帮我总结一下我复制的这段文字", "extract clipboard"),
+    ("翻译一下剪贴板里的内容", "extract clipboard"),
+    ("summarize what I copied", "extract clipboard"),
+    ("我屏幕上这个报错是什么意思", "take screenshot"),
+    ("帮我看看当前页面在讲什么", "take screenshot"),
+    ("我现在打开的这个网页是什么", "take screenshot"),
+    ("what is on my screen", "take screenshot"),
+    ("我今天穿的衣服好看吗", "capture webcam"),
+    ("你能看到我手里拿的是什么吗", "capture webcam"),
+    ("我的发型怎么样", "capture webcam"),
+    ("what am I holding", "capture webcam"),
+    ("今天天气怎么样", "none"),
+    ("给我讲个笑话", "none"),
+    ("北京有哪些好玩的地方", "none"),
+    ("一加一等于几", "none"),
+    ("帮我写一首关于春天的诗", "none"),
+    ("你叫什么名字", "none"),
+    ("推荐几本好书", "none"),
+    ("tell me a joke", "none"),
+    ("what is the capital of France", "none"),
+]
+
+# 校准用的留出集 (不参与训练): 包括提到功能关键词但不需要附件的说法，以及容易被误判为 "none" 的指令
+CALIBRATION_EXAMPLES = [
+    ("帮我翻译一下我刚复制的英文", "extract clipboard"),
+    ("把剪贴板里的代码解释一下", "extract clipboard"),
+    ("看看我复制的这段话有没有错别字", "extract clipboard"),
+    ("read what I just copied", "extract clipboard"),
+    ("这个报错怎么解决", "take screenshot"),
+    ("这是什么", "take screenshot"),
+    ("帮我看看这段代码有什么问题", "take screenshot"),
+    ("这篇文章讲了什么", "take screenshot"),
+    ("解释一下这张图表", "take screenshot"),
+    ("这道题怎么做", "take screenshot"),
+    ("what does this error mean", "take screenshot"),
+    ("看看我现在的样子", "capture webcam"),
+    ("我今天气色怎么样", "capture webcam"),
+    ("我戴的这副眼镜适合我吗", "capture webcam"),
+    ("do I look tired", "capture webcam"),
+    ("我的电脑很卡怎么办", "none"),
+    ("what is a good camera to buy", "none"),
+    ("手机屏幕坏了怎么办", "none"),
+    ("Windows怎么截图", "none"),
+    ("如何清理剪贴板历史", "none"),
+    ("明天会下雨吗", "none"),
+    ("帮我写一封请假邮件", "none"),
+    ("三角形的内角和是多少", "none"),
+    ("推荐一部科幻电影", "none"),
+    ("上海到杭州坐高铁要多久", "none"),
+    ("解释一下什么是量子纠缠", "none"),
+    ("how far is the moon", "none"),
+    ("write a haiku about autumn", "none"),
+    ("我应该怎么学习 Python", "none"),
+]
+
+def _features(text: str) -> list[str]:
+    """字符 1~3-gram (中英文通用，无需分词)"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return [text[i:i + n] for n in (1, 2, 3) for i in range(len(text) - n + 1)]
+
+def match_command(prompt: str) -> str | None:
+    """明确的指令句式对应的标签；不是指令、或同时像多种指令时返回 None"""
+    if NOT_A_COMMAND.search(prompt):
+        return None
+    matched = {label for label, action, target in COMMAND_RULES if action.search(prompt) and target.search(prompt)}
+    return matched.pop() if len(matched) == 1 else None
+
+def has_keyword(prompt: str) -> bool:
+    """是否提到了任一功能关键词"""
+    return any(pattern.search(prompt) for _, pattern in KEYWORD_RULES)
+
+def calibrate_threshold(model: "NaiveBayes", examples: list[tuple[str, str]], floor: float) -> float:
+    """
+    返回本地判断 "none" 的置信度阈值: 高于留出集上所有被误判为 "none" 的指令的置信度 (至少为 floor)。
+    只统计没有功能关键词的样本 (有关键词的说法不会在本地判断为 "none")。
+    """
+    threshold = floor
+    for text, label in examples:
+        if label == "none" or has_keyword(text):
+            continue
+        predicted, confidence = model.predict(text)
+        if predicted == "none":
+            threshold = max(threshold, math.nextafter(confidence, math.inf)) # 误判的置信度为 1.0 时不再本地判断
+    return threshold
+
+
+class NaiveBayes:
+    """多项式朴素贝叶斯 (拉普拉斯平滑)，支持增量训练"""
+    def __init__(self):
+        self.doc_counts = Counter()
+        self.feature_counts = defaultdict(Counter)
+        self.total_features = Counter()
+        self.vocabulary = set()
+
+    def learn(self, text: str, label: str):
+        features = _features(text)
+        self.doc_counts[label] += 1
+        self.feature_counts[label].update(features)
+        self.total_features[label] += len(features)
+        self.vocabulary.update(features)
+
+    def predict(self, text: str) -> tuple[str | None, float]:
+        """返回 (最可能的标签, 后验概率)"""
+        if not self.doc_counts:
+            return None, 0.0
+        features = _features(text)
+        total_docs = sum(self.doc_counts.values())
+        vocab_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, docs in self.doc_counts.items():
+            counts = self.feature_counts[label]
+            denominator = self.total_features[label] + vocab_size
+            scores[label] = math.log(docs / total_docs) + sum(math.log((counts[f] + 1) / denominator) for f in features)
+        best = max(scores, key=scores.get)
+        # softmax 归一化得到后验概率
+        z = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / z
+
+
+class IntentRouter:
+    """功能调用路由器 (线程安全)"""
+    def __init__(self, log_path: Path = config.INTENT_LOG_PATH, min_confidence: float = config.INTENT_ROUTER_MIN_CONFIDENCE):
+        self.log_path = Path(log_path)
+        self.min_confidence = min_confidence
+        self.model = NaiveBayes()
+        self._lock = threading.Lock()
+        self.decisions = Counter() # 按来源 (rule/model/llm) 统计
+        self._route_time_s = 0.0
+        for text, label in SEED_EXAMPLES:
+            self.model.learn(text, label)
+        logged = self._load_log()
+        self.none_threshold = calibrate_threshold(self.model, CALIBRATION_EXAMPLES, min_confidence)
+        log(f"功能调用路由器已加载 ({len(SEED_EXAMPLES)} 条内置样本，{logged} 条 LLM 决策，"
+            f"none 阈值 {self.none_threshold:.4f})", title="INIT", style="green")
+
+    def _load_log(self) -> int:
+        """从日志加载历史 LLM 决策"""
+        if not self.log_path.exists():
+            return 0
+        count = 0
+        with self.log_path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("label") in LABELS and record.get("prompt"):
+                    self.model.learn(record["prompt"], record["label"])
+                    count += 1
+        return count
+
+    def route(self, prompt: str) -> str | None:
+        """本地判断功能调用；没有把握时返回 None (应交给 LLM)"""
+        start = time.perf_counter()
+        label, source, confidence = match_command(prompt), "rule", 1.0
+        if label is None and not has_keyword(prompt):
+            with self._lock:
+                predicted, confidence = self.model.predict(prompt)
+            source = "model"
+            # 分类器只在本地决定 "none"，功能调用一律交给 LLM
+            if predicted == "none" and confidence >= self.none_threshold:
+                label = predicted
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._route_time_s += elapsed
+            self.decisions[source if label else "llm"] += 1
+        if label:
+            log(f"本地功能调用决策: {label} ({source}, 置信度 {confidence:.2f}, {elapsed * 1e6:.0f}µs)", title="FUNCTION_CALL", style="yellow")
+        return label
+
+    def candidate(self, prompt: str) -> str | None:
+        """最可能的标签 (不论置信度，仅作提示，如决定是否预取剪贴板): 指令句式 > 唯一命中的关键词 > 分类器"""
+        label = match_command(prompt)
+        if label:
+            return label
+        matched = {label for label, pattern in KEYWORD_RULES if pattern.search(prompt)}
+        if len(matched) == 1:
+            return matched.pop()
+        with self._lock:
+            return self.model.predict(prompt)[0]
+
+    def learn(self, prompt: str, label: str):
+        """记录一条 LLM 决策: 增量更新分类器并追加到日志"""
+        if label not in LABELS:
+            return
+        with self._lock:
+            self.model.learn(prompt, label)
+            try:
+                with self.log_path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({"prompt": prompt, "label": label, "time": time.time()}, ensure_ascii=False) + "\n")
+            except OSError as e:
+                log(f"写入功能调用日志失败: {e}", title="WARNING", style="yellow")
+
+    def stats(self) -> dict:
+        """返回路由统计 (local_rate 为无需调用 LLM 的比例)"""
+        with self._lock:
+            total = sum(self.decisions.values())
+            local = total - self.decisions["llm"]
+            return {
+                **{source: self.decisions[source] for source in ("rule", "model", "llm")},
+                "local_rate": local / total if total else 0.0,
+                "avg_route_us": self._route_time_s / total * 1e6 if total else 0.0,
+            }
+
+    def log_stats(self):
+        """输出路由统计"""
+        log(f"功能调用路由统计: {self.stats()}", title="FUNCTION_CALL", style="dim")
+
+
+# 全局路由器在首次功能判断时创建
+_router = LazySingleton("intent_router", IntentRouter)
+get_router = _router.get
@@ -1,34 +1,63 @@
 """
 提供统一的 LLM 调用接口，根据配置选择 DeepSeek 或 Gemini。
 """
+import asyncio
 import base64
+from typing import AsyncIterator, Iterator
 from logger import log
 import config
 from conversation import EnhancedConversationContext # 需要类型提示
-from api import deepseek_client, gemini_client
+from api import deepseek_async, deepseek_client, gemini_client
+from image_prep import image_mime
+import intent_router
 
-def llm_prompt(conversation_context: EnhancedConversationContext, prompt: str, img_base64: str | None = None):
+def llm_prompt(conversation_context: EnhancedConversationContext, prompt: str, image: bytes | None = None):
     """根据 ACTIVE_LLM 选择调用 DeepSeek 或 Gemini"""
     if config.ACTIVE_LLM == 'gemini':
-        return gemini_prompt(conversation_context, prompt, img_base64)
+        return gemini_prompt(conversation_context, prompt, image)
     elif config.ACTIVE_LLM == 'deepseek':
-        return deepseek_prompt(conversation_context, prompt, img_base64)
+        return deepseek_prompt(conversation_context, prompt, image)
     else:
         log(f"未知的 ACTIVE_LLM 设置: {config.ACTIVE_LLM}", title="ERROR", style="bold red")
         return "抱歉，LLM 配置错误。"
 
-def deepseek_prompt(conversation_context: EnhancedConversationContext, prompt: str, img_base64: str | None = None):
-    """向 DeepSeek 发送提示"""
+def llm_prompt_stream(conversation_context: EnhancedConversationContext, prompt: str, image: bytes | None = None) -> Iterator[str]:
+    """流式版本的 llm_prompt: 逐段产出回答文本，没有产出任何内容时产出一条错误提示"""
+    if config.ACTIVE_LLM == 'gemini':
+        prompt_parts, model_to_use, history = _gemini_request(conversation_context, prompt, image)
+        chunks = gemini_client.stream_gemini_api(prompt_parts, model_to_use, system_instruction=config.GEMINI_SYS_MSG, history=history)
+        fallback = "Sorry, I encountered an issue while processing your Gemini request."
+    elif config.ACTIVE_LLM == 'deepseek':
+        messages, model_to_use = _deepseek_request(conversation_context, prompt, image)
+        chunks = deepseek_client.stream_deepseek_api(messages, model_to_use)
+        fallback = "抱歉，我在处理你的 DeepSeek 请求时遇到了问题。"
+    else:
+        log(f"未知的 ACTIVE_LLM 设置: {config.ACTIVE_LLM}", title="ERROR", style="bold red")
+        yield "抱歉，LLM 配置错误。"
+        return
+
+    produced = False
+    for chunk in chunks:
+        produced = True
+        yield chunk
+    if not produced:
+        yield fallback
+
+def _deepseek_request(conversation_context: EnhancedConversationContext, prompt: str, image: bytes | None = None):
+    """构造 DeepSeek 请求，返回 (messages, 模型名)"""
     # DeepSeek 的 messages 包含 system + history + new user prompt
-    messages = [{'role': 'system', 'content': config.DEEPSEEK_SYS_MSG}]
+    memory = conversation_context.get_memory_text(prompt) # 相关的记忆和滚动摘要放在系统消息中
+    system_message = f"{config.DEEPSEEK_SYS_MSG}\n\n{memory}" if memory else config.DEEPSEEK_SYS_MSG
+    messages = [{'role': 'system', 'content': system_message}]
     messages.extend(conversation_context.get_context()) # 添加历史记录
 
     user_content_list = [{"type": "text", "text": prompt}] # 新的用户提示总是文本
 
-    if img_base64:
+    if image:
+        # DeepSeek 只接受 JSON 中的 data URL，这是整个流程中唯一进行 base64 编码的地方
         user_content_list.append({
              "type": "image_url",
-             "image_url": {"url": f"data:image/jpeg;base64,{img_base64}"}
+             "image_url": {"url": f"data:{image_mime(image)};base64,{base64.b64encode(image).decode('ascii')}"}
         })
         log("已添加图片上下文到 DeepSeek 提示", title="LLM_PROMPT", style="blue")
         model_to_use = config.DEEPSEEK_VISION_MODEL
@@ -36,7 +65,11 @@ def deepseek_prompt(conversation_context: EnhancedConversationContext, prompt: s
         model_to_use = config.DEEPSEEK_CHAT_MODEL
 
     messages.append({'role': 'user', 'content': user_content_list}) # 添加当前用户输入
+    return messages, model_to_use
 
+def deepseek_prompt(conversation_context: EnhancedConversationContext, prompt: str, image: bytes | None = None):
+    """向 DeepSeek 发送提示"""
+    messages, model_to_use = _deepseek_request(conversation_context, prompt, image)
     response_message = deepseek_client.call_deepseek_api(messages, model_to_use)
 
     if response_message and response_message.get("content"):
@@ -47,31 +80,45 @@ def deepseek_prompt(conversation_context: EnhancedConversationContext, prompt: s
     else:
         return "抱歉，我在处理你的 DeepSeek 请求时遇到了问题。"
 
-def gemini_prompt(conversation_context: EnhancedConversationContext, prompt: str, img_base64: str | None = None):
-    """向 Gemini 发送提示"""
-    # Gemini 的 prompt 可以是简单的文本 + 图片列表
-    context_str = conversation_context.get_formatted_context_string()
-    prompt_with_history = f"Previous conversation:\n{context_str}\n\nUser prompt: {prompt}" if context_str else f"User prompt: {prompt}"
+def _gemini_history(conversation_context: EnhancedConversationContext, prompt: str | None = None) -> list[dict]:
+    """将对话历史转换为 Gemini 原生的多轮格式 (记住的信息和滚动摘要作为开头的一轮，系统指令按模型缓存，不随对话变化)"""
+    history = []
+    memory = conversation_context.get_memory_text(prompt)
+    if memory:
+        history.append({"role": "user", "parts": [memory]})
+        history.append({"role": "model", "parts": ["OK."]})
+    history.extend(
+        {"role": "model" if message["role"] == "assistant" else "user", "parts": [message["content"]]}
+        for message in conversation_context.get_context()
+    )
+    return history
 
-    prompt_parts = [prompt_with_history] # 开始部分是文本
+def _gemini_request(conversation_context: EnhancedConversationContext, prompt: str, image: bytes | None = None):
+    """构造 Gemini 请求，返回 (prompt_parts, 模型名, 原生历史 或 None)"""
+    # Gemini 的 prompt 可以是简单的文本 + 图片列表
+    if config.GEMINI_CHAT_SESSION:
+        # 历史以原生多轮格式发送，不再序列化进提示文本
+        history = _gemini_history(conversation_context, prompt)
+        prompt_parts = [prompt]
+    else:
+        history = None
+        context_str = conversation_context.get_formatted_context_string(prompt)
+        prompt_with_history = f"Previous conversation:\n{context_str}\n\nUser prompt: {prompt}" if context_str else f"User prompt: {prompt}"
+        prompt_parts = [prompt_with_history] # 开始部分是文本
     model_to_use = config.GEMINI_CHAT_MODEL
 
-    if img_base64:
-        try:
-            image_bytes = base64.b64decode(img_base64)
-            image_part = {
-                "mime_type": "image/jpeg",
-                "data": image_bytes
-            }
-            prompt_parts.append(image_part) # 添加图片部分
-            model_to_use = config.GEMINI_VISION_MODEL # 切换到视觉模型
-            log("已添加图片上下文到 Gemini 提示", title="LLM_PROMPT", style="blue")
-        except Exception as e:
-            log(f"处理 Gemini 图片时出错: {e}", title="ERROR", style="bold red")
-            prompt_parts.append("\n\n(System note: Image processing failed)")
+    if image:
+        # Gemini SDK 直接接受编码后的图像数据 (不需要 base64)
+        prompt_parts.append({"mime_type": image_mime(image), "data": image}) # 添加图片部分
+        model_to_use = config.GEMINI_VISION_MODEL # 切换到视觉模型
+        log("已添加图片上下文到 Gemini 提示", title="LLM_PROMPT", style="blue")
+    return prompt_parts, model_to_use, history
 
+def gemini_prompt(conversation_context: EnhancedConversationContext, prompt: str, image: bytes | None = None):
+    """向 Gemini 发送提示"""
+    prompt_parts, model_to_use, history = _gemini_request(conversation_context, prompt, image)
     # 调用 Gemini API
-    response_content = gemini_client.call_gemini_api(prompt_parts, model_to_use, system_instruction=config.GEMINI_SYS_MSG)
+    response_content = gemini_client.call_gemini_api(prompt_parts, model_to_use, system_instruction=config.GEMINI_SYS_MSG, history=history)
 
     if response_content:
         # conversation_context.add_exchange(prompt, response_content) # 不在此处添加
@@ -80,8 +127,31 @@ def gemini_prompt(conversation_context: EnhancedConversationContext, prompt: str
         return "Sorry, I encountered an issue while processing your Gemini request."
 
 
+def llm_summarize(previous_summary: str, messages: list[dict]) -> str | None:
+    """把移出对话窗口的消息合并进滚动摘要 (在后台线程中调用)，失败时返回 None"""
+    transcript = "\n".join(f"{'用户' if m['role'] == 'user' else '助手'}: {m['content']}" for m in messages)
+    instruction = (
+        f"请把下面的对话合并进已有摘要，输出新的摘要 (不超过 {config.CONTEXT_SUMMARY_MAX_TOKENS} 字)。"
+        "保留事实、用户的偏好和未解决的问题，省略寒暄，只输出摘要本身。"
+    )
+    request = f"{instruction}\n\n已有摘要:\n{previous_summary or '(无)'}\n\n对话:\n{transcript}"
+    if config.ACTIVE_LLM == 'gemini':
+        return gemini_client.call_gemini_api([request], config.GEMINI_CHAT_MODEL)
+    elif config.ACTIVE_LLM == 'deepseek':
+        message = deepseek_client.call_deepseek_api([{'role': 'user', 'content': request}], config.DEEPSEEK_CHAT_MODEL)
+        return message.get("content") if message else None
+    return None
+
 def function_call(prompt: str):
-    """根据 ACTIVE_LLM 选择调用 DeepSeek 或 Gemini 进行功能判断"""
+    """判断功能调用: 先由本地路由器判断，没有把握时根据 ACTIVE_LLM 选择调用 DeepSeek 或 Gemini"""
+    if config.INTENT_ROUTER_ENABLED:
+        label = intent_router.get_router().route(prompt)
+        if label:
+            return label
+    return llm_function_call(prompt)
+
+def llm_function_call(prompt: str):
+    """根据 ACTIVE_LLM 选择调用 DeepSeek 或 Gemini 进行功能判断 (不经过本地路由器)"""
     if config.ACTIVE_LLM == 'gemini':
         return gemini_function_call(prompt)
     elif config.ACTIVE_LLM == 'deepseek':
@@ -90,31 +160,36 @@ def function_call(prompt: str):
         log(f"未知的 ACTIVE_LLM 设置: {config.ACTIVE_LLM}", title="ERROR", style="bold red")
         return "none"
 
+def _record_decision(prompt: str, label: str):
+    """把 LLM 的有效决策交给本地路由器学习"""
+    if config.INTENT_ROUTER_ENABLED:
+        intent_router.get_router().learn(prompt, label)
+
+def _function_call_messages(prompt: str) -> list:
+    """构造 DeepSeek 功能调用决策的 messages"""
+    return [{"role": "system", "content": config.DEEPSEEK_FUNC_SYS_MSG}, {"role": "user", "content": prompt}]
+
+def _parse_decision(response_raw: str | None, prompt: str, llm_name: str) -> str:
+    """解析 LLM 返回的功能调用决策，无效或失败时返回 none"""
+    if not response_raw:
+        log(f"{llm_name} 功能调用决策失败", title="ERROR", style="bold red")
+        return "none"
+    # 移除可能的引号或 Markdown 格式
+    response_text = response_raw.strip().strip('"`\'').strip().lower()
+
+    allowed_calls = ["extract clipboard", "take screenshot", "capture webcam", "none"]
+    if response_text in allowed_calls:
+        log(f"{llm_name} 功能调用决策: {response_text}", title="FUNCTION_CALL", style="yellow")
+        _record_decision(prompt, response_text)
+        return response_text
+    log(f"{llm_name} 功能调用返回无效选项 (原始: '{response_raw}', 处理后: '{response_text}')", title="WARNING", style="yellow")
+    return "none"
+
 def deepseek_function_call(prompt: str):
     """使用 DeepSeek 判断功能调用"""
-    messages = [{"role": "system", "content": config.DEEPSEEK_FUNC_SYS_MSG}, {"role": "user", "content": prompt}]
     # 通常使用基础聊天模型进行功能判断
-    response_message = deepseek_client.call_deepseek_api(messages, config.DEEPSEEK_CHAT_MODEL)
-
-    if response_message and response_message.get("content"):
-        response_raw = response_message["content"].strip()
-        # 移除可能的引号
-        if (response_raw.startswith('"') and response_raw.endswith('"')) or \
-           (response_raw.startswith("'") and response_raw.endswith("'")):
-            response_text = response_raw[1:-1].strip().lower()
-        else:
-            response_text = response_raw.lower()
-
-        allowed_calls = ["extract clipboard", "take screenshot", "capture webcam", "none"]
-        if response_text in allowed_calls:
-            log(f"DeepSeek 功能调用决策: {response_text}", title="FUNCTION_CALL", style="yellow")
-            return response_text
-        else:
-            log(f"DeepSeek 功能调用返回无效选项 (原始: '{response_message['content']}', 处理后: '{response_text}')", title="WARNING", style="yellow")
-            return "none"
-    else:
-        log("DeepSeek 功能调用决策失败", title="ERROR", style="bold red")
-        return "none"
+    response_message = deepseek_client.call_deepseek_api(_function_call_messages(prompt), config.DEEPSEEK_CHAT_MODEL)
+    return _parse_decision(response_message.get("content") if response_message else None, prompt, "DeepSeek")
 
 def gemini_function_call(prompt: str):
     """使用 Gemini 判断功能调用"""
@@ -124,19 +199,64 @@ def gemini_function_call(prompt: str):
         config.GEMINI_CHAT_MODEL, # 使用基础聊天模型
         system_instruction=config.GEMINI_FUNC_SYS_MSG
     )
+    return _parse_decision(response_text_raw, prompt, "Gemini")
+
+
+# --- asyncio 接口 (供 assistant_core 使用) ---
+async def _aiter_in_thread(chunks: Iterator[str]) -> AsyncIterator[str]:
+    """在线程中迭代同步生成器，转换为异步迭代器 (没有异步客户端时的后备方案)"""
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while (chunk := await loop.run_in_executor(None, next, chunks, done)) is not done:
+            yield chunk
+    finally:
+        # 取消时关闭生成器，释放底层连接
+        try:
+            chunks.close()
+        except ValueError:
+            pass # 生成器仍在线程中执行 next()，结束后由垃圾回收关闭
 
-    if response_text_raw:
-        response_text = response_text_raw.strip().lower()
-        # 尝试去除可能的引号或 Markdown 格式
-        response_text = response_text.strip('"`\'')
-
-        allowed_calls = ["extract clipboard", "take screenshot", "capture webcam", "none"]
-        if response_text in allowed_calls:
-            log(f"Gemini 功能调用决策: {response_text}", title="FUNCTION_CALL", style="yellow")
-            return response_text
-        else:
-            log(f"Gemini 功能调用返回无效选项 (原始: '{response_text_raw}', 处理后: '{response_text}')", title="WARNING", style="yellow")
-            return "none"
+def _deepseek_astream(messages: list, model_name: str) -> AsyncIterator[str]:
+    """DeepSeek 流式调用: 优先使用 httpx 异步客户端"""
+    if deepseek_async.HTTPX_AVAILABLE:
+        return deepseek_async.astream_deepseek_api(messages, model_name)
+    return _aiter_in_thread(deepseek_client.stream_deepseek_api(messages, model_name))
+
+async def llm_prompt_astream(conversation_context: EnhancedConversationContext, prompt: str, image: bytes | None = None) -> AsyncIterator[str]:
+    """异步版本的 llm_prompt_stream (构造请求时检索记忆库，在线程中执行，不阻塞事件循环)"""
+    if config.ACTIVE_LLM == 'gemini':
+        prompt_parts, model_to_use, history = await asyncio.to_thread(_gemini_request, conversation_context, prompt, image)
+        chunks = gemini_client.astream_gemini_api(prompt_parts, model_to_use, system_instruction=config.GEMINI_SYS_MSG, history=history)
+        fallback = "Sorry, I encountered an issue while processing your Gemini request."
+    elif config.ACTIVE_LLM == 'deepseek':
+        messages, model_to_use = await asyncio.to_thread(_deepseek_request, conversation_context, prompt, image)
+        chunks = _deepseek_astream(messages, model_to_use)
+        fallback = "抱歉，我在处理你的 DeepSeek 请求时遇到了问题。"
+    else:
+        log(f"未知的 ACTIVE_LLM 设置: {config.ACTIVE_LLM}", title="ERROR", style="bold red")
+        yield "抱歉，LLM 配置错误。"
+        return
+
+    produced = False
+    try:
+        async for chunk in chunks:
+            produced = True
+            yield chunk
+    finally:
+        await chunks.aclose()
+    if not produced:
+        yield fallback
+
+async def llm_function_call_async(prompt: str) -> str:
+    """异步版本的 llm_function_call (不经过本地路由器)"""
+    if config.ACTIVE_LLM == 'gemini':
+        chunks = gemini_client.astream_gemini_api([prompt], config.GEMINI_CHAT_MODEL, system_instruction=config.GEMINI_FUNC_SYS_MSG)
+        llm_name = "Gemini"
+    elif config.ACTIVE_LLM == 'deepseek':
+        chunks = _deepseek_astream(_function_call_messages(prompt), config.DEEPSEEK_CHAT_MODEL)
+        llm_name = "DeepSeek"
     else:
-        log("Gemini 功能调用决策失败", title="ERROR", style="bold red")
+        log(f"未知的 ACTIVE_LLM 设置: {config.ACTIVE_LLM}", title="ERROR", style="bold red")
         return "none"
+    return _parse_decision("".join([chunk async for chunk in chunks]), prompt, llm_name)
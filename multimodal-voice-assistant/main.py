@@ -2,21 +2,28 @@
 多模态 AI 语音助手主程序。
 负责监听、处理回调、协调各模块。
 """
-import speech_recognition as sr
 import time
-import re
-import os
+_import_start = time.perf_counter() # 用于统计启动耗时
+import speech_recognition as sr
+import threading
 import traceback
-import pygame # 用于退出时清理
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable
 
 # 导入自定义模块
 import config
+import startup
 from logger import log, save_log
 from conversation import EnhancedConversationContext
-from audio import preprocessing, stt, tts
-from input_handler import take_screenshot, web_cam_capture, get_clipboard_text, encode_image
+from audio import playback, preprocessing, stt, stt_service, tts, vad
+from audio.streaming import BackgroundTranscriber, StreamingTranscriber, StreamEvent
+from audio.wakeword import WakeWordGate
+from input_handler import take_screenshot, web_cam_capture
 from web_search import duckduckgo_search, process_search_results
-from llm_interface import llm_prompt, function_call
+from llm_interface import llm_prompt, llm_prompt_stream, function_call
+from assistant_core import AssistantCore, extract_prompt, is_special_command, match_prompt
+import intent_router
+import speculation
 
 # --- 初始化 ---
 # 初始化语音识别器
@@ -33,42 +40,89 @@ except Exception as e:
 # 初始化对话上下文管理器
 conversation_context = EnhancedConversationContext()
 
-# --- 核心回调逻辑 ---
-def extract_prompt(transcribed_text: str, wake_word: str) -> str | None:
-    """从转录文本中提取唤醒词之后的有效指令"""
-    log(f"语音转文本结果: '{transcribed_text}'", title="DEBUG", style="bold blue")
-    pattern = rf'.*?\b{re.escape(wake_word)}[\s,.?!]*([^\s].*)'
-    match = re.search(pattern, transcribed_text, re.IGNORECASE | re.DOTALL)
-    if match:
-        prompt = match.group(1).strip()
-        prompt = re.sub(r'[.。，,?？!！]$', '', prompt).strip() # 移除结尾标点
-        log(f"提取的指令: '{prompt}'", title="DEBUG", style="bold green")
-        return prompt if prompt else None
-    else:
-        log("未匹配到唤醒词或唤醒词后无指令。", title="INFO", style="yellow")
-        return None
+# 指令处理线程: 识别结果按到达顺序依次处理 (避免多个回答同时播放)，不阻塞麦克风监听
+_turn_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="turn")
+
+# 初始化唤醒词门控 (tiny 模型在首次使用时加载)
+wake_gate = WakeWordGate() if config.WAKE_GATE_ENABLED else None
+
+# asyncio 助手核心: 每个回合是一个任务，新的唤醒词可以打断正在进行的回合 (未启用时使用上面的指令线程)
+core = AssistantCore(conversation_context) if config.ASYNC_CORE else None
 
+# --- 核心回调逻辑 ---
 def callback(recognizer, audio):
     """语音识别回调函数"""
-    prompt_audio_path = config.TEMP_DIR / f"prompt_{int(time.time())}.wav"
-    processed_audio_path = None
-    photo_path_to_delete = None # 用于追踪需要删除的图片
-
+    speech_end = time.perf_counter() # 用户说完话的时间，用于统计首音延迟
     try:
-        # 1. 保存原始录音
-        with open(prompt_audio_path, 'wb') as f:
-            f.write(audio.get_wav_data())
-        log(f"临时录音已保存: {prompt_audio_path.name}", title="AUDIO", style="cyan")
+        # 1. 直接在内存中获取 16kHz 单声道 PCM (不再写临时 WAV 文件)
+        pcm = audio.get_raw_data(convert_rate=config.STT_SAMPLE_RATE, convert_width=config.STT_SAMPLE_WIDTH)
 
-        # 2. 预处理音频
-        processed_audio_path = preprocessing.preprocess_audio(prompt_audio_path)
+        raw_samples = preprocessing.pcm_to_float32(pcm)
+
+        # 2. 语音活动检测: 裁剪静音并切分语音段，没有语音则直接丢弃
+        if config.VAD_ENABLED:
+            speech_chunks = vad.split_speech(raw_samples)
+            if not speech_chunks:
+                log("未检测到语音，丢弃该片段。", title="VAD", style="dim")
+                return
+            kept_s = sum(c.size for c in speech_chunks) / config.STT_SAMPLE_RATE
+            log(f"VAD: 原始 {raw_samples.size / config.STT_SAMPLE_RATE:.2f}s -> 语音 {kept_s:.2f}s ({len(speech_chunks)} 段)", title="VAD", style="dim")
+        else:
+            speech_chunks = [raw_samples]
 
-        # 3. 语音转文本
-        prompt_text = stt.wav_to_text(processed_audio_path)
-        if not prompt_text: # STT 失败或为空
+        # 3. 唤醒词门控: 小模型未检测到唤醒词时不运行完整模型 (唤醒词位于第一段开头)
+        if wake_gate and not _passes_wake_gate(speech_chunks[0]):
             return
 
-        # 4. 提取指令
+        # 4. 预处理各语音段并并行提交到 STT 工作池；等待结果和后续处理交给指令线程，
+        #    监听线程立即返回继续录音，重叠的语音不会排在上一句的识别后面
+        service = stt_service.get_stt_service()
+        futures = [service.submit(preprocessing.preprocess_samples(chunk)) for chunk in speech_chunks]
+        audio_s = sum(chunk.size for chunk in speech_chunks) / config.STT_SAMPLE_RATE
+        if core:
+            on_decoded = (lambda: _record_decode_cpu(futures, audio_s)) if wake_gate else None
+            core.submit(core.handle_speech(futures, speech_end, on_decoded))
+        else:
+            _turn_executor.submit(_finish_transcription, futures, audio_s, speech_end)
+
+    except sr.WaitTimeoutError:
+        log("录音超时，未检测到有效语音。", title="INFO", style="yellow")
+    except Exception as e:
+        log(f"处理回调时发生错误: {e}", title="ERROR", style="bold red")
+        log(traceback.format_exc(), title="TRACEBACK", style="dim white")
+
+def _record_decode_cpu(futures: list[Future], audio_s: float):
+    """把各语音段在 STT worker 中测得的解码 CPU 时间交给唤醒词门控 (不含排队等待和其他线程的耗时)"""
+    wake_gate.record_full_decode(sum(getattr(future, "decode_cpu_s", 0.0) for future in futures), audio_s)
+
+def _finish_transcription(futures: list[Future], audio_s: float, speech_end: float):
+    """等待各语音段的识别结果，拼接后处理指令"""
+    texts = []
+    for future in futures:
+        try:
+            texts.append(future.result())
+        except Exception as e:
+            log(f"语音识别失败: {e}", title="ERROR", style="bold red")
+    if wake_gate:
+        _record_decode_cpu(futures, audio_s)
+    prompt_text = "".join(texts).strip()
+    if prompt_text: # STT 失败或为空时跳过
+        process_transcript(prompt_text, started_at=speech_end)
+
+def _passes_wake_gate(raw_samples) -> bool:
+    """运行唤醒词门控，并定期输出统计信息"""
+    hit = wake_gate.check(raw_samples)
+    if wake_gate.stats()["total"] % config.WAKE_GATE_STATS_INTERVAL == 0:
+        wake_gate.log_stats()
+    return hit
+
+def process_transcript(prompt_text: str, pending: tuple[str, Future] | None = None, started_at: float | None = None):
+    """
+    处理一条完整的识别文本: 提取指令、调用 LLM 并播报
+    (pending 为流式识别提前启动的 (指令, (决策, 回答) 的 Future)；started_at 为用户说完话的时间，用于统计首音延迟)
+    """
+    try:
+        # 6. 提取指令
         clean_prompt = extract_prompt(prompt_text, config.WAKE_WORD)
         if not clean_prompt: # 未提取到有效指令
             return
@@ -76,7 +130,7 @@ def callback(recognizer, audio):
         log(f'用户: {clean_prompt}', title="USER_INPUT", style="bold green")
         response = "" # 初始化响应
 
-        # 5. 处理特殊指令 (非 LLM)
+        # 7. 处理特殊指令 (非 LLM)
         if clean_prompt.lower().startswith("记住 "):
             info_to_remember = clean_prompt[len("记住 "):].strip()
             if info_to_remember:
@@ -85,7 +139,7 @@ def callback(recognizer, audio):
             else:
                 response = "请告诉我需要记住什么。" if config.ACTIVE_LLM == 'deepseek' else "Please tell me what to remember."
         elif clean_prompt.lower() in ["忘记所有", "清除记忆", "忘记刚才说的"]:
-            response = conversation_context.forget() # forget 方法返回确认信息
+            response = conversation_context.forget(all_memories=clean_prompt.lower() == "忘记所有") # forget 方法返回确认信息
         elif clean_prompt.lower().startswith("搜索 "):
             search_query = clean_prompt[len("搜索 "):].strip()
             if search_query:
@@ -97,36 +151,47 @@ def callback(recognizer, audio):
                 else:
                     llm_input_prompt = f"请根据以下搜索结果回答用户关于 '{search_query}' 的问题:\n\n{processed_results}"
                 # 调用 LLM 处理搜索结果
+                if config.LLM_STREAMING:
+                    _stream_response(llm_input_prompt, None, started_at)
+                    return
                 response = llm_prompt(conversation_context, llm_input_prompt)
             else:
                 response = "请告诉我需要搜索什么内容。" if config.ACTIVE_LLM == 'deepseek' else "Please tell me what you want to search for."
 
-        # 6. 常规处理流程 (调用 LLM)
+        # 8. 常规处理流程 (调用 LLM)
         else:
-            # a. 判断是否需要功能调用
-            call = function_call(clean_prompt)
-            img_base64 = None
+            # a. 流式识别已提前对相同指令做了功能调用决策 (无需功能调用时还生成了回答)
+            decided_call = None
+            if pending and pending[0] == clean_prompt:
+                decided_call, speculative_response = pending[1].result()
+                if speculative_response:
+                    log("使用流式识别期间提前生成的回答。", title="SPECULATION", style="green")
+                    conversation_context.add_exchange(clean_prompt, speculative_response)
+                    _speak_response(speculative_response, started_at)
+                    return
+
+            # b. 判断是否需要功能调用 (已提前决策时直接复用；本地路由器没有把握时，LLM 决策与不带附件的主回答并行推测执行)
+            if decided_call:
+                plan = speculation.FunctionCallPlan(decided_call)
+            else:
+                plan = speculation.plan_turn(conversation_context, clean_prompt)
+            call = plan.call
+            image = None
             clipboard_context = None
 
-            # b. 执行功能调用 (如果需要)
+            # c. 执行功能调用 (如果需要)
             if 'take screenshot' in call:
-                photo_path = take_screenshot()
-                if photo_path:
-                    img_base64 = encode_image(photo_path)
-                    photo_path_to_delete = photo_path # 记录待删除路径
-                else:
+                image = take_screenshot()
+                if not image:
                     error_msg = "(系统提示: 截图操作失败)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Screenshot failed)"
                     clean_prompt += error_msg
             elif 'capture webcam' in call:
-                photo_path = web_cam_capture()
-                if photo_path:
-                    img_base64 = encode_image(photo_path)
-                    photo_path_to_delete = photo_path
-                else:
+                image = web_cam_capture()
+                if not image:
                     error_msg = "(系统提示: 摄像头捕捉失败)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Webcam capture failed)"
                     clean_prompt += error_msg
             elif 'extract clipboard' in call:
-                paste = get_clipboard_text()
+                paste = plan.get_clipboard_text()
                 if paste:
                     if config.ACTIVE_LLM == 'gemini':
                          clipboard_context = f'\n\nCurrent clipboard content:\n"""\n{paste}\n"""'
@@ -135,48 +200,135 @@ def callback(recognizer, audio):
                 else:
                     clipboard_context = "\n\n(系统提示: 剪贴板为空或无法访问)" if config.ACTIVE_LLM == 'deepseek' else "\n\n(System note: Clipboard is empty or inaccessible)"
 
-            # c. 构造最终 Prompt
+            # d. 构造最终 Prompt
             final_prompt = clean_prompt
             if clipboard_context:
                 final_prompt += clipboard_context
 
-            # d. 调用 LLM 获取响应
-            response = llm_prompt(conversation_context, final_prompt, img_base64=img_base64)
+            # e. 调用 LLM 获取响应 (流式模式下边生成边播报；推测命中时直接使用已在生成的回答)
+            if config.LLM_STREAMING:
+                response = _stream_response(final_prompt, image, started_at, chunks=plan.answer)
+                if response:
+                    conversation_context.add_exchange(clean_prompt, response)
+                return
+            if plan.answer:
+                response = "".join(plan.answer)
+            else:
+                response = llm_prompt(conversation_context, final_prompt, image=image)
 
-            # e. 添加本次交互到上下文 (在获取响应之后)
+            # f. 添加本次交互到上下文 (在获取响应之后)
             # 使用原始的 clean_prompt 和最终的 response
             if response: # 只有在成功获取响应后才添加
                  conversation_context.add_exchange(clean_prompt, response)
 
 
-        # 7. 记录并读出响应
-        if response: # 确保有响应内容
-            log(f'助手 ({config.ACTIVE_LLM.upper()}): {response}', title="ASSISTANT_RESPONSE", style="bold magenta")
-            tts.speak(response)
-        else:
-            log("未能从 LLM 获取有效响应。", title="WARNING", style="yellow")
-            # 可以选择播放一个默认的错误提示音
-            # tts.speak("抱歉，处理时遇到问题。")
+        # 9. 记录并读出响应
+        _speak_response(response, started_at)
 
-    except sr.WaitTimeoutError:
-        log("录音超时，未检测到有效语音。", title="INFO", style="yellow")
     except Exception as e:
-        log(f"处理回调时发生错误: {e}", title="ERROR", style="bold red")
+        log(f"处理指令时发生错误: {e}", title="ERROR", style="bold red")
         log(traceback.format_exc(), title="TRACEBACK", style="dim white")
-    finally:
-        # 8. 清理临时文件
-        if prompt_audio_path and prompt_audio_path.exists():
-            try: os.remove(prompt_audio_path)
-            except Exception as e_del: log(f"删除文件 {prompt_audio_path.name} 失败: {e_del}", title="WARNING", style="yellow")
-        if processed_audio_path and processed_audio_path.exists() and processed_audio_path != prompt_audio_path:
-             try: os.remove(processed_audio_path)
-             except Exception as e_del: log(f"删除文件 {processed_audio_path.name} 失败: {e_del}", title="WARNING", style="yellow")
-        if photo_path_to_delete and photo_path_to_delete.exists():
-             try: os.remove(photo_path_to_delete)
-             except Exception as e_del: log(f"删除文件 {photo_path_to_delete.name} 失败: {e_del}", title="WARNING", style="yellow")
+
+
+def _speak_response(response: str, started_at: float | None = None):
+    """记录并读出助手响应"""
+    if response: # 确保有响应内容
+        log(f'助手 ({config.ACTIVE_LLM.upper()}): {response}', title="ASSISTANT_RESPONSE", style="bold magenta")
+        tts.speak(response, started_at)
+    else:
+        log("未能从 LLM 获取有效响应。", title="WARNING", style="yellow")
+        # 可以选择播放一个默认的错误提示音
+        # tts.speak("抱歉，处理时遇到问题。")
+
+
+def _stream_response(prompt: str, image: bytes | None, started_at: float | None, chunks: Iterable[str] | None = None) -> str:
+    """流式获取 LLM 回答并逐句播报 (chunks 为已在生成的回答流)，返回完整回答"""
+    if chunks is None:
+        chunks = llm_prompt_stream(conversation_context, prompt, image=image)
+    response = tts.speak_stream(chunks, started_at)
+    if response:
+        log(f'助手 ({config.ACTIVE_LLM.upper()}): {response}', title="ASSISTANT_RESPONSE", style="bold magenta")
+    else:
+        log("未能从 LLM 获取有效响应。", title="WARNING", style="yellow")
+    return response
+
+
+# --- 流式识别 ---
+# 推测执行使用单独的线程，不与指令线程排队
+_speculation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculation")
+_speculation = {"partial": None, "prompt": None, "future": None}
+
+def _speculative_answer(prompt: str) -> tuple[str, str | None]:
+    """
+    在语句结束前提前做功能调用决策并生成回答，返回 (决策, 回答)；
+    需要截图/剪贴板等功能调用时不生成回答 (None)，决策由指令线程复用，不再重复判断
+    """
+    call = function_call(prompt)
+    if call != "none":
+        return call, None
+    return call, llm_prompt(conversation_context, prompt)
+
+def _on_partial_transcript(event: StreamEvent):
+    """部分识别结果回调: 唤醒词后的指令连续两次保持不变时，提前启动 LLM 调用"""
+    if core:
+        core.submit(core.handle_partial(event.text))
+        return
+    prompt = match_prompt(event.text, config.WAKE_WORD)
+    if not prompt or is_special_command(prompt):
+        _speculation["partial"] = None
+        return
+    if prompt == _speculation["partial"] and prompt != _speculation["prompt"]:
+        log(f"检测到唤醒词，提前处理指令: '{prompt}'", title="SPECULATION", style="cyan")
+        _speculation["prompt"] = prompt
+        _speculation["future"] = _speculation_executor.submit(_speculative_answer, prompt)
+    _speculation["partial"] = prompt
+
+def _on_final_transcript(event: StreamEvent):
+    """最终识别结果回调: 交给助手核心或指令线程处理，并附带可能已完成的推测结果"""
+    if core:
+        core.submit(core.handle_transcript(event.text, time.perf_counter()))
+        return
+    pending = (_speculation["prompt"], _speculation["future"]) if _speculation["future"] else None
+    _speculation.update(partial=None, prompt=None, future=None)
+    _turn_executor.submit(process_transcript, event.text, pending, time.perf_counter())
+
+def _start_streaming(energy_threshold: float):
+    """启动流式监听线程，返回与 listen_in_background 相同签名的停止函数"""
+    # 解码在 BackgroundTranscriber 的线程中进行，采集线程只读取麦克风，解码再慢也不会丢帧
+    decoder = BackgroundTranscriber(StreamingTranscriber(on_partial=_on_partial_transcript, on_final=_on_final_transcript,
+                                                         energy_threshold=energy_threshold))
+    stop_event = threading.Event()
+
+    def worker():
+        try:
+            with sr.Microphone(sample_rate=config.STT_SAMPLE_RATE) as source:
+                while not stop_event.is_set():
+                    decoder.put(source.stream.read(source.CHUNK))
+        except Exception as e:
+            log(f"流式监听出错: {e}", title="ERROR", style="bold red")
+            log(traceback.format_exc(), title="TRACEBACK", style="dim white")
+        finally:
+            decoder.close(wait=False)
+
+    thread = threading.Thread(target=worker, name="streaming-stt", daemon=True)
+    thread.start()
+
+    def stopper(wait_for_stop=True):
+        stop_event.set()
+        if wait_for_stop:
+            thread.join()
+            decoder.close()
+    return stopper
 
 
 # --- 启动监听 ---
+def _warmup():
+    """预热: 加载 Whisper 并跑一次推理，再加载其余惰性组件"""
+    stt.warmup()
+    startup.warmup()
+    if config.TTS_CACHE_PREWARM:
+        tts.prewarm_cache()
+
 def start_listening():
     """启动背景监听"""
     # 检查麦克风
@@ -208,6 +360,12 @@ def start_listening():
 
     # 启动后台监听
     try:
+        if core:
+            core.start()
+        if config.STT_STREAMING:
+            stop_listening = _start_streaming(r.energy_threshold)
+            log("已开始流式监听...", title="ACTION", style="bold blue")
+            return stop_listening
         # phrase_time_limit: 录制音频片段的最长时间（秒）
         stop_listening = r.listen_in_background(sr.Microphone(), callback, phrase_time_limit=20)
         log("已开始在后台监听...", title="ACTION", style="bold blue")
@@ -233,6 +391,11 @@ if __name__ == "__main__":
     if is_key_missing:
          log(f"错误: 请在 config.py 中为 {config.ACTIVE_LLM.upper()} 设置有效的 API 密钥。", title="CONFIG_ERROR", style="bold red")
     else:
+        log(f"模块导入耗时 {time.perf_counter() - _import_start:.2f}s (详细报告: python startup.py main)", title="STARTUP", style="dim")
+        # 后台预热模型，调整麦克风的同时完成加载
+        if config.WARMUP_ON_START:
+            threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+
         # 启动监听
         stop_listening_func = start_listening()
 
@@ -251,10 +414,22 @@ if __name__ == "__main__":
                 if stop_listening_func:
                     stop_listening_func(wait_for_stop=False)
                 log("监听已停止。", title="ACTION", style="bold blue")
+                if core:
+                    log(f"助手核心: {core.stats()}", title="CORE_STATS", style="cyan")
+                    core.stop()
+                if wake_gate:
+                    wake_gate.log_stats()
+                if stt._stt_cache.loaded:
+                    stt.get_stt_cache().log_stats()
+                tts.log_stats()
+                if stt_service._service.loaded:
+                    log(f"STT 工作池: {stt_service.get_stt_service().stats()}", title="STT_SERVICE_STATS", style="cyan")
+                if intent_router._router.loaded:
+                    intent_router.get_router().log_stats()
+                speculation.log_stats()
+                # 记录播放统计并确保 Pygame 资源被释放 (仅在已加载时)
+                playback.shutdown()
                 save_log()
-                # 确保 Pygame 资源被释放
-                pygame.quit()
-                log("Pygame 已退出。", title="INFO", style="dim")
         else:
              log("程序未能成功启动监听。", title="ERROR", style="bold red")
              save_log() # 即使启动失败也保存日志
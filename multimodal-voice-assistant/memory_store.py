@@ -0,0 +1,120 @@
+"""
+持久化的 "记住" 信息存储: 事实保存在 SQLite 中 (跨会话、跨重启保留)，检索使用内存中的倒排索引。
+每条事实的向量与话题检测相同 (字符 bigram + 英文单词，L2 归一化)，相关度为精确的余弦相似度，
+但只对与查询有共同特征的事实累加得分 (NumPy bincount)，不需要遍历全部向量，数万条事实时检索仍在 1ms 以内。
+"""
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from logger import log
+import config
+from text_similarity import text_vector
+from startup import LazySingleton
+
+class _ScopeIndex:
+    """一个作用域 (如一个 Web 会话) 内事实的倒排索引: 特征 -> (行号数组, 权重数组)"""
+    def __init__(self):
+        self.ids: list[int] = [] # 行号 -> 数据库 id
+        self.texts: list[str] = []
+        self.postings: dict[str, tuple[array, array]] = {}
+
+    def add(self, fact_id: int, text: str):
+        row = len(self.ids)
+        self.ids.append(fact_id)
+        self.texts.append(text)
+        for feature, weight in text_vector(text).items():
+            rows, weights = self.postings.setdefault(feature, (array("i"), array("f")))
+            rows.append(row)
+            weights.append(weight)
+
+    def search(self, query_vector: dict[str, float], k: int) -> list[tuple[int, float]]:
+        """返回得分最高的 k 个 (行号, 余弦相似度)"""
+        matched = [(self.postings[f], w) for f, w in query_vector.items() if f in self.postings]
+        if not matched:
+            return []
+        rows = np.concatenate([np.frombuffer(rows, dtype=np.int32) for (rows, _), _ in matched])
+        weights = np.concatenate([np.frombuffer(weights, dtype=np.float32) * w for (_, weights), w in matched])
+        scores = np.bincount(rows, weights=weights, minlength=len(self.ids))
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if scores[row] > 0]
+
+
+class MemoryStore:
+    """事实存储 (线程安全): SQLite 持久化 + 按作用域的内存倒排索引 (首次访问该作用域时从数据库加载)"""
+    def __init__(self, path: Path = config.MEMORY_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS facts ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_facts_scope ON facts(scope)")
+        self._indexes: OrderedDict[str, _ScopeIndex] = OrderedDict() # 最多缓存 MEMORY_INDEX_SCOPES 个作用域的索引
+        with self._lock:
+            count = len(self._index("default").ids) # 预先加载语音助手使用的默认作用域
+        log(f"记忆库已打开 (默认作用域 {count} 条)", title="INIT", style="green")
+
+    def _index(self, scope: str) -> _ScopeIndex:
+        """返回作用域的索引，必要时从数据库加载 (调用方需持有锁)"""
+        index = self._indexes.get(scope)
+        if index is not None:
+            self._indexes.move_to_end(scope)
+            return index
+        index = self._indexes[scope] = _ScopeIndex()
+        for fact_id, text in self._conn.execute("SELECT id, text FROM facts WHERE scope = ? ORDER BY id", (scope,)):
+            index.add(fact_id, text)
+        while len(self._indexes) > config.MEMORY_INDEX_SCOPES:
+            self._indexes.popitem(last=False)
+        return index
+
+    def add(self, text: str, scope: str = "default") -> bool:
+        """保存一条事实；与已有事实几乎相同 (相似度 >= MEMORY_DUPLICATE_SCORE) 时跳过，返回是否新增"""
+        text = text.strip()
+        if not text:
+            return False
+        with self._lock:
+            index = self._index(scope)
+            best = index.search(text_vector(text), 1)
+            if best and best[0][1] >= config.MEMORY_DUPLICATE_SCORE:
+                return False
+            cursor = self._conn.execute("INSERT INTO facts (scope, text, created) VALUES (?, ?, ?)", (scope, text, time.time()))
+            index.add(cursor.lastrowid, text)
+        return True
+
+    def search(self, query: str, k: int = config.MEMORY_TOP_K, scope: str = "default",
+               min_score: float = config.MEMORY_MIN_SCORE) -> list[tuple[str, float]]:
+        """返回与 query 最相关的至多 k 条事实 [(文本, 相似度), ...]"""
+        vector = text_vector(query)
+        with self._lock:
+            index = self._index(scope)
+            return [(index.texts[row], score) for row, score in index.search(vector, k) if score >= min_score]
+
+    def count(self, scope: str = "default") -> int:
+        with self._lock:
+            return len(self._index(scope).ids)
+
+    def clear(self, scope: str = "default"):
+        """删除作用域内的所有事实"""
+        with self._lock:
+            self._conn.execute("DELETE FROM facts WHERE scope = ?", (scope,))
+            self._indexes.pop(scope, None)
+        log(f"已清除记忆库 ({scope})", title="MEMORY", style="yellow")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 全局记忆库在首次记住/检索时打开
+_store = LazySingleton("memory_store", MemoryStore)
+get_store = _store.get
@@ -0,0 +1,115 @@
+"""
+Web 后端的会话管理: 每个会话 (由 session id 标识) 拥有独立的对话上下文，
+同一会话内的回合串行执行 (避免并发请求交错写入同一份历史)，不同会话之间互不影响。
+session id 由服务端签发 (随机令牌 + HMAC 签名)，客户端不能自选或伪造 session id。
+会话按最近访问排序 (LRU)，超过数量上限或空闲超时的会话被淘汰，内存占用有上限。
+每个会话在记忆库中使用带 "web:" 前缀的作用域，与语音助手的 default 作用域隔离；
+被淘汰会话的作用域随之删除，记忆库不会随会话数无限增长。
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+import config
+import memory_store
+from conversation import EnhancedConversationContext
+
+SESSION_ID_MAX_LEN = 64
+SIGNATURE_BYTES = 12
+RESERVED_IDS = frozenset({"default"}) # 记忆库中语音助手使用的作用域名，不能作为 session id
+WEB_SCOPE_PREFIX = "web:"
+
+def memory_scope(session_id: str) -> str:
+    """会话在记忆库中的作用域 (带前缀，客户端无法借 session id 访问其他作用域)"""
+    return WEB_SCOPE_PREFIX + session_id
+
+@dataclass
+class Session:
+    """一个会话的状态"""
+    session_id: str
+    context: EnhancedConversationContext = field(default_factory=EnhancedConversationContext)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock) # 同一会话的回合串行执行
+    last_active: float = field(default_factory=time.monotonic)
+
+
+def _delete_memory_scope(session: Session):
+    """删除被淘汰会话在记忆库中的作用域 (SQLite 操作在线程池中执行，不阻塞事件循环)；只删除会话管理创建的 web 作用域"""
+    scope = session.context.memory_scope
+    if not config.MEMORY_ENABLED or scope != memory_scope(session.session_id):
+        return
+    asyncio.get_running_loop().run_in_executor(None, lambda: memory_store.get_store().clear(scope))
+
+
+class SessionStore:
+    """按 session id 保存会话的 LRU (仅在事件循环线程中访问，无需加锁)"""
+    def __init__(self, max_sessions: int = config.SESSION_MAX_COUNT, idle_timeout_s: float = config.SESSION_IDLE_TIMEOUT_S,
+                 on_evict: Callable[[Session], None] | None = _delete_memory_scope, secret: bytes | None = None):
+        self.max_sessions = max_sessions
+        self.idle_timeout_s = idle_timeout_s
+        self.on_evict = on_evict # 会话被淘汰后调用 (默认删除其记忆库作用域)
+        # session id 的签名密钥；未配置时每次启动随机生成 (重启后之前签发的 session id 失效)
+        self._secret = secret or (config.SESSION_SECRET.encode() if config.SESSION_SECRET else secrets.token_bytes(32))
+        self._sessions: OrderedDict[str, Session] = OrderedDict() # 最久未访问的在前
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def _sign(self, token: str) -> str:
+        digest = hmac.new(self._secret, token.encode("ascii"), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).decode("ascii")
+
+    def new_id(self) -> str:
+        """签发新的 session id: "随机令牌.签名" """
+        token = secrets.token_urlsafe(16)
+        return f"{token}.{self._sign(token)}"
+
+    def is_valid_id(self, session_id: str | None) -> bool:
+        """只接受本服务签发的 session id (长度有限的可打印 ASCII，签名正确)；保留的名称 (如 default) 无效"""
+        if not (isinstance(session_id, str) and session_id and len(session_id) <= SESSION_ID_MAX_LEN
+                and session_id.isascii() and session_id.isprintable()) or session_id in RESERVED_IDS:
+            return False
+        token, _, signature = session_id.rpartition(".")
+        return bool(token) and hmac.compare_digest(signature, self._sign(token))
+
+    def get(self, session_id: str) -> Session:
+        """返回会话 (不存在时创建)，并淘汰空闲超时或超出上限的会话"""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = Session(session_id, EnhancedConversationContext(memory_scope=memory_scope(session_id)))
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_active = now
+        self._evict(now, keep=session_id)
+        return session
+
+    def _evict(self, now: float, keep: str):
+        """从最久未访问的一端淘汰；正在处理回合的会话 (锁被占用) 和 keep 不淘汰。均摊 O(1)"""
+        for _ in range(len(self._sessions)):
+            session_id, session = next(iter(self._sessions.items()))
+            if session_id == keep:
+                break
+            idle = now - session.last_active > self.idle_timeout_s
+            over_capacity = len(self._sessions) > self.max_sessions
+            if not (idle or over_capacity):
+                break
+            if session.lock.locked():
+                self._sessions.move_to_end(session_id)
+                continue
+            del self._sessions[session_id]
+            if self.on_evict:
+                self.on_evict(session)
+            if idle:
+                self.evicted_idle += 1
+            else:
+                self.evicted_capacity += 1
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "evicted_idle": self.evicted_idle, "evicted_capacity": self.evicted_capacity}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
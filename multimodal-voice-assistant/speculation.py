@@ -0,0 +1,235 @@
+"""
+功能调用决策与主回答的推测并行执行。
+本地路由器没有把握时，同时启动: LLM 功能调用决策、不带附件的流式主回答，
+以及剪贴板预取 (只在路由器认为最可能是 "extract clipboard" 时，避免无关的回合读取剪贴板中可能敏感的内容)。
+决策为 "none" 时直接使用已在生成的主回答 (推测命中)；否则取消主回答，由调用方附上截图/剪贴板重新请求。
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterator
+from logger import log
+import config
+import intent_router
+from conversation import EnhancedConversationContext # 需要类型提示
+from input_handler import get_clipboard_text
+from llm_interface import llm_function_call, llm_function_call_async, llm_prompt_astream, llm_prompt_stream
+
+_executor = ThreadPoolExecutor(max_workers=config.SPECULATION_POOL_SIZE, thread_name_prefix="speculation")
+_DONE = object()
+
+class SpeculativeAnswer:
+    """
+    在后台线程中消费回答流并缓冲；命中时按原顺序产出，未命中时取消 (关闭流会中断 HTTP 响应)。
+    打开或读取回答流出错时，消费方在已产出的片段之后收到该异常 (而不是一直等待)
+    """
+    def __init__(self, open_stream: Callable[[], Iterator[str]]):
+        self.started = time.perf_counter()
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        _executor.submit(self._run, open_stream)
+
+    def _run(self, open_stream: Callable[[], Iterator[str]]):
+        chunks, end = None, _DONE
+        try:
+            chunks = open_stream()
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    break
+                self._queue.put(chunk)
+        except Exception as e:
+            log(f"推测回答出错: {e}", title="SPECULATION", style="yellow")
+            end = e
+        finally:
+            try:
+                if chunks is not None:
+                    chunks.close() # 关闭生成器，释放底层连接
+            finally:
+                self._queue.put(end)
+
+    def __iter__(self) -> Iterator[str]:
+        while (chunk := self._queue.get()) is not _DONE:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def cancel(self):
+        """放弃该回答 (在下一个片段到达时停止)"""
+        self._cancelled.set()
+
+
+@dataclass
+class FunctionCallPlan:
+    """功能调用决策结果"""
+    call: str # "extract clipboard" / "take screenshot" / "capture webcam" / "none"
+    answer: SpeculativeAnswer | None = None # 推测命中时的主回答流
+    clipboard: Future | None = None # 预取的剪贴板文本
+
+    def get_clipboard_text(self) -> str | None:
+        """返回剪贴板文本，已预取时直接使用预取结果"""
+        if self.clipboard is not None:
+            return self.clipboard.result()
+        return get_clipboard_text()
+
+
+class SpeculationStats:
+    """推测执行统计 (线程安全)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0 # 本地路由器直接决定，无需推测
+        self.wins = 0
+        self.losses = 0
+        self.saved_s = 0.0 # 命中时主回答相对串行执行提前开始的时间
+
+    def record(self, won: bool, saved_s: float = 0.0):
+        with self._lock:
+            if won:
+                self.wins += 1
+                self.saved_s += saved_s
+            else:
+                self.losses += 1
+
+    def record_local(self):
+        with self._lock:
+            self.local += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            speculated = self.wins + self.losses
+            return {
+                "local": self.local,
+                "wins": self.wins,
+                "losses": self.losses,
+                "win_rate": self.wins / speculated if speculated else 0.0,
+                "avg_saved_s": self.saved_s / self.wins if self.wins else 0.0,
+                "total_saved_s": self.saved_s,
+            }
+
+stats = SpeculationStats()
+
+def _likely_clipboard(prompt: str) -> bool:
+    """路由器认为最可能是 "extract clipboard" 时才预取剪贴板"""
+    return config.INTENT_ROUTER_ENABLED and intent_router.get_router().candidate(prompt) == "extract clipboard"
+
+def plan_turn(conversation_context: EnhancedConversationContext, prompt: str) -> FunctionCallPlan:
+    """决定功能调用；需要调用 LLM 决策时并行推测主回答 (可能是剪贴板指令时同时预取剪贴板)"""
+    if config.INTENT_ROUTER_ENABLED:
+        label = intent_router.get_router().route(prompt)
+        if label:
+            stats.record_local()
+            return FunctionCallPlan(label)
+    if not config.SPECULATIVE_ANSWER:
+        return FunctionCallPlan(llm_function_call(prompt))
+
+    decision_start = time.perf_counter()
+    decision = _executor.submit(llm_function_call, prompt)
+    answer = SpeculativeAnswer(lambda: llm_prompt_stream(conversation_context, prompt))
+    clipboard = _executor.submit(get_clipboard_text, True) if _likely_clipboard(prompt) else None
+    try:
+        call = decision.result()
+    except BaseException:
+        answer.cancel()
+        if clipboard is not None:
+            clipboard.cancel()
+        raise
+    decision_s = time.perf_counter() - decision_start
+    if clipboard is not None and call != "extract clipboard":
+        clipboard.cancel() # 预取的剪贴板不会被使用
+
+    if call == "none":
+        # 串行执行时主回答要等决策返回后才开始，命中即节省了决策耗时
+        stats.record(True, decision_s)
+        log(f"推测命中: 主回答已提前 {decision_s:.2f}s 开始生成", title="SPECULATION", style="green")
+        return FunctionCallPlan(call, answer=answer)
+
+    answer.cancel()
+    stats.record(False)
+    log(f"推测未命中 ({call})，已取消不带附件的回答", title="SPECULATION", style="yellow")
+    return FunctionCallPlan(call, clipboard=clipboard if call == "extract clipboard" else None)
+
+
+# --- asyncio 版本 (供 assistant_core 使用) ---
+class AsyncSpeculativeAnswer:
+    """SpeculativeAnswer 的异步版本: 后台任务消费回答流并缓冲，取消任务会关闭 HTTP 流"""
+    def __init__(self, chunks: AsyncIterator[str]):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(chunks))
+
+    async def _run(self, chunks: AsyncIterator[str]):
+        try:
+            async for chunk in chunks:
+                self._queue.put_nowait(chunk)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log(f"推测回答出错: {e}", title="SPECULATION", style="yellow")
+        finally:
+            await chunks.aclose()
+            self._queue.put_nowait(_DONE)
+
+    async def _iterate(self) -> AsyncIterator[str]:
+        while (chunk := await self._queue.get()) is not _DONE:
+            yield chunk
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._iterate()
+
+    def cancel(self):
+        self._task.cancel()
+
+    async def aclose(self):
+        self.cancel()
+
+
+@dataclass
+class AsyncFunctionCallPlan:
+    """plan_turn_async 的结果"""
+    call: str
+    answer: AsyncSpeculativeAnswer | None = None
+    clipboard: asyncio.Task | None = None
+
+    async def get_clipboard_text(self) -> str | None:
+        if self.clipboard is not None:
+            return await self.clipboard
+        return await asyncio.to_thread(get_clipboard_text)
+
+async def plan_turn_async(conversation_context: EnhancedConversationContext, prompt: str) -> AsyncFunctionCallPlan:
+    """plan_turn 的异步版本: 决策、主回答 (和剪贴板预取) 以任务而非线程并行"""
+    if config.INTENT_ROUTER_ENABLED:
+        label = intent_router.get_router().route(prompt)
+        if label:
+            stats.record_local()
+            return AsyncFunctionCallPlan(label)
+    if not config.SPECULATIVE_ANSWER:
+        return AsyncFunctionCallPlan(await llm_function_call_async(prompt))
+
+    decision_start = time.perf_counter()
+    answer = AsyncSpeculativeAnswer(llm_prompt_astream(conversation_context, prompt))
+    clipboard = asyncio.create_task(asyncio.to_thread(get_clipboard_text, True)) if _likely_clipboard(prompt) else None
+    try:
+        call = await llm_function_call_async(prompt)
+    except BaseException:
+        answer.cancel()
+        if clipboard is not None:
+            clipboard.cancel()
+        raise
+    decision_s = time.perf_counter() - decision_start
+    if clipboard is not None and call != "extract clipboard":
+        clipboard.cancel() # 预取的剪贴板不会被使用
+
+    if call == "none":
+        stats.record(True, decision_s)
+        log(f"推测命中: 主回答已提前 {decision_s:.2f}s 开始生成", title="SPECULATION", style="green")
+        return AsyncFunctionCallPlan(call, answer=answer)
+
+    answer.cancel()
+    stats.record(False)
+    log(f"推测未命中 ({call})，已取消不带附件的回答", title="SPECULATION", style="yellow")
+    return AsyncFunctionCallPlan(call, clipboard=clipboard if call == "extract clipboard" else None)
+
+def log_stats():
+    """输出推测执行统计"""
+    log(f"推测执行统计: {stats.as_dict()}", title="SPECULATION", style="dim")
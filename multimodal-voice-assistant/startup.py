@@ -0,0 +1,118 @@
+"""
+启动性能工具: 线程安全的惰性单例、可选的预热钩子，以及按模块划分的启动耗时报告。
+
+查看某个入口的导入耗时 (在 multimodal-voice-assistant 目录下):
+    python startup.py backend_app
+    python startup.py main --top 30
+"""
+import argparse
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable
+from logger import log
+
+class LazySingleton:
+    """线程安全的惰性单例: 首次调用 get() 时才执行工厂函数，并记录加载耗时"""
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self._factory = factory
+        self._instance = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.load_time_s = None
+        _registry[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        """是否已加载"""
+        return self._loaded
+
+    def get(self):
+        """返回实例，必要时加载 (加载失败时抛出异常，下次调用会重试)"""
+        if self._loaded: # 快速路径，无需加锁
+            return self._instance
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._instance = self._factory()
+                self.load_time_s = time.perf_counter() - start
+                self._loaded = True
+                log(f"{self.name} 已加载，耗时 {self.load_time_s:.2f}s", title="LAZY_INIT", style="dim")
+        return self._instance
+
+_registry: dict[str, LazySingleton] = {}
+
+def warmup(names: list[str] | None = None, background: bool = False) -> threading.Thread | None:
+    """预先加载指定的惰性组件 (默认全部已注册组件)；background=True 时在后台线程中执行"""
+    def run():
+        for name in names or list(_registry):
+            singleton = _registry.get(name)
+            if singleton is None:
+                log(f"预热: 未知组件 {name}", title="WARNING", style="yellow")
+                continue
+            try:
+                singleton.get()
+            except Exception as e:
+                log(f"预热 {name} 失败: {e}", title="WARNING", style="yellow")
+        log(f"预热完成: {load_times()}", title="WARMUP", style="green")
+
+    if background:
+        thread = threading.Thread(target=run, name="warmup", daemon=True)
+        thread.start()
+        return thread
+    run()
+    return None
+
+def load_times() -> dict[str, float | None]:
+    """各惰性组件的加载耗时 (秒)，未加载为 None"""
+    return {name: (round(s.load_time_s, 3) if s.load_time_s is not None else None) for name, s in _registry.items()}
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def import_time_report(module: str) -> list[tuple[str, int, int]]:
+    """在子进程中用 -X importtime 导入模块，返回 [(模块名, 自身耗时 us, 累计耗时 us), ...]"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+def summarize_by_package(rows: list[tuple[str, int, int]]) -> dict[str, int]:
+    """按顶层包汇总自身耗时 (us)"""
+    totals = {}
+    for name, self_us, _ in rows:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+def main():
+    parser = argparse.ArgumentParser(description="按模块报告启动 (导入) 耗时")
+    parser.add_argument("module", nargs="?", default="backend_app", help="要导入的入口模块")
+    parser.add_argument("--top", type=int, default=20, help="显示耗时最多的前 N 项")
+    args = parser.parse_args()
+
+    wall_start = time.perf_counter()
+    rows = import_time_report(args.module)
+    wall = time.perf_counter() - wall_start
+    if not rows:
+        print(f"无法获取 {args.module} 的导入耗时 (导入失败?)")
+        return
+    total_us = sum(self_us for _, self_us, _ in rows)
+    print(f"导入 {args.module}: 子进程总耗时 {wall:.2f}s，模块导入合计 {total_us / 1e6:.2f}s ({len(rows)} 个模块)\n")
+    print(f"{'顶层包':<32} {'自身耗时(ms)':>12}")
+    for package, self_us in list(summarize_by_package(rows).items())[:args.top]:
+        print(f"{package:<32} {self_us / 1000:>12.1f}")
+    print(f"\n{'模块':<48} {'自身(ms)':>10} {'累计(ms)':>10}")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{name:<48} {self_us / 1000:>10.1f} {cumulative_us / 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
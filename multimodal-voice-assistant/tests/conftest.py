@@ -0,0 +1,11 @@
+"""
+测试配置: 模块按扁平方式导入 (与在 multimodal-voice-assistant 目录下运行程序时相同)。
+config 在导入时会创建相对路径的 logs/ 目录，测试在临时目录中运行，不污染工作区。
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.chdir(tempfile.mkdtemp(prefix="assistant-tests-"))
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+import config
+import speculation
+from assistant_core import AssistantCore
+from conversation import EnhancedConversationContext
+
+closed = []
+
+async def _answer(slow: bool):
+    try:
+        yield "晴天，"
+        if slow:
+            await asyncio.sleep(10)
+        yield "气温二十度。"
+    finally:
+        closed.append(True)
+
+@pytest.fixture
+def plans(monkeypatch):
+    """替换 plan_turn_async，记录每次决策的指令"""
+    monkeypatch.setattr(config, "WAKE_WORD", "请")
+    monkeypatch.setattr(config, "MEMORY_ENABLED", False)
+    started = []
+    closed.clear()
+
+    async def plan_turn_async(context, prompt):
+        started.append(prompt)
+        await asyncio.sleep(0.01)
+        return speculation.AsyncFunctionCallPlan("none", answer=speculation.AsyncSpeculativeAnswer(_answer(slow="明天" in prompt)))
+
+    monkeypatch.setattr(speculation, "plan_turn_async", plan_turn_async)
+    return started
+
+@pytest.fixture
+def core():
+    return AssistantCore(EnhancedConversationContext(summarizer=lambda previous, messages: None))
+
+def test_stable_partial_starts_the_plan_early(plans, core):
+    async def scenario():
+        for partial in ("请告诉", "请告诉我天气", "请告诉我天气"):
+            await core.handle_partial(partial)
+            await asyncio.sleep(0)
+        assert plans == ["告诉我天气"] # 连续两次不变后才开始
+        await core.handle_partial("请告诉我天气") # 已经开始，不重复
+        early_plan = core._take_early_plan("告诉我天气")
+        result = await core.handle_turn("告诉我天气", speak=False, early_plan=early_plan)
+        return result
+
+    result = asyncio.run(scenario())
+    assert result.text == "晴天，气温二十度。"
+    assert plans == ["告诉我天气"] # 回合复用提前开始的决策
+    assert core.stats()["early_started"] == 1 and core.stats()["early_used"] == 1
+
+def test_changed_prompt_discards_the_early_plan(plans, core):
+    async def scenario():
+        for partial in ("请告诉我明天", "请告诉我明天"):
+            await core.handle_partial(partial)
+        task = core._early_plan[1]
+        await asyncio.sleep(0.05) # 决策已完成，主回答正在生成
+        assert task.done() and not closed
+        assert core._take_early_plan("告诉我明天的天气") is None
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert closed == [True] # 推测回答的流被关闭
+    assert core.stats()["early_used"] == 0
+
+def test_final_transcript_passes_the_matching_plan(plans, core, monkeypatch):
+    turns = []
+
+    async def handle_turn(prompt, started_at=None, speak=True, early_plan=None):
+        turns.append((prompt, early_plan))
+
+    monkeypatch.setattr(core, "handle_turn", handle_turn)
+
+    async def scenario():
+        for partial in ("请告诉我天气", "请告诉我天气"):
+            await core.handle_partial(partial)
+        await core.handle_transcript("请告诉我天气。")
+        await core._voice_turn
+        await core.handle_partial("请记住 我叫小明") # 特殊指令不提前处理
+        await core.handle_partial("请记住 我叫小明")
+        await core.handle_transcript("请记住 我叫小明")
+        await core._voice_turn
+
+    asyncio.run(scenario())
+    assert turns[0][0] == "告诉我天气" and turns[0][1] is not None
+    assert turns[1] == ("记住 我叫小明", None)
+    assert plans == ["告诉我天气"]
@@ -0,0 +1,30 @@
+import pytest
+import backend_app
+from web_stream import IMAGE_URL_PREFIX, images
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 16
+
+@pytest.fixture
+def client():
+    backend_app.app.config["TESTING"] = True
+    return backend_app.app.test_client()
+
+def test_index_and_static_files(client):
+    index = client.get("/")
+    assert index.status_code == 200 and b"<html" in index.data.lower()
+    script = client.get("/js/script.js")
+    assert script.status_code == 200 and b"/api/command" in script.data
+
+def test_serve_static_falls_back_to_index():
+    with backend_app.app.test_request_context():
+        assert backend_app.serve_static("css/style.css").status_code == 200
+        fallback = backend_app.serve_static("no/such/page")
+        fallback.direct_passthrough = False
+        assert b"<html" in fallback.get_data().lower()
+
+def test_image_route(client):
+    url = images.put(JPEG, "image/jpeg")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == JPEG and response.mimetype == "image/jpeg"
+    assert client.get(IMAGE_URL_PREFIX + "missing").status_code == 404
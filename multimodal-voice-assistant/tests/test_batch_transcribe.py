@@ -0,0 +1,67 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import pytest
+import batch_transcribe
+from audio import stt, stt_service
+from cache import TieredCache
+
+def _text(samples) -> str:
+    return f"第{int(samples[0])}个文件"
+
+def _load(path: Path, use_vad: bool):
+    """替换 load_samples: 文件名即编号，越靠前的文件加载越慢；empty 为空音频，bad 解码失败"""
+    if path.stem == "bad":
+        raise ValueError("无法解码")
+    if path.stem == "empty":
+        return np.zeros(0, dtype=np.float32), 0.5
+    index = int(path.stem)
+    time.sleep(0.02 * (4 - index))
+    return np.full(16, index, dtype=np.float32), 1.0 + index
+
+class FakeService:
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=2)
+
+    def submit(self, samples):
+        return self.pool.submit(lambda: (time.sleep(0.01), _text(samples))[1])
+
+class FakeBatchedDecoder:
+    threads = []
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+
+    def transcribe(self, samples) -> str:
+        FakeBatchedDecoder.threads.append(threading.current_thread().name)
+        time.sleep(0.01)
+        return _text(samples)
+
+@pytest.fixture
+def fakes(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch_transcribe, "load_samples", _load)
+    monkeypatch.setattr(batch_transcribe, "_BatchedDecoder", FakeBatchedDecoder)
+    monkeypatch.setattr(stt_service, "get_stt_service", FakeService)
+    cache = TieredCache("STT", tmp_path / "stt.sqlite3")
+    monkeypatch.setattr(stt, "get_stt_cache", lambda: cache)
+    FakeBatchedDecoder.threads = []
+
+@pytest.mark.parametrize("max_pending", [2, 10])
+def test_batched_and_service_paths_write_the_same_ordered_output(fakes, tmp_path, max_pending):
+    files = [Path(name) for name in ["0.wav", "1.wav", "bad.wav", "2.wav", "empty.wav", "3.wav"]]
+    outputs = {}
+    for batch_size in (1, 8):
+        output = tmp_path / f"out-{batch_size}.jsonl"
+        stats = batch_transcribe.run(files, output, batch_size=batch_size, loaders=3, max_pending=max_pending)
+        assert stats["files"] == 5 and stats["failed"] == 1
+        outputs[batch_size] = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+
+    assert outputs[1] == outputs[8]
+    assert [record["path"] for record in outputs[8]] == [str(path) for path in files]
+    assert outputs[8][0] == {"path": "0.wav", "text": "第0个文件", "duration_s": 1.0}
+    assert "error" in outputs[8][2] and outputs[8][4]["text"] == ""
+    # 批量解码在专用线程中执行，不阻塞主循环继续提交加载
+    assert FakeBatchedDecoder.threads and all(name.startswith("batched-stt") for name in FakeBatchedDecoder.threads)
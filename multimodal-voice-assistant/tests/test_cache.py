@@ -0,0 +1,107 @@
+import pytest
+import cache
+from cache import LRUCache, SQLiteCache, TieredCache
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "time", fake)
+    return fake
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_items=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1 # a 变为最近使用
+    lru.put("c", 3)
+    assert "b" not in lru
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats.as_dict()["evictions"] == 1
+
+def test_sqlite_evicts_by_access_time_down_to_90_percent(tmp_path, clock):
+    disk = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=1000)
+    for i in range(10):
+        clock.now += 1
+        disk.put(f"k{i}", b"x" * 100)
+    clock.now += 1
+    assert disk.get("k0") is not None # 最早写入但刚被访问
+    clock.now += 1
+    disk.put("new", b"y" * 100)
+    # 1100 字节超出上限，淘汰最久未访问的 k1、k2 后降到 900 字节 (上限的 90%)
+    assert disk.total_bytes == 900
+    assert "k1" not in disk and "k2" not in disk
+    assert "k0" in disk and "k3" in disk and "new" in disk
+    assert disk.stats.as_dict()["evictions"] == 2
+
+def test_sqlite_eviction_spans_batches(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, "EVICT_BATCH", 3)
+    disk = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=100)
+    for i in range(100):
+        clock.now += 1
+        disk.put(f"k{i}", b"x")
+    clock.now += 1
+    disk.put("big", b"y" * 60) # 需要淘汰 70 条，跨多个批次
+    assert disk.total_bytes == 90
+    assert len(disk) == 31
+    assert "k69" not in disk and "k70" in disk and "big" in disk
+
+def test_sqlite_skips_values_larger_than_the_limit(tmp_path):
+    disk = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=10)
+    disk.put("big", b"x" * 11)
+    assert "big" not in disk and disk.total_bytes == 0
+
+def test_sqlite_expired_entry_is_a_miss(tmp_path, clock):
+    disk = SQLiteCache(tmp_path / "cache.sqlite3", max_age_s=60)
+    disk.put("k", b"value")
+    clock.now += 30
+    assert disk.get("k") == b"value"
+    clock.now += 31 # 过期按写入时间计算，访问不会延长
+    assert disk.get("k") is None
+    assert "k" not in disk and disk.total_bytes == 0
+
+def test_sqlite_eviction_purges_expired_entries_first(tmp_path, clock):
+    disk = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=1000, max_age_s=60)
+    disk.put("old", b"x" * 400)
+    clock.now += 30
+    disk.put("recent", b"x" * 400)
+    disk.get("old") # 最近访问过，但已接近过期
+    clock.now += 40
+    disk.put("new", b"x" * 400)
+    # 过期的 old 被删除后不再超出上限，recent 保留
+    assert "old" not in disk
+    assert "recent" in disk and "new" in disk
+    assert disk.total_bytes == 800
+
+def test_sqlite_purges_expired_entries_on_open(tmp_path, clock):
+    path = tmp_path / "cache.sqlite3"
+    disk = SQLiteCache(path, max_age_s=60)
+    disk.put("k", b"value")
+    disk.close()
+    clock.now += 61
+    reopened = SQLiteCache(path, max_age_s=60)
+    assert len(reopened) == 0 and reopened.total_bytes == 0
+
+def test_sqlite_total_bytes_survives_reopen_and_replace(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    disk = SQLiteCache(path)
+    disk.put("k", b"x" * 10)
+    disk.put("k", b"x" * 4)
+    disk.close()
+    assert SQLiteCache(path).total_bytes == 4
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    TieredCache("T", path, serialize=str.encode, deserialize=bytes.decode).put("k", "值")
+    tiered = TieredCache("T", path, serialize=str.encode, deserialize=bytes.decode)
+    assert "k" not in tiered.memory
+    assert tiered.get("k") == "值"
+    assert "k" in tiered.memory
+    stats = tiered.stats()
+    assert stats["hits"] == 1 and stats["disk"]["hits"] == 1
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+import config
+from conversation import MESSAGE_OVERHEAD_TOKENS, EnhancedConversationContext, estimate_tokens, truncate_to_tokens
+
+class RecordingSummarizer:
+    """记录每次调用，返回把所有消息拼接在一起的 "摘要"；gate 被设置前阻塞"""
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, previous: str, messages: list[dict]) -> str:
+        self.calls.append((previous, [m["content"] for m in messages]))
+        self.gate.wait(5)
+        return " ".join(filter(None, [previous] + [m["content"] for m in messages]))
+
+def _wait_for_summary(context: EnhancedConversationContext):
+    deadline = time.monotonic() + 5
+    while context._summarizing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not context._summarizing
+
+@pytest.fixture
+def summarizer():
+    return RecordingSummarizer()
+
+@pytest.fixture
+def context(monkeypatch, summarizer):
+    monkeypatch.setattr(config, "MEMORY_ENABLED", False)
+    # 相似度阈值为负: 不因话题变化清除，只测试预算
+    return EnhancedConversationContext(max_turns=10, similarity_threshold=-1, token_budget=60, summarizer=summarizer)
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好，世界") == 5 # 中文字符和全角标点各 1 个
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("你好 abc") == 3
+
+def test_truncate_to_tokens():
+    assert truncate_to_tokens("短文本", 10) == "短文本"
+    truncated = truncate_to_tokens("很" * 100, 10)
+    assert truncated.endswith("…") and estimate_tokens(truncated) <= 10
+
+def test_window_stays_within_the_token_budget(context, summarizer):
+    for i in range(6):
+        context.add_exchange(f"第{i}个问题是什么", f"第{i}个回答内容")
+    # 每个回合约 (8 + 4) + (7 + 4) = 23 tokens，预算 60 只能保留最近 2 个回合
+    contents = [m["content"] for m in context.get_context()]
+    assert contents == ["第4个问题是什么", "第4个回答内容", "第5个问题是什么", "第5个回答内容"]
+    assert context._history_tokens == sum(estimate_tokens(c) + MESSAGE_OVERHEAD_TOKENS for c in contents)
+    assert len(context._user_vectors) == 2
+    _wait_for_summary(context)
+    summarized = [content for _, messages in summarizer.calls for content in messages]
+    assert summarized == [f"第{i}个{kind}" for i in range(4) for kind in ("问题是什么", "回答内容")]
+    assert "第0个问题是什么" in context.summary and "第3个回答内容" in context.summary
+
+def test_latest_turn_is_kept_even_if_over_budget(context):
+    context.add_exchange("问" * 100, "答" * 100)
+    assert len(context.get_context()) == 2
+    assert context.context_tokens() > context.token_budget
+
+def test_max_turns_limits_the_window(monkeypatch, summarizer):
+    monkeypatch.setattr(config, "MEMORY_ENABLED", False)
+    context = EnhancedConversationContext(max_turns=2, similarity_threshold=-1, token_budget=10_000, summarizer=summarizer)
+    for i in range(5):
+        context.add_exchange(f"问题{i}", f"回答{i}")
+    assert len(context.get_context()) == 4
+
+def test_long_messages_are_truncated(context, monkeypatch):
+    monkeypatch.setattr(config, "CONTEXT_MESSAGE_MAX_TOKENS", 20)
+    context.add_exchange("长" * 200, "好的")
+    assert estimate_tokens(context.get_context()[0]["content"]) <= 20
+
+def test_clear_discards_an_in_flight_summary(context, summarizer):
+    summarizer.gate.clear()
+    for i in range(4):
+        context.add_exchange(f"第{i}个问题是什么", f"第{i}个回答内容")
+    while not summarizer.calls: # 摘要线程已开始
+        time.sleep(0.01)
+    context.clear()
+    summarizer.gate.set()
+    _wait_for_summary(context)
+    assert context.summary == "" # 过期 (clear 之前) 的摘要被丢弃
+    assert context.get_context() == []
+
+def test_summary_and_facts_in_memory_text(context, monkeypatch):
+    monkeypatch.setattr(config, "ACTIVE_LLM", "deepseek")
+    monkeypatch.setattr(config, "CONTEXT_FACTS_TOKEN_BUDGET", 10)
+    assert context.get_memory_text() == ""
+    context.remember("我叫小明")
+    context.remember("我住在北京")
+    context.remember("我喜欢喝茶") # 超出预算，丢弃最早的
+    context.summary = "之前聊了天气"
+    memory = context.get_memory_text()
+    assert "我叫小明" not in memory
+    assert "- 我住在北京\n- 我喜欢喝茶" in memory
+    assert memory.endswith("之前对话的摘要:\n之前聊了天气")
+
+def test_forget_clears_window_summary_and_facts(context):
+    context.add_exchange("问题", "回答")
+    context.remember("我叫小明")
+    context.summary = "摘要"
+    context.forget()
+    assert context.get_context() == [] and context.facts == [] and context.summary == ""
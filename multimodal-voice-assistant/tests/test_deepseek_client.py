@@ -0,0 +1,99 @@
+import socket
+import socketserver
+import threading
+import pytest
+import requests
+import config
+from api.deepseek_client import DeepSeekClient
+from benchmarks.stub_llm_server import start_server
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(config, "DEEPSEEK_BACKOFF_BASE_S", 0.0)
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        kwargs.setdefault("latency_ms", 0)
+        kwargs.setdefault("token_delay_ms", 0)
+        server = start_server(**kwargs)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+    yield start
+    for server in servers:
+        server.shutdown()
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_reads_config_at_construction(monkeypatch, stub):
+    monkeypatch.setattr(config, "DEEPSEEK_BASE_URL", stub())
+    monkeypatch.setattr(config, "DEEPSEEK_MAX_RETRIES", 5)
+    client = DeepSeekClient()
+    assert client.base_url == config.DEEPSEEK_BASE_URL
+    assert client.max_retries == 5
+    assert client.chat(MESSAGES, "stub")["content"].startswith("这是桩服务器的回答")
+
+def test_retries_429_and_reuses_connection(stub):
+    client = DeepSeekClient(base_url=stub(fail_every=2), api_key="stub", max_retries=2)
+    for _ in range(3):
+        assert client.chat(MESSAGES, "stub") is not None
+    stats = client.stats()
+    assert stats["retries"] == 2 # 桩服务器的第 2、4 个请求返回 429，重试后成功
+    assert stats["requests"] == 5
+    assert stats["new_connections"] == 1
+
+def test_gives_up_after_max_retries(stub):
+    client = DeepSeekClient(base_url=stub(fail_every=1), api_key="stub", max_retries=2)
+    with pytest.raises(requests.HTTPError):
+        client.chat(MESSAGES, "stub")
+    assert client.stats() == {"requests": 3, "retries": 2, "new_connections": 1}
+
+def test_stream_yields_reply(stub):
+    client = DeepSeekClient(base_url=stub(fail_every=2), api_key="stub")
+    client.chat(MESSAGES, "stub")
+    text = "".join(client.chat_stream(MESSAGES, "stub"))
+    assert text.startswith("这是桩服务器的回答") and text.endswith("Third sentence for testing.")
+    assert client.stats()["retries"] == 1
+
+def test_retries_connect_failure():
+    client = DeepSeekClient(base_url=f"http://127.0.0.1:{_closed_port()}", api_key="stub", max_retries=2)
+    with pytest.raises(requests.ConnectionError):
+        client.chat(MESSAGES, "stub")
+    assert client.stats()["retries"] == 2
+
+def test_does_not_retry_after_request_sent():
+    """服务端读完请求后断开连接: 请求可能已被处理，不能重试"""
+    received = []
+
+    class HangUp(socketserver.BaseRequestHandler):
+        def handle(self):
+            received.append(self.request.recv(65536))
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), HangUp)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = DeepSeekClient(base_url=f"http://127.0.0.1:{server.server_address[1]}", api_key="stub", max_retries=2)
+        with pytest.raises(requests.ConnectionError):
+            client.chat(MESSAGES, "stub")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(received) == 1
+
+def test_backoff_honors_retry_after(monkeypatch):
+    monkeypatch.setattr(config, "DEEPSEEK_BACKOFF_BASE_S", 0.5)
+    monkeypatch.setattr(config, "DEEPSEEK_BACKOFF_MAX_S", 4.0)
+    client = DeepSeekClient(base_url="http://127.0.0.1:1", api_key="stub")
+    response = requests.Response()
+    response.headers["Retry-After"] = "2"
+    assert client._backoff(0, response) == 2.0
+    response.headers["Retry-After"] = "60"
+    assert client._backoff(0, response) == 4.0 # 不超过 DEEPSEEK_BACKOFF_MAX_S
+    assert all(0 <= client._backoff(attempt, None) <= min(4.0, 0.5 * 2 ** attempt) for attempt in range(6))
@@ -0,0 +1,103 @@
+import io
+import numpy as np
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+import image_prep
+
+@pytest.fixture(autouse=True)
+def fresh_hints():
+    image_prep._last_quality.clear()
+    yield
+    image_prep._last_quality.clear()
+
+@pytest.fixture
+def image():
+    """带噪声的渐变图 (编码大小随质量单调增长)"""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, 640)[None, :, None]
+    pixels = np.clip(x + rng.normal(0, 25, (480, 640, 3)), 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+@pytest.fixture
+def encodes(monkeypatch):
+    """记录每次编码的质量"""
+    calls = []
+    encode = image_prep.encode
+
+    def counting(image, fmt, quality):
+        calls.append(quality)
+        return encode(image, fmt, quality)
+    monkeypatch.setattr(image_prep, "encode", counting)
+    return calls
+
+def _sizes(image, fmt="jpeg") -> dict[int, int]:
+    sizes = {q: len(image_prep.encode(image, fmt, q)) for q in image_prep._quality_steps()}
+    assert list(sizes.values()) == sorted(sizes.values())
+    return sizes
+
+def _encoded(image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def test_image_mime(image):
+    assert image_prep.image_mime(_encoded(image, "JPEG")) == "image/jpeg"
+    assert image_prep.image_mime(_encoded(image, "PNG")) == "image/png"
+    if image_prep._webp_supported():
+        assert image_prep.image_mime(_encoded(image, "WEBP")) == "image/webp"
+
+def test_quality_steps_include_the_maximum(monkeypatch):
+    monkeypatch.setattr(image_prep.config, "IMAGE_QUALITY_RANGE", (20, 82))
+    monkeypatch.setattr(image_prep.config, "IMAGE_QUALITY_STEP", 5)
+    steps = image_prep._quality_steps()
+    assert steps[0] == 20 and steps[-1] == 82 and steps[-2] == 80
+
+def test_picks_the_highest_quality_within_budget(image):
+    sizes = _sizes(image)
+    qualities = list(sizes)
+    for expected in qualities:
+        image_prep._last_quality.clear()
+        data, quality = image_prep._encode_within(image, "jpeg", sizes[expected])
+        assert quality == expected and len(data) == sizes[expected]
+
+def test_budget_below_the_lowest_quality(image):
+    sizes = _sizes(image)
+    data, quality = image_prep._encode_within(image, "jpeg", min(sizes.values()) - 1)
+    assert quality == image_prep._quality_steps()[0]
+    assert len(data) > min(sizes.values()) - 1
+
+def test_no_budget_uses_the_highest_quality(image, encodes):
+    _, quality = image_prep._encode_within(image, "jpeg", None)
+    assert quality == image_prep._quality_steps()[-1]
+    assert encodes == [quality]
+
+def test_last_quality_hint_reduces_encodes(image, encodes):
+    sizes = _sizes(image)
+    budget = sizes[50]
+    encodes.clear()
+    assert image_prep._encode_within(image, "jpeg", budget)[1] == 50
+    first = len(encodes)
+    encodes.clear()
+    assert image_prep._encode_within(image, "jpeg", budget)[1] == 50
+    assert len(encodes) == 2 < first # 只试上次的质量和高一档
+
+@pytest.mark.parametrize("hint", [20, 35, 65, 80])
+def test_search_from_any_hint_finds_the_same_quality(image, hint):
+    sizes = _sizes(image)
+    image_prep._last_quality[("jpeg", image.width, image.height)] = hint
+    assert image_prep._encode_within(image, "jpeg", sizes[50])[1] == 50
+
+def test_prepare_image_resizes_to_the_target_side(image):
+    prepared = image_prep.prepare_image(image, max_side=320, fmt="jpeg", max_bytes=0)
+    assert (prepared.width, prepared.height) == (320, 240)
+    assert prepared.mime == "image/jpeg" == image_prep.image_mime(prepared.data)
+    assert prepared.quality == image_prep._quality_steps()[-1]
+
+def test_prepare_image_shrinks_when_lowest_quality_is_too_large(monkeypatch):
+    monkeypatch.setattr(image_prep, "MIN_SIDE", 256)
+    rng = np.random.default_rng(1)
+    noisy = Image.fromarray(rng.integers(0, 256, (960, 1280, 3), dtype=np.uint8))
+    prepared = image_prep.prepare_image(noisy, max_side=None, fmt="jpeg", max_bytes=60 * 1024)
+    assert max(prepared.width, prepared.height) < 1280
+    assert len(prepared.data) <= 60 * 1024 or max(prepared.width, prepared.height) * image_prep.SHRINK_FACTOR < 256
@@ -0,0 +1,66 @@
+import pytest
+from intent_router import CALIBRATION_EXAMPLES, IntentRouter, calibrate_threshold, match_command
+
+@pytest.fixture
+def router(tmp_path):
+    return IntentRouter(log_path=tmp_path / "function_calls.jsonl")
+
+# 提到了截图/摄像头/剪贴板，但不需要附件: 不能在本地判断为功能调用
+@pytest.mark.parametrize("prompt", [
+    "我的电脑很卡怎么办",
+    "what is a good camera to buy",
+    "手机屏幕坏了怎么办",
+    "Windows怎么截图",
+    "这是什么",
+    "帮我看看这段代码有什么问题",
+    "如何清理剪贴板历史",
+])
+def test_ambiguous_prompts_are_not_routed_to_a_capture(router, prompt):
+    assert router.route(prompt) in (None, "none")
+
+@pytest.mark.parametrize("prompt", ["这是什么", "帮我看看这段代码有什么问题", "what is a good camera to buy"])
+def test_keyword_prompts_are_left_to_the_llm(router, prompt):
+    assert router.route(prompt) is None
+
+@pytest.mark.parametrize("prompt, label", [
+    ("我屏幕上这个报错是什么意思", "take screenshot"),
+    ("what is on my screen", "take screenshot"),
+    ("翻译一下剪贴板里的内容", "extract clipboard"),
+    ("summarize what I copied", "extract clipboard"),
+    ("我今天穿的衣服好看吗", "capture webcam"),
+])
+def test_explicit_commands_are_routed_locally(router, prompt, label):
+    assert router.route(prompt) == label
+
+def test_command_rules_reject_how_to_questions():
+    assert match_command("屏幕上的图标怎么设置") is None
+    assert match_command("how do I look at my screen resolution") is None
+
+def test_model_never_decides_a_capture(router):
+    # 分类器倾向 "capture webcam"，但没有明确指令，交给 LLM
+    assert router.model.predict("我的电脑很卡怎么办")[0] != "none"
+    assert router.route("我的电脑很卡怎么办") is None
+
+def test_confident_chitchat_is_decided_locally(router):
+    assert router.route("北京有哪些好玩的地方") == "none"
+
+def test_threshold_excludes_every_held_out_command(router):
+    for text, label in CALIBRATION_EXAMPLES:
+        if label != "none":
+            assert router.route(text) in (label, None), text
+
+def test_calibration_raises_threshold_above_misclassified_commands(router):
+    # 把一条指令作为 "none" 学习多次，使分类器自信地误判它
+    for _ in range(20):
+        router.model.learn("我今天气色怎么样", "none")
+    predicted, confidence = router.model.predict("我今天气色怎么样")
+    assert predicted == "none"
+    threshold = calibrate_threshold(router.model, CALIBRATION_EXAMPLES, 0.5)
+    assert threshold > confidence
+    router.none_threshold = threshold
+    assert router.route("我今天气色怎么样") is None
+
+def test_learned_decisions_persist(tmp_path):
+    path = tmp_path / "function_calls.jsonl"
+    IntentRouter(log_path=path).learn("我刚拍的照片", "capture webcam")
+    assert IntentRouter(log_path=path).model.doc_counts["capture webcam"] >= 1
@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+import config
+import memory_store
+from memory_store import MemoryStore
+from sessions import Session, SessionStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = MemoryStore(tmp_path / "memory.sqlite3")
+    yield store
+    store.close()
+
+def test_add_and_search(store):
+    assert store.add("我的生日是五月三日")
+    assert store.add("我喜欢喝绿茶")
+    assert store.add("my dog is called Max")
+    results = store.search("我的生日是哪天")
+    assert results[0][0] == "我的生日是五月三日"
+    assert all(0 < score <= 1.0 + 1e-6 for _, score in results)
+    assert store.search("what is my dog called")[0][0] == "my dog is called Max"
+
+def test_search_without_shared_features_returns_nothing(store):
+    store.add("我喜欢喝绿茶")
+    assert store.search("xyz") == []
+
+def test_add_skips_duplicates_and_blank_text(store):
+    assert store.add("我喜欢喝绿茶")
+    assert not store.add("  我喜欢喝绿茶 ")
+    assert not store.add("   ")
+    assert store.count() == 1
+
+def test_scopes_are_isolated(store):
+    store.add("我喜欢喝绿茶", scope="a")
+    assert store.search("绿茶", scope="b") == []
+    assert store.count("a") == 1 and store.count("b") == 0
+
+def test_clear_removes_only_that_scope(store):
+    store.add("我喜欢喝绿茶", scope="a")
+    store.add("我喜欢喝绿茶", scope="b")
+    store.clear("a")
+    assert store.count("a") == 0
+    assert store.count("b") == 1
+
+def test_facts_persist_and_evicted_indexes_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MEMORY_INDEX_SCOPES", 1)
+    path = tmp_path / "memory.sqlite3"
+    store = MemoryStore(path)
+    store.add("我喜欢喝绿茶", scope="a")
+    store.add("my dog is called Max", scope="b") # 只缓存一个作用域的索引，a 被移出内存
+    assert store.search("绿茶", scope="a")[0][0] == "我喜欢喝绿茶"
+    store.close()
+    reopened = MemoryStore(path)
+    assert reopened.count("a") == 1 and reopened.count("b") == 1
+    reopened.close()
+
+def test_evicted_session_scope_is_deleted(store, monkeypatch):
+    monkeypatch.setattr(memory_store, "get_store", lambda: store)
+
+    async def scenario():
+        sessions = SessionStore(max_sessions=1, idle_timeout_s=3600)
+        sessions.get("first").context.remember("我喜欢喝绿茶")
+        sessions.get("second") # 超出上限，first 被淘汰
+        for _ in range(100): # 删除在线程池中执行
+            if store.count("web:first") == 0:
+                break
+            await asyncio.sleep(0.01)
+        return sessions
+
+    sessions = asyncio.run(scenario())
+    assert store.count("web:first") == 0
+    assert sessions.stats()["evicted_capacity"] == 1
+
+def test_session_scopes_are_isolated_from_the_voice_assistant(store, monkeypatch):
+    monkeypatch.setattr(memory_store, "get_store", lambda: store)
+    store.add("我的银行卡密码是一二三四") # 语音助手的 default 作用域
+    sessions = SessionStore(max_sessions=10, idle_timeout_s=3600, on_evict=None)
+    context = sessions.get("web").context
+    assert context.memory_scope == "web:web"
+    context.remember("我喜欢喝绿茶")
+    assert store.count("web:web") == 1 and store.count() == 1
+    assert "银行卡" not in context.get_memory_text("我的银行卡密码是多少")
+
+def test_eviction_only_deletes_scopes_created_by_the_store(store, monkeypatch):
+    monkeypatch.setattr(memory_store, "get_store", lambda: store)
+    store.add("我的银行卡密码是一二三四")
+
+    async def scenario():
+        sessions = SessionStore(max_sessions=1, idle_timeout_s=3600)
+        sessions._sessions["x"] = Session("x") # 上下文使用 default 作用域，不是会话管理创建的
+        sessions.get("y")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert store.count() == 1
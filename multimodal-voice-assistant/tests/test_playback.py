@@ -0,0 +1,68 @@
+import asyncio
+import os
+import time
+import numpy as np
+import pytest
+
+pytest.importorskip("pygame")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy") # 没有声卡时也能初始化混音器
+from audio import playback
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = playback.PlaybackEngine()
+    if not engine.available:
+        pytest.skip("Pygame Mixer 不可用")
+    yield engine
+    engine.close()
+
+@pytest.fixture(autouse=True)
+def idle(engine):
+    yield
+    engine.stop()
+
+def _sound(seconds: float):
+    frequency, _, channels = playback.get_pygame().mixer.get_init()
+    return playback.get_pygame().mixer.Sound(buffer=np.zeros(int(frequency * seconds) * channels, dtype=np.int16).tobytes())
+
+def test_clips_play_in_order_without_gaps(engine):
+    before = engine.stats()
+    starts = []
+    clips = [engine.play(_sound(0.2), on_start=starts.append) for _ in range(3)]
+    assert clips[-1].done.wait(5)
+    assert all(clip.done.is_set() and not clip.cancelled for clip in clips)
+    # 后一段的开始时间就是前一段的结束时间
+    assert starts == [clip.started_at for clip in clips]
+    for previous, clip in zip(clips, clips[1:]):
+        assert clip.started_at == pytest.approx(previous.ends_at)
+    after = engine.stats()
+    assert after["played"] - before["played"] == 3
+    assert after["gapless"] - before["gapless"] == 2
+
+def test_stop_cancels_playing_and_queued_clips(engine):
+    finished = []
+    clips = [engine.play(_sound(2.0), on_done=finished.append) for _ in range(4)]
+    time.sleep(0.1)
+    cancelled_before = engine.stats()["cancelled"]
+    start = time.perf_counter()
+    engine.stop()
+    assert time.perf_counter() - start < 0.5
+    assert all(clip.done.is_set() and clip.cancelled for clip in clips)
+    assert finished == clips
+    assert engine.stats()["cancelled"] - cancelled_before == 4
+    assert not engine._channel.get_busy()
+
+def test_engine_keeps_playing_after_stop(engine):
+    engine.play(_sound(2.0))
+    engine.stop()
+    clip = engine.play(_sound(0.1))
+    assert clip.done.wait(5) and not clip.cancelled
+
+def test_play_async_resolves_when_stopped(engine):
+    async def scenario():
+        future = engine.play_async(_sound(2.0))
+        await asyncio.sleep(0.05)
+        engine.stop()
+        await asyncio.wait_for(future, 1)
+
+    asyncio.run(scenario())
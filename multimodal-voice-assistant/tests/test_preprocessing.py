@@ -0,0 +1,60 @@
+import math
+import numpy as np
+import pytest
+import config
+from audio import preprocessing
+
+RATE = config.STT_SAMPLE_RATE
+
+def _tone(seconds: float = 1.0, amplitude: float = 0.25, offset: float = 0.0) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (offset + amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+def _dbfs(value: float) -> float:
+    return 20 * math.log10(value)
+
+def test_pcm_to_float32_scales_int16():
+    pcm = np.array([0, 16384, -32768, 32767], dtype=np.int16).tobytes()
+    samples = preprocessing.pcm_to_float32(pcm)
+    assert samples.dtype == np.float32
+    np.testing.assert_allclose(samples, [0.0, 0.5, -1.0, 32767 / 32768])
+
+def test_pcm_to_float32_rejects_other_widths():
+    with pytest.raises(ValueError):
+        preprocessing.pcm_to_float32(b"\x00\x00\x00", sample_width=3)
+
+def test_peak_normalization_removes_dc_offset():
+    samples = _tone(offset=0.1)
+    out = preprocessing.preprocess_samples(samples, normalization="peak", pre_emphasis_coef=0.0)
+    assert abs(float(out.mean())) < 1e-4
+    assert math.isclose(_dbfs(float(np.max(np.abs(out)))), -config.AUDIO_PEAK_HEADROOM_DB, abs_tol=0.01)
+
+def test_rms_normalization_reaches_target_without_clipping():
+    out = preprocessing.preprocess_samples(_tone(amplitude=0.01), normalization="rms", pre_emphasis_coef=0.0)
+    rms = float(np.sqrt(np.mean(out * out)))
+    assert math.isclose(_dbfs(rms), config.AUDIO_RMS_TARGET_DBFS, abs_tol=0.01)
+    # 达到目标响度需要的增益会导致削波时，以满幅为上限
+    limited = preprocessing.normalize_rms(_tone(amplitude=0.9), target_dbfs=0.0)
+    assert math.isclose(float(np.max(np.abs(limited))), 1.0, rel_tol=1e-5)
+
+def test_input_buffer_is_not_modified():
+    samples = _tone(offset=0.1)
+    original = samples.copy()
+    preprocessing.preprocess_samples(samples, normalization="peak")
+    np.testing.assert_array_equal(samples, original)
+    # np.frombuffer 得到的只读 int16 数组也可以直接处理
+    pcm = (samples * 32767).astype(np.int16).tobytes()
+    assert preprocessing.preprocess_pcm(pcm).dtype == np.float32
+
+def test_short_audio_is_not_normalized():
+    samples = np.full(RATE // 20, 0.01, dtype=np.float32) # 50ms
+    np.testing.assert_array_equal(preprocessing.preprocess_samples(samples, normalization="peak"), samples)
+
+def test_pre_emphasis():
+    samples = np.array([1.0, 1.0, 1.0, 0.0], dtype=np.float32)
+    np.testing.assert_allclose(preprocessing.pre_emphasis(samples, 0.5), [1.0, 0.5, 0.5, -0.5])
+    np.testing.assert_array_equal(preprocessing.pre_emphasis(samples[:1], 0.5), samples[:1])
+
+def test_silence_stays_silent():
+    out = preprocessing.preprocess_samples(np.zeros(RATE, dtype=np.float32), normalization="peak")
+    assert not np.any(out)
@@ -0,0 +1,45 @@
+import pytest
+from audio.sentences import SentenceSplitter, split_sentences
+
+def _split(text: str, chunk: int = 1, **kwargs) -> list[str]:
+    """逐 chunk 个字符输入 (模拟流式输出)"""
+    return list(split_sentences((text[i:i + chunk] for i in range(0, len(text), chunk)), **kwargs))
+
+@pytest.mark.parametrize("chunk", [1, 3, 1000])
+def test_chinese_and_english_terminators(chunk):
+    text = "今天天气很好。我们去公园吧！Shall we go now? Yes; let's go."
+    assert _split(text, chunk, min_chars=1) == ["今天天气很好。", "我们去公园吧！", "Shall we go now?", "Yes;", "let's go."]
+
+def test_period_needs_following_whitespace():
+    assert _split("圆周率约为 3.14，e.g.这样写。", min_chars=1) == ["圆周率约为 3.14，e.g.这样写。"]
+    assert _split("It costs 3.5 dollars. That is cheap.", min_chars=1) == ["It costs 3.5 dollars.", "That is cheap."]
+
+def test_closing_quotes_and_repeated_marks_stay_with_the_sentence():
+    assert _split("他说：“你好！”然后走了。真的吗？！", min_chars=1) == ["他说：“你好！”", "然后走了。", "真的吗？！"]
+
+def test_waits_for_text_after_a_terminator():
+    splitter = SentenceSplitter(min_chars=1)
+    assert splitter.feed("你好。") == [] # 后面可能还有引号
+    assert splitter.feed("再") == ["你好。"]
+    assert splitter.flush() == "再"
+    assert splitter.flush() is None
+
+def test_newline_ends_a_sentence_immediately():
+    splitter = SentenceSplitter(min_chars=1)
+    assert splitter.feed("第一行\n") == ["第一行"]
+
+def test_short_sentences_are_merged():
+    assert _split("好的。我明白了。这是一个比较长的句子。", min_chars=6) == ["好的。我明白了。", "这是一个比较长的句子。"]
+
+def test_long_text_breaks_at_a_soft_break():
+    text = "这是一个没有句末标点的很长的句子，后面还有更多的内容一直在继续"
+    sentences = _split(text, min_chars=4, max_chars=20)
+    assert sentences[0] == "这是一个没有句末标点的很长的句子，"
+    assert "".join(sentences) == text
+
+def test_long_text_without_breaks_is_cut_at_max_chars():
+    sentences = _split("一" * 45, min_chars=4, max_chars=20)
+    assert sentences == ["一" * 20, "一" * 20, "一" * 5]
+
+def test_whitespace_only_input_produces_nothing():
+    assert _split("   \n  ", min_chars=1) == []
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+import sessions
+from sessions import SessionStore
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(sessions.time, "monotonic", lambda: now[0])
+    return now
+
+def test_capacity_evicts_least_recently_used(clock):
+    store = SessionStore(max_sessions=2, idle_timeout_s=3600, on_evict=None)
+    a = store.get("a")
+    store.get("b")
+    assert store.get("a") is a # a 变为最近访问
+    store.get("c")
+    assert len(store) == 2
+    assert store.get("a") is a
+    assert store.stats()["evicted_capacity"] == 1
+
+def test_idle_sessions_are_evicted(clock):
+    store = SessionStore(max_sessions=10, idle_timeout_s=60, on_evict=None)
+    old = store.get("old")
+    clock[0] = 61
+    store.get("new")
+    assert len(store) == 1
+    assert store.get("old") is not old # 重新创建，上下文为空
+    assert store.stats()["evicted_idle"] == 1
+
+def test_busy_sessions_are_not_evicted(clock):
+    evicted = []
+    store = SessionStore(max_sessions=1, idle_timeout_s=3600, on_evict=evicted.append)
+
+    async def scenario():
+        busy = store.get("busy")
+        async with busy.lock: # 正在处理回合
+            store.get("other")
+            assert len(store) == 2
+        store.get("other")
+        return busy
+
+    busy = asyncio.run(scenario())
+    assert evicted == [busy]
+    assert len(store) == 1
+
+def test_only_server_issued_ids_are_valid():
+    store = SessionStore(secret=b"secret")
+    session_id = store.new_id()
+    token, signature = session_id.split(".")
+    assert store.is_valid_id(session_id) and len(session_id) <= sessions.SESSION_ID_MAX_LEN
+    assert not store.is_valid_id(f"{token}.{'A' * len(signature)}") # 伪造的签名
+    assert not store.is_valid_id(f"{token}x.{signature}")
+    assert not SessionStore(secret=b"other").is_valid_id(session_id) # 其他密钥签发的 id
+
+@pytest.mark.parametrize("session_id", ["abc-123_XYZ", "", None, 42, "x" * 65, "会话", "a\nb", "default", ".", "default."])
+def test_malformed_ids_are_rejected(session_id):
+    assert not SessionStore().is_valid_id(session_id)
+
+def test_backend_issues_its_own_session_ids(monkeypatch):
+    from starlette.testclient import TestClient
+    import backend_asgi
+    from assistant_core import TurnResult
+    contexts = []
+
+    async def handle_turn(command, conversation_context=None, speak=True, on_event=None):
+        contexts.append(conversation_context)
+        return TurnResult(prompt=command, text="好的")
+
+    monkeypatch.setattr(backend_asgi.core, "handle_turn", handle_turn)
+    monkeypatch.setattr(backend_asgi, "sessions", SessionStore(on_evict=None))
+    client = TestClient(backend_asgi.app)
+    for chosen in ("default", "web:default", "someone-elses-id"):
+        client.cookies.clear()
+        client.cookies.set("session_id", chosen)
+        response = client.post("/api/command", json={"command": "你好", "session_id": chosen}, headers={"X-Session-Id": chosen})
+        issued = response.json()["session_id"]
+        assert issued != chosen and f"session_id={issued};" in response.headers["set-cookie"]
+        assert contexts[-1].memory_scope == sessions.memory_scope(issued)
+    # 签发的 id 可以继续使用同一个会话 (请求体或 Cookie)
+    assert client.post("/api/command", json={"command": "你好", "session_id": issued}).json()["session_id"] == issued
+    assert contexts[-1] is contexts[-2]
+    assert all(context.memory_scope != "default" for context in contexts)
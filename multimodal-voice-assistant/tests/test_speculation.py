@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+import config
+import intent_router
+import speculation
+
+@pytest.fixture
+def clipboard_reads(monkeypatch, tmp_path):
+    """替换 LLM 调用和剪贴板读取，返回剪贴板读取次数的记录"""
+    monkeypatch.setattr(intent_router, "_router", intent_router.LazySingleton(
+        "intent_router_test", lambda: intent_router.IntentRouter(log_path=tmp_path / "calls.jsonl")))
+    monkeypatch.setattr(intent_router, "get_router", intent_router._router.get)
+    monkeypatch.setattr(config, "SPECULATIVE_ANSWER", True)
+    monkeypatch.setattr(speculation, "llm_prompt_stream", lambda context, prompt: iter(["好的"]))
+    reads = []
+    monkeypatch.setattr(speculation, "get_clipboard_text", lambda quiet=False: reads.append(quiet) or "剪贴板内容")
+    return reads
+
+def test_clipboard_is_not_read_for_unrelated_turns(monkeypatch, clipboard_reads):
+    monkeypatch.setattr(speculation, "llm_function_call", lambda prompt: "take screenshot")
+    plan = speculation.plan_turn(None, "帮我看看这段代码有什么问题")
+    assert plan.call == "take screenshot"
+    assert plan.clipboard is None
+    assert clipboard_reads == []
+
+def test_clipboard_is_prefetched_when_it_is_the_likely_call(monkeypatch, clipboard_reads):
+    monkeypatch.setattr(speculation, "llm_function_call", lambda prompt: "extract clipboard")
+    # 有 "复制" 关键词但不是明确的指令句式: 交给 LLM，同时预取剪贴板
+    plan = speculation.plan_turn(None, "我复制了一段话")
+    assert plan.call == "extract clipboard"
+    assert plan.get_clipboard_text() == "剪贴板内容"
+    assert clipboard_reads == [True]
+
+def _consume(answer: speculation.SpeculativeAnswer) -> tuple[list[str], Exception | None]:
+    """在另一个线程中消费推测回答 (回归测试: 出错时不能一直阻塞)"""
+    chunks = []
+    future = speculation._executor.submit(lambda: chunks.extend(answer))
+    try:
+        future.result(timeout=5)
+    except Exception as e:
+        return chunks, e
+    return chunks, None
+
+def test_speculative_answer_reports_open_errors():
+    def open_stream():
+        raise ConnectionError("连接失败")
+
+    chunks, error = _consume(speculation.SpeculativeAnswer(open_stream))
+    assert chunks == [] and isinstance(error, ConnectionError)
+
+def test_speculative_answer_reports_stream_errors_after_the_chunks():
+    closed = []
+
+    def stream():
+        try:
+            yield "第一句。"
+            raise TimeoutError("读取超时")
+        finally:
+            closed.append(True)
+
+    chunks, error = _consume(speculation.SpeculativeAnswer(stream))
+    assert chunks == ["第一句。"] and isinstance(error, TimeoutError)
+    assert closed == [True]
+
+def test_failed_decision_cancels_the_speculative_work(monkeypatch, clipboard_reads):
+    async def failing_decision(prompt):
+        await asyncio.sleep(0.01)
+        raise ConnectionError("连接失败")
+
+    async def answer(context, prompt):
+        yield "好的"
+        await asyncio.sleep(10)
+
+    def slow_clipboard(quiet=False):
+        time.sleep(0.2)
+        return "剪贴板内容"
+
+    monkeypatch.setattr(speculation, "llm_function_call_async", failing_decision)
+    monkeypatch.setattr(speculation, "llm_prompt_astream", answer)
+    monkeypatch.setattr(speculation, "get_clipboard_text", slow_clipboard)
+    monkeypatch.setattr(speculation, "_likely_clipboard", lambda prompt: True)
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await speculation.plan_turn_async(None, "我复制了一段话")
+        await asyncio.sleep(0.01)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+
+    assert asyncio.run(scenario()) == [] # 推测回答和剪贴板预取都已取消
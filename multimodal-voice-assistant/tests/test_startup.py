@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+import pytest
+import startup
+from startup import LazySingleton
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+# 这些依赖加载慢 (模型、SDK、多媒体库)，只应在首次使用时导入
+HEAVY_MODULES = ["faster_whisper", "ctranslate2", "opencc", "pygame", "edge_tts", "google.generativeai",
+                 "PIL.ImageGrab", "duckduckgo_search", "sklearn"]
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(startup, "_registry", {})
+
+def test_factory_runs_once_on_first_get():
+    calls = []
+    singleton = LazySingleton("thing", lambda: calls.append(1) or object())
+    assert not singleton.loaded and calls == []
+    threads = [threading.Thread(target=singleton.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert singleton.loaded and singleton.get() is singleton.get()
+    assert startup.load_times()["thing"] is not None
+
+def test_failed_load_is_retried():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("model not found")
+        return "model"
+
+    singleton = LazySingleton("model", factory)
+    with pytest.raises(RuntimeError):
+        singleton.get()
+    assert not singleton.loaded and startup.load_times() == {"model": None}
+    assert singleton.get() == "model"
+
+def test_warmup_loads_named_components_and_skips_failures():
+    ok = LazySingleton("ok", lambda: "ok")
+    broken = LazySingleton("broken", lambda: 1 / 0)
+    other = LazySingleton("other", lambda: "other")
+    startup.warmup(["broken", "unknown", "ok"])
+    assert ok.loaded and not broken.loaded and not other.loaded
+    startup.warmup(background=True).join(5)
+    assert other.loaded
+
+def test_importing_modules_does_not_load_heavy_dependencies(tmp_path):
+    modules = ["audio.stt", "audio.tts", "audio.wakeword", "api.gemini_client", "input_handler", "web_search", "llm_interface"]
+    code = (
+        f"import sys\nimport {', '.join(modules)}\nimport startup\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+        "print([name for name, s in startup._registry.items() if s.loaded])\n"
+    )
+    env = {**os.environ, "PYTHONPATH": str(PROJECT_DIR)}
+    proc = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    heavy, loaded = proc.stdout.strip().splitlines()[-2:]
+    assert heavy == "[]"
+    assert loaded == "[]"
@@ -0,0 +1,79 @@
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from audio import stt
+from audio.streaming import BackgroundTranscriber, StreamingTranscriber
+
+RATE = 16000
+CHUNK = RATE // 10 # 100ms
+
+class SlowModel:
+    """每次解码阻塞到 gate 被设置，记录解码线程、beam_size 和窗口长度"""
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+
+    def transcribe(self, audio, language=None, beam_size=5, initial_prompt=None, condition_on_previous_text=True):
+        self.calls.append((threading.current_thread().name, beam_size, audio.size))
+        self.gate.wait(5)
+        return iter([SimpleNamespace(text="你好", end=audio.size / RATE)]), None
+
+@pytest.fixture
+def model(monkeypatch):
+    model = SlowModel()
+    monkeypatch.setattr(stt, "get_whisper_model", lambda: model)
+    monkeypatch.setattr(stt, "get_converter", lambda: SimpleNamespace(convert=lambda text: text))
+    return model
+
+def _chunk(voiced: bool) -> bytes:
+    t = np.arange(CHUNK) / RATE
+    samples = 8000 * np.sin(2 * np.pi * 200 * t) if voiced else np.zeros(CHUNK)
+    return samples.astype(np.int16).tobytes()
+
+def test_put_does_not_wait_for_decoding(model):
+    partials, finals = [], []
+    transcriber = StreamingTranscriber(on_partial=partials.append, on_final=finals.append,
+                                       step_s=0.2, endpoint_silence_s=0.5)
+    decoder = BackgroundTranscriber(transcriber)
+    start = time.perf_counter()
+    for _ in range(20): # 2s 语音，解码被阻塞
+        decoder.put(_chunk(voiced=True))
+    assert time.perf_counter() - start < 0.5 # 采集线程不等待解码
+    assert all(name == "streaming-decode" for name, _, _ in model.calls)
+    model.gate.set()
+    for _ in range(6):
+        decoder.put(_chunk(voiced=False))
+    decoder.close()
+    assert [event.text for event in finals] == ["你好"]
+    assert finals[0].audio_seconds == pytest.approx(2.5) # 静音 0.5s 后结束语句
+    # 积压期间只对最新窗口做部分解码，不是每 0.2s 一次
+    greedy = [size for _, beam_size, size in model.calls if beam_size == 1]
+    assert len(greedy) < 20 * 0.1 / 0.2
+    assert model.calls[-1][1:] == (5, 25 * CHUNK) # 最终解码包含全部音频
+
+def test_close_finalizes_the_current_utterance(model):
+    model.gate.set()
+    finals = []
+    decoder = BackgroundTranscriber(StreamingTranscriber(on_final=finals.append, step_s=10.0))
+    for _ in range(5):
+        decoder.put(_chunk(voiced=True))
+    decoder.close()
+    decoder.close() # 重复关闭无影响
+    assert [event.text for event in finals] == ["你好"]
+    assert [beam_size for _, beam_size, _ in model.calls] == [5]
+
+def test_callback_errors_do_not_stop_the_decoder(model):
+    model.gate.set()
+    seen = []
+
+    def on_final(event):
+        seen.append(event.text)
+        raise RuntimeError("handler failed")
+
+    decoder = BackgroundTranscriber(StreamingTranscriber(on_final=on_final, step_s=10.0, endpoint_silence_s=0.3))
+    for voiced in [True] * 5 + [False] * 3 + [True] * 5:
+        decoder.put(_chunk(voiced))
+    decoder.close()
+    assert seen == ["你好", "你好"]
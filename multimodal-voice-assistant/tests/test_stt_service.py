@@ -0,0 +1,81 @@
+import queue
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from audio import stt
+from audio.stt_service import STTService
+from cache import TieredCache
+
+class FakeDecoder:
+    """替换 stt.decode_samples: gate 被设置前阻塞；burn_s > 0 时在另一个线程中占用 CPU"""
+    def __init__(self, burn_s: float = 0.0):
+        self.gate = threading.Event()
+        self.burn_s = burn_s
+        self.calls = 0
+
+    def __call__(self, samples, model=None):
+        self.calls += 1
+        self.gate.wait(5)
+        if self.burn_s:
+            def burn():
+                end = time.process_time() + self.burn_s
+                while time.process_time() < end:
+                    pass
+            worker = threading.Thread(target=burn)
+            worker.start()
+            worker.join()
+        return {"text": f"第{int(samples[0])}段", "segments": [{"start": 0.0, "end": 1.0, "text": f"第{int(samples[0])}段"}]}
+
+@pytest.fixture
+def decoder(monkeypatch, tmp_path):
+    decoder = FakeDecoder()
+    monkeypatch.setattr(stt, "decode_samples", decoder)
+    cache = TieredCache("STT", tmp_path / "stt.sqlite3")
+    monkeypatch.setattr(stt, "get_stt_cache", lambda: cache)
+    monkeypatch.setattr(stt, "get_converter", lambda: SimpleNamespace(convert=lambda text: text))
+    return decoder
+
+def _samples(n: int) -> np.ndarray:
+    return np.full(1600, n, dtype=np.float32)
+
+def test_cache_hit_returns_a_completed_future(decoder):
+    service = STTService(num_workers=1, queue_size=1, backend='thread')
+    decoder.gate.set()
+    first = service.submit(_samples(1))
+    assert first.result(timeout=5) == "第1段"
+    second = service.submit(_samples(1))
+    assert second.done() and second.result() == "第1段"
+    assert second.decode_cpu_s == 0.0
+    assert decoder.calls == 1
+    stats = service.stats()
+    assert stats["cache_hits"] == 1 and stats["submitted"] == 1 and stats["completed"] == 1
+    service.shutdown()
+
+def test_full_queue_rejects_without_blocking(decoder):
+    service = STTService(num_workers=1, queue_size=1, backend='thread')
+    running = service.submit(_samples(1))
+    queued = service.submit(_samples(2))
+    with pytest.raises(queue.Full):
+        service.submit(_samples(3), block=False)
+    start = time.perf_counter()
+    with pytest.raises(queue.Full):
+        service.submit(_samples(4), timeout=0.05)
+    assert time.perf_counter() - start < 1.0
+    assert service.stats()["rejected"] == 2 and service.stats()["in_flight"] == 2
+    decoder.gate.set()
+    assert [running.result(timeout=5), queued.result(timeout=5)] == ["第1段", "第2段"]
+    # 完成后名额被释放
+    assert service.submit(_samples(5), block=False).result(timeout=5) == "第5段"
+    assert service.stats()["in_flight"] == 0
+    service.shutdown()
+
+def test_decode_cpu_includes_decoder_threads(decoder):
+    decoder.burn_s = 0.2
+    decoder.gate.set()
+    service = STTService(num_workers=1, queue_size=1, backend='thread')
+    future = service.submit(_samples(1))
+    future.result(timeout=5)
+    assert future.decode_cpu_s >= 0.2 # ctranslate2 计算线程的 CPU 时间也计入
+    service.shutdown()
@@ -0,0 +1,47 @@
+import math
+import pytest
+import config
+from conversation import EnhancedConversationContext
+from text_similarity import cosine_similarity, text_vector
+
+@pytest.fixture
+def context(monkeypatch):
+    monkeypatch.setattr(config, "MEMORY_ENABLED", False)
+    return EnhancedConversationContext(summarizer=lambda previous, messages: None)
+
+def test_vector_features_and_normalization():
+    vector = text_vector("我喜欢猫 I like Cats 2")
+    assert set(vector) == {"我喜", "喜欢", "欢猫", "i", "like", "cats", "2"}
+    assert math.isclose(sum(weight * weight for weight in vector.values()), 1.0)
+
+def test_single_character_runs_are_kept():
+    assert set(text_vector("猫 and 狗")) == {"猫", "and", "狗"}
+
+def test_empty_and_punctuation_only_text():
+    assert text_vector("") == {}
+    assert text_vector("。，！?") == {}
+
+def test_cosine_similarity():
+    a = text_vector("今天北京的天气怎么样")
+    assert math.isclose(cosine_similarity(a, a), 1.0)
+    assert cosine_similarity(a, text_vector("北京明天的天气呢")) > 0.3
+    assert cosine_similarity(a, text_vector("tell me a joke")) == 0.0
+    assert cosine_similarity(a, {}) == 0.0
+    b = text_vector("天气")
+    assert cosine_similarity(a, b) == cosine_similarity(b, a)
+
+def test_similarity_averages_over_the_window(context):
+    assert context.calculate_similarity("北京的天气") == 0.0 # 没有历史
+    context.add_exchange("北京的天气怎么样", "晴天。")
+    context.add_exchange("北京明天的天气呢", "多云。")
+    same_topic = context.calculate_similarity("北京后天的天气呢")
+    assert same_topic > context.similarity_threshold
+    assert context.calculate_similarity("tell me a joke") == 0.0
+
+def test_topic_change_clears_the_window(context):
+    context.add_exchange("北京的天气怎么样", "晴天。")
+    context.add_exchange("北京明天的天气呢", "多云。")
+    assert len(context.get_context()) == 4
+    context.add_exchange("tell me a joke", "Why did the chicken cross the road?")
+    assert [m["content"] for m in context.get_context()] == ["tell me a joke", "Why did the chicken cross the road?"]
+    assert len(context._user_vectors) == 1
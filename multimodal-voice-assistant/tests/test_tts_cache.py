@@ -0,0 +1,65 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+import config
+from cache import TieredCache
+from audio import tts, tts_backends
+from audio.tts_backends import BackendPolicy, BackendStats, TTSBackend
+
+class FakeBackend(TTSBackend):
+    available = True
+
+    def __init__(self, name: str, delay_s: float = 0.0):
+        self.name = name
+        self.cache_id = f"fake|{name}"
+        self.delay_s = delay_s
+        self.calls = 0
+
+    async def synthesize(self, text: str) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        return f"{self.name}:{text}".encode()
+
+@pytest.fixture
+def backends(tmp_path, monkeypatch):
+    preferred, fallback = FakeBackend("preferred", delay_s=0.5), FakeBackend("fallback")
+    policy = BackendPolicy(names=[], latency_budget_s=10.0, deadline_s=0.05)
+    policy.backends = [preferred, fallback]
+    policy.stats = {backend.name: BackendStats() for backend in policy.backends}
+    monkeypatch.setattr(tts_backends, "get_policy", lambda: policy)
+    cache = TieredCache("TTS", tmp_path / "tts.sqlite3")
+    monkeypatch.setattr(tts, "get_synth_cache", lambda: cache)
+    monkeypatch.setattr(config, "TTS_CACHE_ENABLED", True)
+    return preferred, fallback
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        TTSBackend()
+
+def test_deadline_fallback_audio_is_not_cached(backends):
+    preferred, fallback = backends
+    assert asyncio.run(tts._synthesize("你好")) == "fallback:你好".encode()
+    assert tts._cache_key(fallback, "你好") not in tts.get_synth_cache()
+    # 首选后端恢复后使用它的声音，而不是之前回退的结果
+    preferred.delay_s = 0.0
+    assert asyncio.run(tts._synthesize("你好")) == "preferred:你好".encode()
+    assert asyncio.run(tts._synthesize("你好")) == "preferred:你好".encode()
+    assert preferred.calls == 2 # 第二次命中缓存
+
+def test_prewarm_caches_only_the_preferred_backend(backends):
+    preferred, _ = backends
+    assert asyncio.run(tts._prewarm(["慢的句子。"])) == 0
+    preferred.delay_s = 0.0
+    assert asyncio.run(tts._prewarm(["慢的句子。"])) == 1
+    assert asyncio.run(tts._prewarm(["慢的句子。"])) == 0 # 已缓存
+    assert tts._cache_key(preferred, "慢的句子。") in tts.get_synth_cache()
+
+def test_import_does_not_open_the_cache(tmp_path):
+    code = "import config\nfrom audio import tts\nprint(config.TTS_CACHE_DB.exists(), tts._synth_cache.loaded)"
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parent.parent), "TMPDIR": str(tmp_path)}
+    proc = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.split()[-2:] == ["False", "False"]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from audio import vad
+
+RATE = 16000
+FRAME = RATE * 30 // 1000 # 默认帧长 30ms
+
+def _signal(*parts: tuple[str, float], seed: int = 0) -> np.ndarray:
+    """按 ("speech"/"silence", 秒数) 拼接测试信号: 语音为 200Hz 正弦，静音为低电平噪声"""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for kind, seconds in parts:
+        n = int(seconds * RATE)
+        noise = rng.normal(0, 0.001, n)
+        if kind == "speech":
+            noise += 0.2 * np.sin(2 * np.pi * 200 * np.arange(n) / RATE)
+        chunks.append(noise)
+    return np.concatenate(chunks).astype(np.float32)
+
+def test_silence_has_no_speech():
+    samples = _signal(("silence", 2.0))
+    assert vad.detect_speech_regions(samples) == []
+    assert not vad.has_speech(samples)
+    assert vad.trim_silence(samples).size == 0
+    assert vad.split_speech(samples) == []
+
+def test_shorter_than_one_frame():
+    assert vad.detect_speech_regions(np.zeros(FRAME - 1, dtype=np.float32)) == []
+
+def test_region_is_padded_and_frame_aligned():
+    samples = _signal(("silence", 1.0), ("speech", 1.0), ("silence", 1.0))
+    [(start, end)] = vad.detect_speech_regions(samples)
+    assert start % FRAME == 0 and end % FRAME == 0
+    # 语音位于 1.0s~2.0s，前后各保留约 VAD_PAD_S (0.15s) 的余量
+    assert 0.8 * RATE <= start <= 0.9 * RATE
+    assert 2.1 * RATE <= end <= 2.2 * RATE
+
+def test_trim_silence_returns_a_view():
+    samples = _signal(("silence", 1.0), ("speech", 1.0), ("silence", 1.0))
+    trimmed = vad.trim_silence(samples)
+    assert 1.2 * RATE <= trimmed.size <= 1.4 * RATE
+    assert np.shares_memory(trimmed, samples)
+
+def test_region_reaching_the_end_keeps_the_tail():
+    samples = _signal(("silence", 1.0), ("speech", 1.0))
+    samples = np.concatenate([samples, samples[-FRAME // 2:]]) # 不足一帧的尾部
+    assert vad.detect_speech_regions(samples)[-1][1] == samples.size
+
+def test_short_pauses_are_merged():
+    samples = _signal(("silence", 0.5), ("speech", 0.5), ("silence", 0.2), ("speech", 0.5), ("silence", 0.5))
+    assert len(vad.detect_speech_regions(samples)) == 1
+
+def test_long_pauses_split_regions():
+    samples = _signal(("silence", 0.5), ("speech", 0.5), ("silence", 1.0), ("speech", 0.5), ("silence", 0.5))
+    assert len(vad.detect_speech_regions(samples)) == 2
+
+def test_short_bursts_are_dropped():
+    samples = _signal(("silence", 1.0), ("speech", 0.09), ("silence", 1.0))
+    assert not vad.has_speech(samples)
+
+def test_min_rms_rejects_quiet_signals():
+    samples = _signal(("silence", 1.0), ("speech", 1.0), ("silence", 1.0)) * 0.01
+    assert not vad.has_speech(samples)
+    assert vad.has_speech(samples, min_rms=0.0005)
+
+@pytest.mark.parametrize("max_region_s, expected", [(15.0, 1), (1.0, 2)])
+def test_split_speech_merges_up_to_max_region(max_region_s, expected):
+    samples = _signal(("silence", 0.5), ("speech", 0.6), ("silence", 1.0), ("speech", 0.6), ("silence", 0.5))
+    chunks = vad.split_speech(samples, max_region_s=max_region_s)
+    assert len(chunks) == expected
+    assert all(np.shares_memory(chunk, samples) for chunk in chunks)
+    if expected == 1: # 合并时保留中间的停顿
+        assert chunks[0].size >= 2.2 * RATE
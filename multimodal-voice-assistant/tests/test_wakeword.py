@@ -0,0 +1,72 @@
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from audio import stt
+from audio.wakeword import WakeWordGate
+
+RATE = 16000
+
+class FakeModel:
+    """返回固定文本；burn_s > 0 时在另一个线程中占用 CPU (模拟 ctranslate2 的计算线程)"""
+    def __init__(self, text: str = "", burn_s: float = 0.0, error: Exception | None = None):
+        self.text = text
+        self.burn_s = burn_s
+        self.error = error
+        self.calls = []
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        if self.burn_s:
+            def burn():
+                end = time.process_time() + self.burn_s
+                while time.process_time() < end:
+                    pass
+            worker = threading.Thread(target=burn)
+            worker.start()
+            worker.join()
+        return iter([SimpleNamespace(text=self.text)]), None
+
+@pytest.fixture(autouse=True)
+def converter(monkeypatch):
+    monkeypatch.setattr(stt, "get_converter", lambda: SimpleNamespace(convert=lambda text: text))
+
+def _gate(model: FakeModel) -> WakeWordGate:
+    gate = WakeWordGate(wake_word="请", window_s=1.0, min_rms=0.01)
+    gate._model = model
+    return gate
+
+def _speech(seconds: float = 2.0, amplitude: float = 0.2) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+def test_quiet_audio_is_rejected_without_decoding():
+    model = FakeModel("请打开")
+    gate = _gate(model)
+    assert not gate.check(_speech(amplitude=0.001))
+    assert model.calls == []
+    assert gate.stats()["energy_rejects"] == 1
+
+@pytest.mark.parametrize("text, hit", [("请帮我看看屏幕", True), ("今天天气不错", False)])
+def test_decodes_only_the_head_without_biasing_prompt(text, hit):
+    model = FakeModel(text)
+    gate = _gate(model)
+    assert gate.check(_speech()) is hit
+    [kwargs] = model.calls
+    assert "initial_prompt" not in kwargs # 提示唤醒词会增加误触发
+    assert kwargs["beam_size"] == 1
+    assert gate.stats()["hits" if hit else "misses"] == 1
+
+def test_errors_let_the_segment_through():
+    assert _gate(FakeModel(error=RuntimeError("model failed"))).check(_speech())
+
+def test_cpu_time_includes_decoder_threads():
+    gate = _gate(FakeModel("没有唤醒词", burn_s=0.2))
+    gate.record_full_decode(cpu_s=10.0, audio_s=2.0) # 完整模型每秒音频 5s CPU
+    assert not gate.check(_speech(seconds=2.0))
+    stats = gate.stats()
+    assert stats["gate_cpu_s"] >= 0.2 # 其他线程中的解码计算也计入
+    assert stats["saved_cpu_s"] == pytest.approx(10.0 - stats["gate_cpu_s"], abs=0.002)
@@ -0,0 +1,74 @@
+import json
+import pytest
+from starlette.testclient import TestClient
+import backend_asgi
+import web_stream
+from assistant_core import TurnResult
+from web_stream import ImageStore, format_sse
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 16
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    """按前端 (script.js) 的方式解析: 事件以空行分隔，每个事件一行 event 和一行 data"""
+    events = []
+    for frame in body.split("\n\n"):
+        if not frame:
+            continue
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_format_sse_keeps_data_on_one_line():
+    frame = format_sse("token", {"text": "第一行\n第二行"})
+    assert frame.endswith("\n\n") and frame.count("\n") == 3
+    assert _parse_sse(frame) == [("token", {"text": "第一行\n第二行"})]
+
+def test_image_store_ttl_and_capacity(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(web_stream.time, "monotonic", lambda: now[0])
+    store = ImageStore(max_items=2, ttl_s=60)
+    first, second, third = (store.put(bytes([i]), "image/png") for i in range(3))
+    assert all(url.startswith(web_stream.IMAGE_URL_PREFIX) for url in (first, second, third))
+    image_id = lambda url: url[len(web_stream.IMAGE_URL_PREFIX):]
+    assert store.get(image_id(first)) is None # 超出数量上限，最早的被丢弃
+    assert store.get(image_id(third)) == (bytes([2]), "image/png")
+    now[0] = 61
+    assert store.get(image_id(third)) is None
+
+@pytest.fixture
+def client(monkeypatch):
+    async def handle_turn(command, conversation_context=None, speak=True, on_event=None):
+        emit = on_event or (lambda event, data: None)
+        emit("status", {"call": "take screenshot"})
+        emit("image", {"data": JPEG, "mime": "image/jpeg"})
+        for token in ("屏幕上", "是一个\n编辑器。"):
+            emit("token", {"text": token})
+        return TurnResult(prompt=command, text="屏幕上是一个\n编辑器。", image=JPEG, call="take screenshot")
+
+    monkeypatch.setattr(backend_asgi.core, "handle_turn", handle_turn)
+    return TestClient(backend_asgi.app)
+
+def test_stream_event_order_and_payloads(client):
+    response = client.post("/api/command/stream", json={"command": "屏幕上是什么"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "session_id" in response.cookies
+    events = _parse_sse(response.text)
+    assert [event for event, _ in events] == ["status", "image", "token", "token", "done"]
+    image_url = events[1][1]["url"]
+    assert "".join(data["text"] for event, data in events if event == "token") == "屏幕上是一个\n编辑器。"
+    done = events[-1][1]
+    assert done["response"] == "屏幕上是一个\n编辑器。"
+    assert done["image_url"] == image_url and done["session_id"]
+    image = client.get(image_url)
+    assert image.status_code == 200
+    assert image.content == JPEG and image.headers["content-type"] == "image/jpeg"
+
+def test_command_returns_image_url(client):
+    data = client.post("/api/command", json={"command": "屏幕上是什么"}).json()
+    assert data["response"] == "屏幕上是一个\n编辑器。"
+    assert client.get(data["image_url"]).content == JPEG
+
+def test_invalid_requests(client):
+    assert client.post("/api/command/stream", json={"text": "缺少 command"}).status_code == 400
+    assert client.get(web_stream.IMAGE_URL_PREFIX + "missing").status_code == 404
@@ -0,0 +1,27 @@
+"""
+文本的稀疏向量和余弦相似度 (话题变化检测和记忆库检索共用)。
+"""
+import math
+import re
+from collections import Counter
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u9fff]+")
+
+def text_vector(text: str) -> dict[str, float]:
+    """文本的 L2 归一化稀疏向量: 中文取相邻两字 (单字重叠太多，如 "的" "我")，英文和数字取整词"""
+    lowered = text.lower()
+    features = Counter(_WORD_PATTERN.findall(lowered))
+    for run in _CJK_PATTERN.findall(lowered):
+        if len(run) == 1:
+            features[run] += 1
+        else:
+            features.update(run[i:i + 2] for i in range(len(run) - 1))
+    norm = math.sqrt(sum(count * count for count in features.values()))
+    return {feature: count / norm for feature, count in features.items()} if norm else {}
+
+def cosine_similarity(a: dict[str, float], b: dict[str, float]) -> float:
+    """两个归一化稀疏向量的余弦相似度 (遍历较短的一个)"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(feature, 0.0) for feature, weight in a.items())
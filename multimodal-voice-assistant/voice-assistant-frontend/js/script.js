@@ -41,23 +41,56 @@ document.addEventListener('DOMContentLoaded', () => {
             p.style.color = 'var(--error-color)';
         }
         assistantResponse.appendChild(p);
+        return p;
+    }
 
-        // 如果需要显示图片，可以在这里处理
-        // responseImage.style.display = 'none'; // 重置图片
-        // if (imageUrl) {
-        //     responseImage.src = imageUrl;
-        //     responseImage.style.display = 'block';
-        // }
+    function displayImage(imageUrl) {
+        const img = document.createElement('img');
+        img.src = imageUrl;
+        img.alt = '助手捕捉的图片';
+        img.className = 'response-image';
+        assistantResponse.appendChild(img);
     }
 
+    // 流式事件对应的状态文字
+    const CALL_STATUS_TEXT = {
+        'take screenshot': '正在截图...',
+        'capture webcam': '正在捕捉摄像头...',
+        'extract clipboard': '正在读取剪贴板...',
+    };
+
     // --- API 调用 ---
+    // 解析 SSE 响应 (EventSource 只支持 GET，这里用 fetch 读取流)，对每个事件调用 onEvent(event, data)
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+
     async function sendCommandToBackend(command, type = 'text') {
         updateStatus(STATUS.PROCESSING, '处理中...');
         showLoading(true);
-        displayResponse(''); // 清空旧响应
+        const textElement = displayResponse(''); // 清空旧响应，回答片段逐步追加到这里
 
-        // --- 假设后端 API 端点为 /api/command ---
-        const apiUrl = '/api/command'; // 你需要创建这个后端端点
+        // 流式端点: 回答边生成边显示，图片通过 URL 加载
+        const apiUrl = '/api/command/stream';
 
         try {
             const response = await fetch(apiUrl, {
@@ -68,24 +101,39 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ command: command, type: type }), // 发送指令和类型
             });
 
+            if (response.status === 404) {
+                // 后端不支持流式端点时回退到一次性返回的接口
+                await sendCommandBlocking(command, type, textElement);
+                return;
+            }
             if (!response.ok) {
                 // 处理 HTTP 错误
                 const errorData = await response.json().catch(() => ({ detail: '无法解析错误信息' }));
-                throw new Error(errorData.detail || `服务器错误: ${response.status}`);
+                throw new Error(errorData.error || errorData.detail || `服务器错误: ${response.status}`);
             }
 
-            const data = await response.json(); // 解析 JSON 响应
-
-            if (data.error) {
-                // 处理后端返回的业务错误
-                throw new Error(data.error);
+            let finished = false;
+            await readEventStream(response, (event, data) => {
+                if (event === 'status') {
+                    if (data.stage === 'search') updateStatus(STATUS.PROCESSING, `正在搜索: ${data.query}`);
+                    else if (data.stage === 'function_call') updateStatus(STATUS.PROCESSING, CALL_STATUS_TEXT[data.call] || '正在生成回答...');
+                } else if (event === 'image') {
+                    displayImage(data.url);
+                    updateStatus(STATUS.PROCESSING, '正在生成回答...');
+                } else if (event === 'token') {
+                    showLoading(false);
+                    textElement.textContent += data.text;
+                } else if (event === 'done') {
+                    finished = true;
+                    textElement.textContent = data.response || '收到空响应'; // 以完整回答为准
+                } else if (event === 'error') {
+                    throw new Error(data.error);
+                }
+            });
+            if (!finished) {
+                throw new Error('连接已中断');
             }
 
-            // 显示成功响应
-            displayResponse(data.response || '收到空响应');
-            // 如果后端返回图片 URL 或 Base64 数据，可以在这里处理并显示图片
-            // if (data.image_url) { displayResponse(data.response, false, data.image_url); }
-
             updateStatus(STATUS.IDLE, '空闲');
 
         } catch (error) {
@@ -97,6 +145,26 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // 一次性返回的接口 (/api/command): 等待完整回答后显示
+    async function sendCommandBlocking(command, type, textElement) {
+        const response = await fetch('/api/command', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ command: command, type: type }),
+        });
+        const data = await response.json().catch(() => ({ error: `服务器错误: ${response.status}` }));
+        if (!response.ok || data.error) {
+            throw new Error(data.error || `服务器错误: ${response.status}`);
+        }
+        textElement.textContent = data.response || '收到空响应';
+        if (data.image_url) {
+            displayImage(data.image_url);
+        }
+        updateStatus(STATUS.IDLE, '空闲');
+    }
+
     // --- 事件监听器 ---
 
     // 发送文本指令
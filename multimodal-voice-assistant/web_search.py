@@ -2,13 +2,13 @@
 使用 DuckDuckGo 进行网页搜索并处理结果。
 """
 import re
-from duckduckgo_search import DDGS
 from logger import log
 
 def duckduckgo_search(query, max_results=3):
     """使用 DuckDuckGo 进行网页搜索"""
     log(f"正在搜索: {query}", title="SEARCH", style="blue")
     try:
+        from duckduckgo_search import DDGS # 推迟导入，避免拖慢启动
         with DDGS() as ddgs:
             results = list(ddgs.text(query, max_results=max_results))
         log(f"找到 {len(results)} 条搜索结果", title="SEARCH", style="blue")
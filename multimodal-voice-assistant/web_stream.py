@@ -0,0 +1,50 @@
+"""
+Web 后端 (backend_app.py / backend_asgi.py) 共用的流式输出工具:
+- SSE 事件格式化；
+- 截图/摄像头画面的内存临时存储，前端按 URL 获取图片，而不是在 JSON 中内嵌 base64。
+"""
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+import config
+
+IMAGE_URL_PREFIX = "/api/images/"
+
+def format_sse(event: str, data: dict[str, Any]) -> str:
+    """格式化一条 SSE 事件 (data 为单行 JSON)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ImageStore:
+    """按随机 ID 保存图片的内存 LRU (线程安全)，超过数量上限或过期的图片被丢弃"""
+    def __init__(self, max_items: int = config.BACKEND_IMAGE_MAX_ITEMS, ttl_s: float = config.BACKEND_IMAGE_TTL_S):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self._images: OrderedDict[str, tuple[bytes, str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, mime: str = "image/jpeg") -> str:
+        """保存图片，返回其 URL"""
+        image_id = secrets.token_urlsafe(12)
+        with self._lock:
+            self._images[image_id] = (data, mime, time.monotonic())
+            while len(self._images) > self.max_items:
+                self._images.popitem(last=False)
+        return IMAGE_URL_PREFIX + image_id
+
+    def get(self, image_id: str) -> tuple[bytes, str] | None:
+        """返回 (图片数据, MIME 类型)，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._images.get(image_id)
+            if entry is None:
+                return None
+            data, mime, created = entry
+            if time.monotonic() - created > self.ttl_s:
+                del self._images[image_id]
+                return None
+            return data, mime
+
+images = ImageStore()